@@ -0,0 +1,367 @@
+"""Standing alert rules matched against every written item (a percolator).
+
+A rule combines conditions, all of which an item must meet:
+
+- competitor, sector, region, impact: one value or a list of accepted
+  values (case-insensitive);
+- keywords: a list of words or phrases, at least one of which must occur
+  in the title, excerpt, description or tags (every word of a phrase);
+- minValue, maxValue: bounds on the estimated value, in millions.
+
+Instead of testing every rule against every item, each rule is indexed
+under keys that any matching item must produce: the values of all its
+field conditions together, plus one word of each keyword. An item has one
+value per field, so for each combination of fields some rule uses it
+looks up its own values (with each of its words, for rules that have
+keywords) and only the rules found there are checked in full. Matching
+costs about the same with ten rules or ten thousand. Rules with only
+value bounds have no key and are checked for every item.
+
+Writers match the documents they store through a write hook and record
+the matches in SQLite, shared by every process like the rollups, so the
+API serves alerts raised by the backfill or the ingestion pipeline. A
+document matches a rule once; rewriting it updates the stored copy and
+retracts the matches of rules it no longer meets.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from itertools import product
+
+from rollups import parse_value
+from response_cache import CACHE_DIR
+from search_index import tokenize
+import write_hooks
+
+DB_PATH = os.getenv("ALERTS_PATH", os.path.join(CACHE_DIR, "alerts.sqlite3"))
+# Rule fields matched against the item's field of the same name
+FIELDS = ("competitor", "region", "sector", "impact")
+# Item fields searched for keywords, as by the search index
+TEXT_FIELDS = ("title", "excerpt", "description")
+MAX_KEYWORDS = 50
+
+
+def _values(definition, name):
+    value = definition.get(name)
+    if value is None or value == "" or value == []:
+        return []
+    values = value if isinstance(value, list) else [value]
+    if not all(isinstance(v, str) and v.strip() for v in values):
+        raise ValueError(f"{name} must be a non-empty string or a list of them")
+    return values
+
+
+def _bound(definition, name):
+    value = definition.get(name)
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(f"{name} must be a number (millions)")
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number (millions)") from None
+
+
+def parse_rule(definition):
+    """Validate a rule definition; return it normalized, or raise ValueError."""
+    if not isinstance(definition, dict):
+        raise ValueError("a rule must be a JSON object")
+    rule = {}
+    name = definition.get("name")
+    if name is not None and not isinstance(name, str):
+        raise ValueError("name must be a string")
+    for field in FIELDS:
+        values = _values(definition, field)
+        if values:
+            rule[field] = sorted({v.strip().casefold() for v in values})
+    keywords = _values(definition, "keywords")
+    if len(keywords) > MAX_KEYWORDS:
+        raise ValueError(f"at most {MAX_KEYWORDS} keywords per rule")
+    if keywords:
+        parsed = [tokenize(keyword) for keyword in keywords]
+        if not all(parsed):
+            raise ValueError("every keyword must contain a word that is not a stopword")
+        rule["keywords"] = [keyword.strip() for keyword in keywords]
+    for bound in ("minValue", "maxValue"):
+        value = _bound(definition, bound)
+        if value is not None:
+            rule[bound] = value
+    if not rule:
+        raise ValueError("a rule needs at least one of competitor, sector, region, impact, keywords, minValue, maxValue")
+    rule["name"] = (name or "").strip() or describe(rule)
+    return rule
+
+
+def describe(rule):
+    """A readable default name for a rule."""
+    parts = [" or ".join(rule[field]) for field in FIELDS if field in rule]
+    if "keywords" in rule:
+        parts.append(" or ".join(f'"{k}"' for k in rule["keywords"]))
+    if "minValue" in rule:
+        parts.append(f">= {rule['minValue']:g}M")
+    if "maxValue" in rule:
+        parts.append(f"<= {rule['maxValue']:g}M")
+    return ", ".join(parts)
+
+
+class CompiledRule:
+    """A rule prepared for matching: field value sets, keyword token sets and value bounds."""
+
+    __slots__ = ("id", "name", "fields", "keywords", "min_value", "max_value")
+
+    def __init__(self, rule_id, rule):
+        self.id = rule_id
+        self.name = rule["name"]
+        self.fields = {field: frozenset(rule[field]) for field in FIELDS if field in rule}
+        self.keywords = [frozenset(tokenize(keyword)) for keyword in rule.get("keywords", ())]
+        self.min_value = rule.get("minValue")
+        self.max_value = rule.get("maxValue")
+
+    def shape(self):
+        """The fields the rule's keys are made of, and whether they include a keyword word."""
+        return tuple(field for field in FIELDS if field in self.fields), bool(self.keywords)
+
+    def keys(self):
+        """Index keys of the rule; every matching item produces at least one of them."""
+        fields, keyed = self.shape()
+        combinations = list(product(*(sorted(self.fields[field]) for field in fields)))
+        if not keyed:
+            return {(fields, values, None) for values in combinations}
+        # Any one word of each keyword will do; the longest is usually the rarest
+        words = {max(tokens, key=len) for tokens in self.keywords}
+        return {(fields, values, word) for values in combinations for word in words}
+
+    def matches(self, values, words, value):
+        for field, accepted in self.fields.items():
+            if values.get(field) not in accepted:
+                return False
+        if self.keywords and not any(tokens <= words for tokens in self.keywords):
+            return False
+        if self.min_value is not None or self.max_value is not None:
+            if value is None:
+                return False
+            if self.min_value is not None and value < self.min_value:
+                return False
+            if self.max_value is not None and value > self.max_value:
+                return False
+        return True
+
+
+def _words(document):
+    words = set()
+    for field in TEXT_FIELDS:
+        words.update(tokenize(document.get(field)))
+    tags = document.get("tags") or []
+    words.update(tokenize(" ".join(tags) if isinstance(tags, list) else str(tags)))
+    return words
+
+
+def _field_values(document):
+    values = {}
+    for field in FIELDS:
+        value = document.get(field)
+        if isinstance(value, str) and value:
+            values[field] = value.strip().casefold()
+    return values
+
+
+class AlertEngine:
+    """Stores alert rules and their matches in SQLite. Safe to share between threads and processes."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        # Rule index built from the stored rules, rebuilt when their version changes
+        self._version = None
+        self._index = {}
+        # (fields, keyed) of the keys in the index
+        self._shapes = []
+        self._unanchored = []
+        self._rule_count = 0
+        self.documents_matched = 0
+        self.candidates_checked = 0
+        self.matches_retracted = 0
+
+    def _connection(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rules ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, definition TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS matches ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, rule_id INTEGER NOT NULL, doc_id TEXT NOT NULL,"
+                " matched_at REAL NOT NULL, UNIQUE (rule_id, doc_id))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS matches_doc_id ON matches (doc_id)")
+            # One copy of each matched item, however many rules it matched
+            self._conn.execute("CREATE TABLE IF NOT EXISTS items (doc_id TEXT PRIMARY KEY, item TEXT NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('version', 0)")
+            self._conn.commit()
+        return self._conn
+
+    def _refresh_index(self, conn):
+        """Rebuild the rule index if rules were added or deleted, by this process or another."""
+        version = conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+        if version == self._version:
+            return
+        index = defaultdict(list)
+        shapes = set()
+        unanchored = []
+        count = 0
+        for rule_id, definition in conn.execute("SELECT id, definition FROM rules"):
+            rule = CompiledRule(rule_id, json.loads(definition))
+            if rule.fields or rule.keywords:
+                shapes.add(rule.shape())
+                for key in rule.keys():
+                    index[key].append(rule)
+            else:
+                unanchored.append(rule)
+            count += 1
+        self._index, self._shapes, self._unanchored = dict(index), sorted(shapes), unanchored
+        self._rule_count, self._version = count, version
+
+    def match(self, document):
+        """Return the compiled rules `document` matches."""
+        with self._lock:
+            self._refresh_index(self._connection())
+            return self._match(document)
+
+    def _match(self, document):
+        values = _field_values(document)
+        words = _words(document)
+        candidates = {}
+        for fields, keyed in self._shapes:
+            if not all(field in values for field in fields):
+                continue
+            prefix = (fields, tuple(values[field] for field in fields))
+            for word in words if keyed else (None,):
+                for rule in self._index.get(prefix + (word,), ()):
+                    candidates[rule.id] = rule
+        for rule in self._unanchored:
+            candidates[rule.id] = rule
+        self.candidates_checked += len(candidates)
+        if not candidates:
+            return []
+        value = parse_value(document.get("estimatedValue"))
+        return [rule for rule in candidates.values() if rule.matches(values, words, value)]
+
+    def update(self, documents):
+        """Match the written documents against every rule and record the matches; registered as a write hook.
+
+        A rewritten document keeps the matches it still satisfies (and their
+        matchedAt), loses those it no longer does, and its stored item is
+        replaced, or deleted once no rule matches it.
+        """
+        with self._lock:
+            conn = self._connection()
+            self._refresh_index(conn)
+            if not self._rule_count:
+                return
+            now = time.time()
+            matched_rules = {}
+            items = []
+            for document in documents:
+                doc_id = document.get("id")
+                if not doc_id:
+                    continue
+                matched_rules[doc_id] = {rule.id for rule in self._match(document)}
+                if matched_rules[doc_id]:
+                    items.append(
+                        (doc_id, json.dumps({k: v for k, v in document.items() if not k.startswith("_")}, ensure_ascii=False))
+                    )
+            self.documents_matched += len(documents)
+            doc_ids = list(matched_rules)
+            stale = []
+            for start in range(0, len(doc_ids), 500):
+                chunk = doc_ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for rule_id, doc_id in conn.execute(f"SELECT rule_id, doc_id FROM matches WHERE doc_id IN ({marks})", chunk):
+                    if rule_id not in matched_rules[doc_id]:
+                        stale.append((rule_id, doc_id))
+            rows = [(rule_id, doc_id, now) for doc_id, rule_ids in matched_rules.items() for rule_id in rule_ids]
+            unmatched = [(doc_id,) for doc_id, rule_ids in matched_rules.items() if not rule_ids]
+            with conn:
+                conn.executemany("DELETE FROM matches WHERE rule_id = ? AND doc_id = ?", stale)
+                conn.executemany("INSERT OR IGNORE INTO matches (rule_id, doc_id, matched_at) VALUES (?, ?, ?)", rows)
+                conn.executemany("INSERT OR REPLACE INTO items (doc_id, item) VALUES (?, ?)", items)
+                conn.executemany("DELETE FROM items WHERE doc_id = ?", unmatched)
+            self.matches_retracted += len(stale)
+
+    def add_rule(self, definition):
+        """Validate and store a rule; returns it with its id. Raises ValueError for an invalid rule."""
+        rule = parse_rule(definition)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(
+                    "INSERT INTO rules (definition, created) VALUES (?, ?)", (json.dumps(rule), time.time())
+                )
+                conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'version'")
+        return {"id": cursor.lastrowid, **rule}
+
+    def delete_rule(self, rule_id):
+        """Delete a rule and its matches; returns False if there is no such rule."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                deleted = conn.execute("DELETE FROM rules WHERE id = ?", (rule_id,)).rowcount
+                if deleted:
+                    conn.execute("DELETE FROM matches WHERE rule_id = ?", (rule_id,))
+                    conn.execute("DELETE FROM items WHERE doc_id NOT IN (SELECT doc_id FROM matches)")
+                    conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'version'")
+        return bool(deleted)
+
+    def rules(self):
+        """Every rule with its id, creation time and number of matches."""
+        with self._lock:
+            conn = self._connection()
+            counts = dict(conn.execute("SELECT rule_id, COUNT(*) FROM matches GROUP BY rule_id"))
+            rows = conn.execute("SELECT id, definition, created FROM rules ORDER BY id").fetchall()
+        return [
+            {"id": rule_id, **json.loads(definition), "created": created, "matches": counts.get(rule_id, 0)}
+            for rule_id, definition, created in rows
+        ]
+
+    def alerts(self, rule_id=None, limit=50, offset=0):
+        """Return (total, [(match id, rule id, rule name, matched_at, item)]), newest match first."""
+        where, parameters = (" WHERE m.rule_id = ?", [rule_id]) if rule_id is not None else ("", [])
+        with self._lock:
+            conn = self._connection()
+            total = conn.execute(f"SELECT COUNT(*) FROM matches m{where}", parameters).fetchone()[0]
+            rows = conn.execute(
+                "SELECT m.id, m.rule_id, r.definition, m.matched_at, i.item FROM matches m"
+                f" JOIN rules r ON r.id = m.rule_id JOIN items i ON i.doc_id = m.doc_id{where}"
+                " ORDER BY m.id DESC LIMIT ? OFFSET ?",
+                parameters + [limit, offset],
+            ).fetchall()
+        return total, [
+            (match_id, match_rule, json.loads(definition)["name"], matched_at, json.loads(item))
+            for match_id, match_rule, definition, matched_at, item in rows
+        ]
+
+    def stats(self):
+        with self._lock:
+            self._refresh_index(self._connection())
+            return {
+                "rules": self._rule_count,
+                "indexKeys": len(self._index),
+                "unanchoredRules": len(self._unanchored),
+                "documentsMatched": self.documents_matched,
+                "candidatesChecked": self.candidates_checked,
+                "matchesRetracted": self.matches_retracted,
+            }
+
+
+alert_engine = AlertEngine()
+write_hooks.register(alert_engine.update)
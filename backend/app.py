@@ -1,193 +1,641 @@
 import os
 import time
-import re
-from flask import Flask, jsonify
+import json
+import hashlib
+from datetime import datetime, timezone
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
-from azure.cosmos import CosmosClient, exceptions
-from dateutil import parser
-from dotenv import load_dotenv
-from openai import AzureOpenAI
-
-# Load environment variables from .env
-load_dotenv()
+from azure.cosmos import exceptions
+from clients import container
+from response_cache import ResponseCache
+from http_compression import MIN_COMPRESS_SIZE, choose_encoding, compress
+from llm_cache import llm_cache
+from search_index import FACETS as SEARCH_FACETS, search_index
+from rollups import DIMENSIONS as ROLLUP_DIMENSIONS, rollups
+from embeddings import TREND_CLUSTERS, TREND_WEEKS, embedding_index
+from snapshot import is_snapshot_continuation, news_snapshot
+from news_stream import NewsStream, event_log
+from alerts import alert_engine
+from tagger import default_tagger
+from dates import bound_epoch, stats as date_stats
+from logs import get_logger
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, PROFILE_HEADER, current_profile, end_profile, profile_requested,
+    register_collector, render as render_metrics, request_seconds, start_profile, timed,
+)
 
 app = Flask(__name__)
 CORS(app)
 
-# Azure CosmosDB configuration
-COSMOS_URI = os.getenv("COSMOS_URI")
-COSMOS_KEY = os.getenv("COSMOS_KEY")
-DATABASE_NAME = os.getenv("COSMOS_DATABASE")
-CONTAINER_NAME = os.getenv("COSMOS_CONTAINER")
-
-# Azure OpenAI configuration
-OPENAI_ENDPOINT = os.getenv("OPENAI_ENDPOINT")
-OPENAI_DEPLOYMENT_NAME = os.getenv("OPENAI_DEPLOYMENT_NAME")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_VERSION = os.getenv("OPENAI_API_VERSION")
-
-# Initialize CosmosDB client
-cosmos_client = CosmosClient(COSMOS_URI, credential=COSMOS_KEY)
-database = cosmos_client.get_database_client(DATABASE_NAME)
-container = database.get_container_client(CONTAINER_NAME)
-
-# Initialize Azure OpenAI client
-openai_client = AzureOpenAI(
-    api_version=OPENAI_API_VERSION,
-    azure_endpoint=OPENAI_ENDPOINT,
-    api_key=OPENAI_API_KEY,
+# Cache of serialized /api/news responses, keyed by query parameters
+news_cache = ResponseCache(
+    max_entries=int(os.getenv("NEWS_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("NEWS_CACHE_TTL", "30")),
+)
+# Newest _ts and item count per filter, so revalidating a page costs no query within the TTL
+news_validators = ResponseCache(
+    max_entries=int(os.getenv("NEWS_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("NEWS_CACHE_TTL", "30")),
 )
+log = get_logger("api")
 
-# Function to generate missing data using Azure OpenAI
-def generate_description_and_impact(title, url):
-    print(f"[INFO] Generating description and impact for title: {title}, URL: {url}")
-    prompt = f"Generate a description highly relevant and impact level (high, medium, low) for the following:\nTitle: {title}\nURL: {url}\n"
-    try:
-        start_time = time.time()
-        response = openai_client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant."},
-                {"role": "user", "content": prompt},
-            ],
-            max_tokens=100,
-            temperature=0.7,
-            top_p=1.0,
-            model=OPENAI_DEPLOYMENT_NAME,
-        )
-        elapsed_time = time.time() - start_time
-        print(f"[INFO] OpenAI API call completed in {elapsed_time:.2f} seconds")
-
-        generated_text = response.choices[0].message.content.strip()
-        print(f"[INFO] Generated text: {generated_text}")
-
-        # Split the response into description and impact
-        lines = generated_text.split("\n")
-        if len(lines) >= 2:
-            description = lines[0].strip()
-            impact = lines[1].strip().lower()
-        else:
-            # Handle cases where the response does not have two lines
-            description = generated_text
-            impact = "low"
-
-        print(f"[INFO] Description: {description}, Impact: {impact}")
-        return description, impact
-    except Exception as e:
-        print(f"[ERROR] Error generating data: {e}")
-        return "No description available", "low"
-
-# Function to extract competitor name from URL
-def extract_competitor_from_url(url):
-    """Extract competitor name from the URL."""
-    if not url:
-        return "Unknown Competitor"
-    # Extract the domain name (e.g., "smec" from "https://www.smec.com")
-    match = re.search(r"https?://(?:www\.)?([a-zA-Z0-9-]+)\.", url)
-    if match:
-        return match.group(1).capitalize()  # Capitalize the competitor name
-    return "Unknown Competitor"
-
-# Function to normalize and fill missing data
-def normalize_item(item):
-    print(f"[INFO] Normalizing item with ID: {item.get('id')}")
-    raw_date = item.get("date", "")
+# Function to start timing a request, and profiling it if the client asked for a breakdown
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    if profile_requested(request.headers.get(PROFILE_HEADER)):
+        g.profile_token = start_profile()
+
+# Function to record the request latency and return the profile in a Server-Timing header
+# (registered before compress_response, so it runs after it and includes compression)
+@app.after_request
+def finish_request_timing(response):
+    # For streamed responses this is the time until the first byte
+    elapsed = time.perf_counter() - g.request_started
+    request_seconds.observe(elapsed, endpoint=request.endpoint or "unknown", status=response.status_code)
+    profile = current_profile()
+    if profile is not None:
+        response.headers["Server-Timing"] = profile.server_timing()
+    return response
+
+@app.teardown_request
+def end_request_profile(exc=None):
+    token = g.pop("profile_token", None)
+    if token is not None:
+        end_profile(token)
+
+# Fields returned by the news feed (keeps Cosmos from shipping system properties)
+NEWS_FIELDS = [
+    "id", "title", "date", "dateEpoch", "url", "excerpt", "image", "tags", "activityType",
+    "competitor", "description", "region", "sector", "estimatedValue", "impact",
+    "clusterId", "duplicateOf",
+]
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# Items fetched per Cosmos round-trip when streaming the whole feed
+STREAM_PAGE_SIZE = 500
+NDJSON_MIMETYPE = "application/x-ndjson"
+SSE_MIMETYPE = "text/event-stream"
+# Keep proxies from caching or buffering pushed events
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+# Set NEWS_SNAPSHOT=0 to always read the feed from CosmosDB
+NEWS_SNAPSHOT_ENABLED = os.getenv("NEWS_SNAPSHOT", "1") != "0"
+
+# Query-string filters mapped to their document field and comparison operator
+NEWS_FILTERS = {
+    "competitor": ("competitor", "="),
+    "region": ("region", "="),
+    "sector": ("sector", "="),
+    "impact": ("impact", "="),
+    "from": ("dateEpoch", ">="),
+    "to": ("dateEpoch", "<="),
+}
+
+# Pushes every written feed item to the /api/stream subscribers of this process
+news_stream = NewsStream(event_log, NEWS_FIELDS)
+
+# Function to read the filter values from the request; raises ValueError for an invalid date
+def parse_news_filters(args):
+    """Return {filter: value} with impact lower-cased and from/to as Unix times covering whole days."""
+    values = {}
+    for arg in NEWS_FILTERS:
+        value = args.get(arg)
+        if not value:
+            continue
+        if arg == "impact":
+            value = value.lower()
+        elif arg in ("from", "to"):
+            value = bound_epoch(value, end=arg == "to")
+        values[arg] = value
+    return values
+
+# Function to build the WHERE clause and parameters from the request filters
+def build_news_filters(args):
+    clauses = []
+    parameters = []
+    for arg, value in parse_news_filters(args).items():
+        field, op = NEWS_FILTERS[arg]
+        name = f"@{arg}"
+        clauses.append(f"c.{field} {op} {name}")
+        parameters.append({"name": name, "value": value})
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return where, parameters
+
+# Function to build a parameterized Cosmos SQL query from the request filters
+def build_news_query(args):
+    """Build the SQL text and parameters for the filtered, date-ordered news feed."""
+    where, parameters = build_news_filters(args)
+    projection = ", ".join(f"c.{field}" for field in NEWS_FIELDS)
+    query = f"SELECT {projection} FROM c{where} ORDER BY c.dateEpoch DESC"
+    return query, parameters
+
+# Function to parse the requested page size
+def parse_page_size(value):
     try:
-        parsed_date = parser.parse(raw_date)
-        date = parsed_date.strftime("%Y-%m-%d")
-    except Exception:
-        date = raw_date
-
-    url = item.get("url") or item.get("link") or None
-    title = item.get("title", "No Title")
-    description = item.get("description", "").strip()
-    impact = item.get("impact", "").strip().lower()
-
-    # Normalize impact to "high," "medium," or "low"
-    if "high" in impact:
-        impact = "high"
-    elif "medium" in impact:
-        impact = "medium"
-    elif "low" in impact:
-        impact = "low"
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+# Function to fetch a single page of news items from CosmosDB
+def fetch_news_page(args):
+    """Return (items, continuation) for one page of the filtered news feed."""
+    query, parameters = build_news_query(args)
+    limit = parse_page_size(args.get("limit"))
+    with timed("fetch"):
+        pager = container.query_items(
+            query=query,
+            parameters=parameters,
+            enable_cross_partition_query=True,
+            max_item_count=limit,
+        ).by_page(args.get("continuation") or None)
+        items = list(next(pager, []))
+    return items, pager.continuation_token
+
+# Function to key the cached feed aggregates by the filters they were computed for
+def news_validator_key(where, parameters):
+    return where, tuple((parameter["name"], parameter["value"]) for parameter in parameters)
+
+# Function to compute a validator for the filtered feed from its max _ts and item count
+def compute_news_etag(args):
+    """Return an ETag that changes whenever an item matching the filters is written.
+
+    The aggregates are cached for NEWS_CACHE_TTL seconds (and dropped on
+    this host's writes), so writes from anywhere else show within the TTL.
+    """
+    where, parameters = build_news_filters(args)
+    key = news_validator_key(where, parameters)
+    aggregates = news_validators.get(key)
+    if aggregates is None:
+        aggregates = []
+        with timed("validate"):
+            for expression in ("MAX(c._ts)", "COUNT(1)"):
+                results = container.query_items(
+                    query=f"SELECT VALUE {expression} FROM c{where}",
+                    parameters=parameters,
+                    enable_cross_partition_query=True,
+                )
+                aggregates.append(next(iter(results), 0))
+        news_validators.set(key, aggregates)
+    return news_etag(*aggregates, args)
+
+# Function to derive the feed's ETag from the newest _ts and item count of the filtered feed
+def news_etag(max_ts, count, args):
+    query_key = "&".join(f"{k}={v}" for k, v in sorted(args.items(multi=True)))
+    digest = hashlib.sha1(f"{max_ts}:{count}:{query_key}".encode("utf-8")).hexdigest()
+    return digest[:32]
+
+# Function to pick the status, body and encoding for a cache entry
+def negotiate_cached(entry, if_none_match, accept_encoding):
+    """Return (status, body, encoding); 304 if the client has the entry, else the body compressed if accepted."""
+    if if_none_match.contains_weak(entry["etag"]):
+        return 304, b"", None
+    body = entry["body"]
+    encoding = None
+    if len(body) >= MIN_COMPRESS_SIZE:
+        encoding = choose_encoding(accept_encoding)
+    if encoding:
+        # Compress each cached body at most once per encoding
+        encoded = entry["encoded"].get(encoding)
+        if encoded is None:
+            encoded = entry["encoded"][encoding] = compress(body, encoding)
+        body = encoded
+    return 200, body, encoding
+
+# Function to build a JSON response, negotiating compression and honouring If-None-Match
+def make_cached_response(entry):
+    """Serve a cache entry ({"etag", "body", "encoded"}) for the current request."""
+    status, body, encoding = negotiate_cached(entry, request.if_none_match, request.headers.get("Accept-Encoding"))
+    if status == 304:
+        response = app.response_class(status=304)
     else:
-        # Generate impact using LLM if not defined
-        print(f"[INFO] Generating impact for item ID: {item.get('id')}")
-        description, impact = generate_description_and_impact(title, url)
-
-    # Fill description if it's empty
-    if not description or description == "**Description:**":
-        description = f"The article \"{title}\" highlights key developments. Visit {url} for more details."
-
-    # Extract competitor name from URL if missing
-    competitor = item.get("competitor", "Unknown Competitor")
-    if competitor == "Unknown Competitor":
-        competitor = extract_competitor_from_url(url)
-
-    # Fill other fields with defaults if missing
-    activity_type = item.get("activityType", "General Activity")
-    region = item.get("region", "N/A")
-    sector = item.get("sector", "N/A")
-    estimated_value = item.get("estimatedValue", "Not Available")
-    excerpt = item.get("excerpt", "No excerpt available.")
-    image = item.get("image", "https://via.placeholder.com/150")
-    tags = item.get("tags", [])
-
-    # Update the item in CosmosDB with the filled data
-    item["description"] = description
-    item["impact"] = impact
-    item["activityType"] = activity_type
-    item["competitor"] = competitor
-    item["region"] = region
-    item["sector"] = sector
-    item["estimatedValue"] = estimated_value
-    item["excerpt"] = excerpt
-    item["image"] = image
-    item["tags"] = tags
+        response = app.response_class(body, mimetype="application/json")
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.set_etag(entry["etag"], weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
 
-    try:
-        container.upsert_item(item)
-        print(f"[INFO] Backfilled item with ID: {item.get('id')} in CosmosDB")
-    except Exception as e:
-        print(f"[ERROR] Error updating item in CosmosDB: {e}")
-
-    return {
-        "id": item.get("id"),
-        "title": title,
-        "date": date,
-        "url": url,
-        "excerpt": excerpt,
-        "image": image,
-        "tags": tags,
-        "activityType": activity_type,
-        "competitor": competitor,
-        "description": description,
-        "region": region,
-        "sector": sector,
-        "estimatedValue": estimated_value,
-        "impact": impact,
-    }
+# Function to decide whether the client asked for a streamed response
+def requested_stream_format(args, accept_mimetypes):
+    """Return "ndjson", "json" or None (regular paginated response)."""
+    if args.get("format") == "ndjson":
+        return "ndjson"
+    best = accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    if best == NDJSON_MIMETYPE:
+        return "ndjson"
+    if args.get("stream", "").lower() in ("1", "true"):
+        return "json"
+    return None
+
+# Function to encode pages of items as a JSON array or NDJSON, one chunk per page
+def encode_news_stream(pages, stream_format):
+    first = True
+    if stream_format == "json":
+        yield "["
+    for page in pages:
+        if not page:
+            continue
+        if stream_format == "ndjson":
+            yield "".join(json.dumps(item) + "\n" for item in page)
+        else:
+            chunk = ",".join(json.dumps(item) for item in page)
+            yield chunk if first else "," + chunk
+        first = False
+    if stream_format == "json":
+        yield "]"
+
+# Function to stream the whole filtered feed without materializing it
+def stream_news(stream_format):
+    """Write the feed incrementally from the Cosmos page iterator."""
+    query, parameters = build_news_query(request.args)
+    pages = container.query_items(
+        query=query,
+        parameters=parameters,
+        enable_cross_partition_query=True,
+        max_item_count=STREAM_PAGE_SIZE,
+    ).by_page(request.args.get("continuation") or None)
+
+    def next_page():
+        with timed("fetch"):
+            page = next(pages, None)
+            return None if page is None else list(page)
+
+    # Pull the first page eagerly so query errors still produce a 500
+    first_page = next_page() or []
+
+    def generate_pages():
+        yield first_page
+        try:
+            while True:
+                page = next_page()
+                if page is None:
+                    break
+                yield page
+        except exceptions.CosmosHttpResponseError as e:
+            # Headers are already sent; re-raise so the server aborts the response and the
+            # client sees a truncated body instead of a complete but partial feed
+            log.error("news_stream_failed", error=e)
+            raise
+
+    mimetype = NDJSON_MIMETYPE if stream_format == "ndjson" else "application/json"
+    body = encode_news_stream(generate_pages(), stream_format)
+    return app.response_class(body, mimetype=mimetype)
+
+# Function to read the feed's fields from the whole container for the snapshot
+def load_snapshot_documents():
+    projection = ", ".join(f"c.{field}" for field in NEWS_FIELDS)
+    return container.query_items(query=f"SELECT {projection} FROM c", enable_cross_partition_query=True)
+
+# Function to compute a validator for a snapshot response; every refresh has a new version
+def compute_snapshot_etag(version, args):
+    query_key = "&".join(f"{k}={v}" for k, v in sorted(args.items(multi=True)))
+    return hashlib.sha1(f"snapshot:{version}:{query_key}".encode("utf-8")).hexdigest()[:32]
+
+# Function to serve the news feed from the local snapshot instead of CosmosDB
+def serve_news_snapshot(stream_format):
+    filters = parse_news_filters(request.args)
+    continuation = request.args.get("continuation") or None
+    if stream_format:
+        separator = b"\n" if stream_format == "ndjson" else b", "
+        chunks = news_snapshot.stream(filters, separator, STREAM_PAGE_SIZE, continuation)
+
+        def generate():
+            first = True
+            if stream_format == "json":
+                yield b"["
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if stream_format == "ndjson":
+                    yield chunk + b"\n"
+                else:
+                    yield chunk if first else separator + chunk
+                first = False
+            if stream_format == "json":
+                yield b"]"
+
+        mimetype = NDJSON_MIMETYPE if stream_format == "ndjson" else "application/json"
+        return app.response_class(generate(), mimetype=mimetype)
+
+    return make_cached_response(snapshot_news_entry(request.args, filters, request.if_none_match))
+
+# Function to build the cache entry for one snapshot page, or only its ETag if the client has it
+def snapshot_news_entry(args, filters, if_none_match):
+    etag = compute_snapshot_etag(news_snapshot.version(), args)
+    if if_none_match.contains_weak(etag):
+        return {"etag": etag, "body": b"", "encoded": {}}
+    limit = parse_page_size(args.get("limit"))
+    version, items, continuation = news_snapshot.page(filters, limit, args.get("continuation") or None)
+    body = b'{"items": ' + items + b', "continuation": ' + json.dumps(continuation).encode("utf-8") + b"}"
+    return {"etag": compute_snapshot_etag(version, args), "body": body, "encoded": {}}
+
+# Function to decide whether a feed request is served from the snapshot
+def use_news_snapshot(args):
+    """True while the snapshot is fresh, and for continuations of pages it served; else start a refresh."""
+    if not NEWS_SNAPSHOT_ENABLED:
+        return False
+    continuation = args.get("continuation")
+    if is_snapshot_continuation(continuation) or (not continuation and news_snapshot.is_fresh()):
+        return True
+    if not continuation:
+        news_snapshot.stale_read(load_snapshot_documents, NEWS_FIELDS)
+    return False
 
 # API endpoint to fetch news data
 @app.route('/api/news', methods=['GET'])
 def get_news():
-    print("[INFO] Fetching news data...")
+    stream_format = requested_stream_format(request.args, request.accept_mimetypes)
+    try:
+        parse_news_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if use_news_snapshot(request.args):
+        return serve_news_snapshot(stream_format)
+
+    if stream_format:
+        try:
+            return stream_news(stream_format)
+        except exceptions.CosmosHttpResponseError as e:
+            log.error("news_fetch_failed", error=e)
+            return jsonify({"error": str(e)}), 500
+
+    cache_key = tuple(sorted(request.args.items(multi=True)))
+    entry = news_cache.get(cache_key)
+    if entry is not None:
+        return make_cached_response(entry)
+
+    try:
+        # Revalidate cheaply before paying for the page itself
+        etag = compute_news_etag(request.args)
+        if request.if_none_match.contains_weak(etag):
+            return make_cached_response({"etag": etag, "body": b"", "encoded": {}})
+
+        start_time = time.perf_counter()
+        # Fetch one page of filtered, date-ordered items from CosmosDB
+        items, continuation = fetch_news_page(request.args)
+        log.info("news_fetched", every=True, items=len(items), ms=round((time.perf_counter() - start_time) * 1000, 1))
+
+        with timed("serialize"):
+            body = json.dumps({"items": items, "continuation": continuation}).encode("utf-8")
+        entry = {"etag": etag, "body": body, "encoded": {}}
+        news_cache.set(cache_key, entry)
+        return make_cached_response(entry)
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("news_fetch_failed", error=e)
+        return jsonify({"error": str(e)}), 500
+
+# Function to build a predicate applying the parsed feed filters to one pushed item, or None without filters
+def news_filter_matcher(filters):
+    if not filters:
+        return None
+
+    def match(item):
+        for arg, value in filters.items():
+            field, op = NEWS_FILTERS[arg]
+            actual = item.get(field)
+            if op == "=":
+                if actual != value:
+                    return False
+            elif not isinstance(actual, (int, float)) or (actual < value if op == ">=" else actual > value):
+                return False
+        return True
+
+    return match
+
+# API endpoint pushing new and updated feed items as Server-Sent Events
+@app.route('/api/stream', methods=['GET'])
+def stream_feed():
+    try:
+        filters = parse_news_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Browsers send Last-Event-ID when they reconnect; lastEventId resumes across page loads
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    body = news_stream.events(last_event_id, news_filter_matcher(filters))
+    return app.response_class(body, mimetype=SSE_MIMETYPE, headers=SSE_HEADERS)
+
+# Function to parse a bounded integer query parameter
+def parse_int_arg(value, default, minimum, maximum):
+    try:
+        return max(minimum, min(int(value), maximum))
+    except (TypeError, ValueError):
+        return default
+
+# API endpoint for full-text search over the local index
+@app.route('/api/search', methods=['GET'])
+def search_news():
+    try:
+        # The first search after a fresh deploy builds the index from CosmosDB
+        search_index.ensure_built(lambda: container.read_all_items())
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("search_index_build_failed", error=e)
+        return jsonify({"error": str(e)}), 500
+    filters = {field: request.args.get(field) for field in SEARCH_FACETS}
+    result = search_index.search(
+        request.args.get("q", ""),
+        filters,
+        limit=parse_int_arg(request.args.get("limit"), 20, 1, 100),
+        offset=parse_int_arg(request.args.get("offset"), 0, 0, 10000),
+    )
+    return jsonify(result)
+
+# API endpoint to rebuild the search index from the whole container
+@app.route('/api/search/rebuild', methods=['POST'])
+def rebuild_search_index():
+    try:
+        count = search_index.rebuild(container.read_all_items())
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("search_index_rebuild_failed", error=e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"documents": count})
+
+# API endpoint serving the materialized rollups behind the dashboard charts
+@app.route('/api/aggregates', methods=['GET'])
+def get_aggregates():
+    try:
+        rollups.ensure_built(lambda: container.read_all_items())
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("rollups_build_failed", error=e)
+        return jsonify({"error": str(e)}), 500
+    requested = request.args.get("dimensions")
+    dimensions = [d for d in requested.split(",") if d in ROLLUP_DIMENSIONS] if requested else ROLLUP_DIMENSIONS
+    weeks = parse_int_arg(request.args.get("weeks"), 26, 1, 520)
+    # The rollup version changes on every write, so it identifies the response
+    query_key = f"{','.join(dimensions)}:{weeks}"
+    etag = hashlib.sha1(f"{rollups.version()}:{query_key}".encode("utf-8")).hexdigest()[:32]
+    if request.if_none_match.contains_weak(etag):
+        return make_cached_response({"etag": etag, "body": b"", "encoded": {}})
+    body = json.dumps(rollups.query(dimensions, weeks)).encode("utf-8")
+    return make_cached_response({"etag": etag, "body": body, "encoded": {}})
+
+# API endpoint to recompute the rollups from the whole container
+@app.route('/api/aggregates/rebuild', methods=['POST'])
+def rebuild_aggregates():
+    try:
+        count = rollups.rebuild(container.read_all_items())
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("rollups_rebuild_failed", error=e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"documents": count, "version": rollups.version()})
+
+# API endpoint returning the articles most similar to one article
+@app.route('/api/similar/<doc_id>', methods=['GET'])
+def get_similar(doc_id):
+    try:
+        embedding_index.ensure_built(lambda: container.read_all_items())
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("embeddings_build_failed", error=e)
+        return jsonify({"error": str(e)}), 500
+    found = embedding_index.similar(doc_id, parse_int_arg(request.args.get("limit"), 10, 1, 50))
+    if found is None:
+        return jsonify({"error": f"No embedding for document {doc_id}"}), 404
+    hits, took_ms = found
+    stored = search_index.documents([hit_id for hit_id, _ in hits])
+    items = [{"id": hit_id, "score": score, **stored.get(hit_id, {})} for hit_id, score in hits]
+    return jsonify({"id": doc_id, "items": items, "tookMs": took_ms})
+
+# API endpoint grouping recent articles into emerging trends
+@app.route('/api/trends', methods=['GET'])
+def get_trends():
+    try:
+        embedding_index.ensure_built(lambda: container.read_all_items())
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("embeddings_build_failed", error=e)
+        return jsonify({"error": str(e)}), 500
+    weeks = parse_int_arg(request.args.get("weeks"), TREND_WEEKS, 1, 104)
+    clusters = parse_int_arg(request.args.get("clusters"), TREND_CLUSTERS, 2, 50)
+    return jsonify(embedding_index.trends(search_index.documents, weeks, clusters))
+
+# API endpoint to rebuild the embedding index from the whole container
+@app.route('/api/embeddings/rebuild', methods=['POST'])
+def rebuild_embeddings():
     try:
-        start_time = time.time()
-        # Fetch all items from CosmosDB
-        items = list(container.read_all_items())
-        fetch_time = time.time() - start_time
-        print(f"[INFO] Fetched {len(items)} items from CosmosDB in {fetch_time:.2f} seconds")
-
-        # Return the fetched items directly without normalization
-        sorted_items = sorted(items, key=lambda x: x.get('date', ""), reverse=True)
-        sort_time = time.time() - fetch_time - start_time
-        print(f"[INFO] Sorted items in {sort_time:.2f} seconds")
-
-        return jsonify(sorted_items)
+        count = embedding_index.rebuild(container.read_all_items())
     except exceptions.CosmosHttpResponseError as e:
-        print(f"[ERROR] Error fetching data from CosmosDB: {e}")
+        log.error("embeddings_rebuild_failed", error=e)
         return jsonify({"error": str(e)}), 500
+    return jsonify({"documents": count})
+
+# API endpoint to rebuild the news snapshot from the whole container
+@app.route('/api/snapshot/refresh', methods=['POST'])
+def refresh_snapshot():
+    try:
+        count = news_snapshot.refresh(load_snapshot_documents(), NEWS_FIELDS)
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("snapshot_refresh_failed", error=e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"documents": count, "version": news_snapshot.version()})
+
+# API endpoint serving the items that matched alert rules, newest match first
+@app.route('/api/alerts', methods=['GET'])
+def get_alerts():
+    rule_id = request.args.get("rule")
+    if rule_id is not None and not rule_id.isdigit():
+        return jsonify({"error": "rule must be a rule id"}), 400
+    total, matches = alert_engine.alerts(
+        int(rule_id) if rule_id is not None else None,
+        limit=parse_int_arg(request.args.get("limit"), 50, 1, 500),
+        offset=parse_int_arg(request.args.get("offset"), 0, 0, 100000),
+    )
+    items = [
+        {
+            "id": match_id,
+            "ruleId": match_rule,
+            "rule": rule_name,
+            "matchedAt": datetime.fromtimestamp(matched_at, timezone.utc).isoformat(timespec="seconds"),
+            "item": {field: item[field] for field in NEWS_FIELDS if field in item},
+        }
+        for match_id, match_rule, rule_name, matched_at, item in matches
+    ]
+    return jsonify({"total": total, "items": items})
+
+# API endpoint listing the alert rules
+@app.route('/api/alerts/rules', methods=['GET'])
+def get_alert_rules():
+    return jsonify({"rules": alert_engine.rules()})
+
+# API endpoint to add an alert rule; it is matched against every item written from now on
+@app.route('/api/alerts/rules', methods=['POST'])
+def create_alert_rule():
+    try:
+        rule = alert_engine.add_rule(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(rule), 201
+
+# API endpoint to delete an alert rule and its matches
+@app.route('/api/alerts/rules/<int:rule_id>', methods=['DELETE'])
+def delete_alert_rule(rule_id):
+    if not alert_engine.delete_rule(rule_id):
+        return jsonify({"error": f"No alert rule {rule_id}"}), 404
+    return jsonify({"deleted": rule_id})
+
+# Compress any other large JSON response the client can decode
+@app.after_request
+def compress_response(response):
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype != "application/json"
+    ):
+        return response
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding:
+        response.set_data(compress(body, encoding))
+        response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+    return response
+
+# API endpoint exposing the news cache counters
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    return jsonify({
+        "news": news_cache.stats(),
+        "llm": llm_cache.stats(),
+        "search": search_index.stats(),
+        "embeddings": embedding_index.stats(),
+        "snapshot": news_snapshot.stats(),
+        "tagger": default_tagger.stats(),
+        "dates": date_stats(),
+        "stream": news_stream.stats(),
+        "alerts": alert_engine.stats(),
+    })
+
+# Function to report the caches' counters on /metrics, read from their own stats at scrape time
+@register_collector
+def cache_metrics():
+    caches = {"news": news_cache.stats(), "llm": llm_cache.stats()}
+    dates = date_stats()
+    snapshot = news_snapshot.stats()
+    return [
+        ("aec_cache_hits_total", "counter", "Cache hits",
+         [({"cache": name}, stats["hits"]) for name, stats in caches.items()] + [({"cache": "dates"}, dates["memoHits"])]),
+        ("aec_cache_misses_total", "counter", "Cache misses",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()] + [({"cache": "dates"}, dates["memoMisses"])]),
+        ("aec_news_reads_total", "counter", "News feed pages served, by where they were read from",
+         [({"source": "snapshot"}, snapshot["served"]), ({"source": "cosmos"}, snapshot["fallbacks"])]),
+        ("aec_snapshot_documents", "gauge", "Documents in the news snapshot", [({}, snapshot["documents"])]),
+        ("aec_stream_subscribers", "gauge", "Open /api/stream connections", [({}, news_stream.stats()["subscribers"])]),
+    ]
+
+# API endpoint exposing this process's metrics in the Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return app.response_class(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+# API endpoint to drop cached responses after an out-of-band write
+@app.route('/api/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    news_cache.invalidate()
+    return jsonify(news_cache.stats())
 
 if __name__ == '__main__':
     print("Starting Flask app...")
+    # Development server; see asgi.py and the README for the multi-worker modes
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,295 @@
+"""ASGI entry point: the API under an async, multi-worker server.
+
+    uvicorn asgi:app --workers 4        (from backend/)
+
+GET /api/news, the busiest route, is served natively: from the local
+snapshot when it is fresh, and otherwise with the async Cosmos client
+(azure.cosmos.aio), so a worker keeps answering other requests while it
+waits on Cosmos. GET /api/stream is native too: an open event stream is a
+coroutine waiting for the worker's stream reader, not a thread. Streamed
+feeds and every other route run the Flask app on
+a pool of WSGI_THREADS threads per worker, streaming its responses chunk by
+chunk. Each worker is a process with its own event loop and connection
+pools; the memory-mapped snapshot and embeddings are shared between the
+workers through the page cache.
+"""
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from azure.cosmos import exceptions
+from werkzeug.datastructures import MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header, parse_etags
+
+from app import (
+    SSE_HEADERS, SSE_MIMETYPE, app as flask_app, build_news_filters, build_news_query, negotiate_cached, news_cache,
+    news_etag, news_filter_matcher, news_stream, news_validator_key, news_validators, parse_news_filters, parse_page_size, requested_stream_format,
+    snapshot_news_entry, use_news_snapshot,
+)
+from clients import close_async_clients, get_async_container
+from logs import get_logger
+from metrics import PROFILE_HEADER, current_profile, end_profile, profile_requested, request_seconds, start_profile, timed
+from news_stream import HEARTBEAT
+
+# Threads per worker running the Flask routes
+WSGI_THREADS = int(os.getenv("WSGI_THREADS", "32"))
+
+log = get_logger("asgi")
+
+
+class WsgiBridge:
+    """Runs a WSGI app for ASGI requests on a thread pool, streaming its response."""
+
+    def __init__(self, wsgi_app, threads=WSGI_THREADS):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+    def environ(self, scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1] or 80),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1")
+            if name == "content-type":
+                key = "CONTENT_TYPE"
+            elif name == "content-length":
+                key = "CONTENT_LENGTH"
+            else:
+                key = "HTTP_" + name.upper().replace("-", "_")
+            value = value.decode("latin-1")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def __call__(self, scope, receive, send):
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+        loop = asyncio.get_running_loop()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+        iterable = await loop.run_in_executor(self.executor, self.wsgi_app, self.environ(scope, body), start_response)
+        iterator = iter(iterable)
+        try:
+            # A WSGI app may call start_response as late as its first chunk
+            chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            while chunk is not None:
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await loop.run_in_executor(self.executor, next, iterator, None)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(iterable, "close"):
+                await loop.run_in_executor(self.executor, iterable.close)
+
+
+wsgi_app = WsgiBridge(flask_app)
+
+
+# Function to send a JSON response with the headers the Flask app would add; returns the status
+async def send_json(send, request_headers, status, body=b"", extra_headers=()):
+    headers = [(b"content-length", str(len(body)).encode())]
+    if status != 304:
+        headers.append((b"content-type", b"application/json"))
+    headers.extend(extra_headers)
+    if "origin" in request_headers:
+        # What flask-cors sends for its default allow-all configuration
+        headers.append((b"access-control-allow-origin", b"*"))
+    profile = current_profile()
+    if profile is not None:
+        headers.append((b"server-timing", profile.server_timing().encode()))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+    return status
+
+
+# Function to send a cache entry, negotiating compression and honouring If-None-Match
+async def send_cached(send, request_headers, entry):
+    status, body, encoding = negotiate_cached(
+        entry, parse_etags(request_headers.get("if-none-match")), request_headers.get("accept-encoding")
+    )
+    headers = [
+        (b"etag", f'W/"{entry["etag"]}"'.encode()),
+        (b"cache-control", b"no-cache"),
+        (b"vary", b"Accept-Encoding"),
+    ]
+    if encoding:
+        headers.append((b"content-encoding", encoding.encode()))
+    return await send_json(send, request_headers, status, body, headers)
+
+
+# Function to compute the feed's ETag with both aggregates queried concurrently, cached like the sync app's
+async def compute_news_etag_async(container, args):
+    where, parameters = build_news_filters(args)
+    key = news_validator_key(where, parameters)
+    aggregates = news_validators.get(key)
+    if aggregates is None:
+        async def aggregate(expression):
+            async for value in container.query_items(query=f"SELECT VALUE {expression} FROM c{where}", parameters=parameters):
+                return value
+            return 0
+
+        with timed("validate"):
+            aggregates = await asyncio.gather(aggregate("MAX(c._ts)"), aggregate("COUNT(1)"))
+        news_validators.set(key, aggregates)
+    return news_etag(*aggregates, args)
+
+
+# Function to fetch a single page of news items with the async Cosmos client
+async def fetch_news_page_async(container, args):
+    query, parameters = build_news_query(args)
+    pager = container.query_items(
+        query=query, parameters=parameters, max_item_count=parse_page_size(args.get("limit"))
+    ).by_page(args.get("continuation") or None)
+    items = []
+    with timed("fetch"):
+        async for page in pager:
+            items = [item async for item in page]
+            break
+    return items, pager.continuation_token
+
+
+# ASGI endpoint to fetch one page of news data
+async def get_news(request_headers, args, send):
+    try:
+        filters = parse_news_filters(args)
+    except ValueError as e:
+        return await send_json(send, request_headers, 400, json.dumps({"error": str(e)}).encode("utf-8"))
+    if use_news_snapshot(args):
+        entry = snapshot_news_entry(args, filters, parse_etags(request_headers.get("if-none-match")))
+        return await send_cached(send, request_headers, entry)
+
+    cache_key = tuple(sorted(args.items(multi=True)))
+    entry = news_cache.get(cache_key)
+    if entry is not None:
+        return await send_cached(send, request_headers, entry)
+
+    try:
+        container = await get_async_container()
+        # Revalidate cheaply before paying for the page itself
+        etag = await compute_news_etag_async(container, args)
+        if parse_etags(request_headers.get("if-none-match")).contains_weak(etag):
+            return await send_cached(send, request_headers, {"etag": etag, "body": b"", "encoded": {}})
+
+        start_time = time.perf_counter()
+        items, continuation = await fetch_news_page_async(container, args)
+        log.info("news_fetched", every=True, items=len(items), ms=round((time.perf_counter() - start_time) * 1000, 1))
+
+        with timed("serialize"):
+            body = json.dumps({"items": items, "continuation": continuation}).encode("utf-8")
+        entry = {"etag": etag, "body": body, "encoded": {}}
+        news_cache.set(cache_key, entry)
+        return await send_cached(send, request_headers, entry)
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("news_fetch_failed", error=e)
+        return await send_json(send, request_headers, 500, json.dumps({"error": str(e)}).encode("utf-8"))
+
+
+# ASGI endpoint pushing new and updated feed items as Server-Sent Events
+async def stream_feed(request_headers, args, receive, send):
+    try:
+        match = news_filter_matcher(parse_news_filters(args))
+    except ValueError as e:
+        return await send_json(send, request_headers, 400, json.dumps({"error": str(e)}).encode("utf-8"))
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def listener():
+        loop.call_soon_threadsafe(wake.set)
+
+    async def wait_for_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+        wake.set()
+
+    async def collect(cursor):
+        if news_stream.buffered(cursor) is None:
+            # Catching up from the event log reads SQLite
+            return await loop.run_in_executor(None, news_stream.collect, cursor, match)
+        return news_stream.collect(cursor, match)
+
+    last_event_id = request_headers.get("last-event-id") or args.get("lastEventId")
+    cursor = await loop.run_in_executor(None, news_stream.subscribe, last_event_id)
+    news_stream.add_listener(listener)
+    disconnected = asyncio.ensure_future(wait_for_disconnect())
+    try:
+        headers = [(b"content-type", SSE_MIMETYPE.encode())]
+        headers.extend((name.lower().encode(), value.encode()) for name, value in SSE_HEADERS.items())
+        if "origin" in request_headers:
+            headers.append((b"access-control-allow-origin", b"*"))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": news_stream.opening(cursor), "more_body": True})
+        while not disconnected.done():
+            wake.clear()
+            chunk, cursor = await collect(cursor)
+            if chunk:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                continue
+            try:
+                await asyncio.wait_for(wake.wait(), HEARTBEAT)
+            except asyncio.TimeoutError:
+                await send({"type": "http.response.body", "body": news_stream.heartbeat(cursor), "more_body": True})
+    finally:
+        disconnected.cancel()
+        news_stream.remove_listener(listener)
+        news_stream.unsubscribe()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await close_async_clients()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] == "http" and scope["method"] == "GET" and scope["path"] in ("/api/news", "/api/stream"):
+        request_headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        args = MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+        if scope["path"] == "/api/stream":
+            return await stream_feed(request_headers, args, receive, send)
+        accept = parse_accept_header(request_headers.get("accept"), MIMEAccept)
+        if not requested_stream_format(args, accept):
+            started = time.perf_counter()
+            token = start_profile() if profile_requested(request_headers.get(PROFILE_HEADER.lower())) else None
+            try:
+                status = await get_news(request_headers, args, send)
+            finally:
+                if token is not None:
+                    end_profile(token)
+            request_seconds.observe(time.perf_counter() - started, endpoint="get_news", status=status)
+            return
+    await wsgi_app(scope, receive, send)
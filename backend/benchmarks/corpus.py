@@ -0,0 +1,96 @@
+"""Synthetic corpora for the benchmarks, built from the scraped datasets.
+
+The records under `Scraped Data/` are the templates. Item i is a copy of
+template i % len(templates): later copies get a numbered title, their own
+URL (so ids, dedupe and the LLM cache treat them as new articles) and a
+date moved back up to three years, written in the template's label style.
+The same size and seed always give the same corpus.
+"""
+import glob
+import json
+import os
+import random
+import sys
+from datetime import timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BACKEND_DIR)
+sys.path.append(os.path.join(BACKEND_DIR, "scrapers"))
+from base import normalize_record
+from dates import DAY_MONTH_YEAR, ISO_DATE, parse_date
+from dedupe import document_id, record_id
+
+SCRAPED_DIR = os.path.join(BACKEND_DIR, "Scraped Data")
+IMPACTS = ("high", "medium", "low")
+# Dates of copies are spread over this many days before the template's date
+DATE_SPREAD_DAYS = 3 * 365
+SCRAPED_AT = "2025-06-01T00:00:00+00:00"
+
+
+def load_templates(paths=None):
+    """Normalized records of the scraped JSON datasets, as the pipeline reads them."""
+    templates = []
+    for path in paths or sorted(glob.glob(os.path.join(SCRAPED_DIR, "*", "*.json"))):
+        source = os.path.splitext(os.path.basename(path))[0]
+        with open(path, encoding="utf-8") as f:
+            for row in json.load(f):
+                # Fixed scrape time, so the corpus does not depend on when it is built
+                row = dict({key: value for key, value in row.items() if key != "id"}, scrapedAt=SCRAPED_AT)
+                templates.append(normalize_record(row, row.get("source") or source))
+    return templates
+
+
+def _relabel(label, source, days_back):
+    parsed = parse_date(label, source)
+    if parsed is None:
+        return label
+    moved = parsed - timedelta(days=days_back)
+    if ISO_DATE.match(label):
+        return moved.strftime("%Y-%m-%d")
+    if DAY_MONTH_YEAR.search(label):
+        return moved.strftime("%d %B %Y")
+    return moved.strftime("%B %d, %Y")
+
+
+def raw_records(size, seed=0, templates=None):
+    """Yield `size` scraped records (shared record schema), before ids or normalization."""
+    templates = templates or load_templates()
+    rng = random.Random(seed)
+    for i in range(size):
+        template = templates[i % len(templates)]
+        copy_number = i // len(templates)
+        record = dict(template, tags=list(template["tags"]))
+        if copy_number:
+            if record.get("title"):
+                record["title"] = f"{record['title']} ({copy_number})"
+            if record.get("url"):
+                record["url"] += ("&" if "?" in record["url"] else "?") + f"copy={copy_number}"
+            if record.get("date"):
+                record["date"] = _relabel(record["date"], record["source"], rng.randrange(DATE_SPREAD_DAYS))
+        yield record
+
+
+def raw_documents(size, seed=0, templates=None):
+    """Yield `size` Cosmos documents as the pipeline writes them, not yet normalized."""
+    seen = set()
+    for record in raw_records(size, seed, templates):
+        document = {key: value for key, value in record.items() if value is not None}
+        document["id"] = record_id(document.get("source"), document)
+        # Copies of records without a title or URL would otherwise share an id
+        if document["id"] in seen:
+            document["id"] = document_id(document.get("source"), title=f"{document['id']}:{len(seen)}")
+        seen.add(document["id"])
+        yield document
+
+
+def normalized_documents(size, seed=0, templates=None):
+    """Return `size` documents normalized as the backfill leaves them, without calling the LLM."""
+    from normalize import normalize_item
+
+    documents = []
+    for document in raw_documents(size, seed, templates):
+        title = document.get("title") or "No Title"
+        generated = (f"Summary of {title}", IMPACTS[len(title) % len(IMPACTS)])
+        normalize_item(document, generated, upsert=False)
+        documents.append(document)
+    return documents
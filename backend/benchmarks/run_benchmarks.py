@@ -0,0 +1,417 @@
+"""Offline benchmarks for the news API, the backfill, uploads and the scraper parsers.
+
+    python benchmarks/run_benchmarks.py                           (from backend/)
+    python benchmarks/run_benchmarks.py --sizes 1000,100000 --only news,snapshot
+    python benchmarks/run_benchmarks.py --save-baseline
+
+Nothing leaves the machine: CosmosDB is replaced by the in-memory
+LocalContainer (utils/local_container.py) and Azure OpenAI by the fake
+chat-completions server (utils/fake_openai_server.py), both adding the
+round-trip latency given on the command line. Corpora of every size are
+synthesized from the scraped datasets (corpus.py). Each benchmark and size
+runs in its own process with an empty cache directory.
+
+Results are compared with the stored baseline (benchmarks/baseline.json by
+default). A metric more than --tolerance worse than its baseline value is a
+regression, and the run exits with status 1. Record the baseline on the
+machine the runs are compared on; it also stores the settings it was taken
+with, and results taken with other settings are not compared.
+"""
+import argparse
+import contextlib
+import glob
+import importlib.util
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "baseline.json")
+# Cache locations the child processes must not inherit
+CACHE_VARIABLES = (
+    "SNAPSHOT_PATH", "EMBEDDINGS_PATH", "ROLLUPS_PATH", "SEARCH_INDEX_PATH", "LLM_CACHE_PATH",
+    "DEDUPE_INDEX_PATH", "CRAWL_STATE_PATH", "STREAM_LOG_PATH", "ALERTS_PATH",
+)
+# Feed queries measured against the API, as (label, query string)
+NEWS_QUERIES = [
+    ("latest", "limit=50"),
+    ("competitor", "competitor=Smec&limit=50"),
+    ("impact", "impact=high&limit=50"),
+    ("dateRange", "from=2024-01-01&to=2024-12-31&limit=50"),
+    ("largePage", "limit=500"),
+]
+# Articles per synthetic listing page; the topic page parsers read the first 10
+PAGE_ARTICLES = 10
+# Alert rule counts matched against the corpus; throughput should barely depend on them
+ALERT_RULE_COUNTS = (100, 10000)
+
+
+def percentiles(samples):
+    """p50/p95/p99/mean of latencies in seconds, in milliseconds."""
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))] * 1000
+
+    return {
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+    }
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+# Benchmark of /api/news served from CosmosDB: cache misses, cache hits and 304 revalidations
+def bench_news(size, options):
+    os.environ["NEWS_SNAPSHOT"] = "0"
+    import corpus
+    from clients import use_clients
+    from utils.local_container import LocalContainer
+
+    use_clients(container=LocalContainer(corpus.normalized_documents(size), latency=options.cosmos_latency))
+    from app import app, news_cache
+
+    client = app.test_client()
+    samples = {"miss": [], "hit": [], "revalidate": [], "nextPage": []}
+    for _ in range(options.requests):
+        for _label, query in NEWS_QUERIES:
+            news_cache.clear()
+            response, elapsed = timed(client.get, f"/api/news?{query}")
+            samples["miss"].append(elapsed)
+            etag = response.headers["ETag"]
+            continuation = response.get_json()["continuation"]
+            samples["hit"].append(timed(client.get, f"/api/news?{query}")[1])
+            news_cache.clear()
+            revalidated, elapsed = timed(client.get, f"/api/news?{query}", headers={"If-None-Match": etag})
+            assert revalidated.status_code == 304
+            samples["revalidate"].append(elapsed)
+            if continuation:
+                next_query = f"/api/news?{query}&continuation={continuation}"
+                samples["nextPage"].append(timed(client.get, next_query)[1])
+    return {
+        f"{name}.{metric}": value
+        for name, values in samples.items() if values
+        for metric, value in percentiles(values).items()
+    }
+
+
+# Benchmark of /api/news served from the local snapshot, and of building the snapshot
+def bench_snapshot(size, options):
+    import corpus
+    from clients import use_clients
+    from utils.local_container import LocalContainer
+
+    use_clients(container=LocalContainer(corpus.normalized_documents(size), latency=options.cosmos_latency))
+    from app import app
+
+    client = app.test_client()
+    _, build_time = timed(client.post, "/api/snapshot/refresh")
+    results = {"build_s": build_time, "build.docs_per_sec": size / build_time}
+    samples = []
+    for _ in range(options.requests):
+        for _label, query in NEWS_QUERIES:
+            response, elapsed = timed(client.get, f"/api/news?{query}")
+            assert response.get_json()["continuation"] is None or response.get_json()["continuation"].startswith("snapshot:")
+            samples.append(elapsed)
+    results.update({f"page.{metric}": value for metric, value in percentiles(samples).items()})
+    response, elapsed = timed(lambda: client.get("/api/news?format=ndjson").get_data())
+    results["stream.docs_per_sec"] = size / elapsed
+    results["stream.mb_per_sec"] = len(response) / elapsed / 1e6
+    return results
+
+
+# Benchmark of the full backfill: tagging, batched LLM enrichment, normalization and bulk upserts
+def bench_backfill(size, options):
+    from utils.fake_openai_server import start_fake_openai_server
+
+    server = start_fake_openai_server(latency=options.llm_latency)
+    # Read when the OpenAI client is first created
+    os.environ["OPENAI_ENDPOINT"] = server.endpoint
+    import corpus
+    from utils.local_container import LocalContainer
+    from normalize_data import backfill_data
+
+    container = LocalContainer(corpus.raw_documents(size), latency=options.cosmos_latency)
+
+    _, elapsed = timed(backfill_data, container)
+    server.shutdown()
+    return {
+        "docs_per_sec": size / elapsed,
+        "elapsed_s": elapsed,
+        "llm_requests_per_doc": server.requests / size,
+        "upserts_per_doc": container.upserts / size,
+    }
+
+
+# Benchmark of uploading scraped documents with the shared bulk writer, as upload_to_cosmosdb.py does
+def bench_upload(size, options):
+    import corpus
+    from bulk_writer import BulkWriter
+    from utils.local_container import LocalContainer
+
+    documents = list(corpus.raw_documents(size))
+    container = LocalContainer(latency=options.cosmos_latency)
+    stats, elapsed = timed(BulkWriter(container).write, documents)
+    assert stats["written"] == size, stats
+    return {"docs_per_sec": size / elapsed, "elapsed_s": elapsed}
+
+
+# Benchmark of matching written documents against standing alert rules
+def bench_alerts(size, options):
+    import random
+    from collections import Counter
+    import corpus
+    from alerts import AlertEngine
+    from search_index import document_terms
+
+    documents = corpus.normalized_documents(size)
+    values = {field: sorted({d[field] for d in documents if d.get(field)}) for field in ("competitor", "region", "sector")}
+    frequencies = Counter(word for document in documents[:1000] for word in document_terms(document))
+    # Alert keywords are specific; common words would measure the matches stored, not the index
+    words = sorted(word for word, frequency in frequencies.items() if frequency <= 3)
+    rng = random.Random(0)
+    results = {}
+    for count in ALERT_RULE_COUNTS:
+        engine = AlertEngine(os.path.join(os.environ["CACHE_DIR"], f"alerts-{count}.sqlite3"))
+        for i in range(count):
+            # Keyword rules, alone, for one competitor or for a region and sector; few items match each
+            rule = {"keywords": [rng.choice(words)]}
+            if i % 3 == 1:
+                rule["competitor"] = rng.choice(values["competitor"])
+            elif i % 3 == 2:
+                rule.update(region=rng.choice(values["region"]), sector=rng.choice(values["sector"]))
+            engine.add_rule(rule)
+        # Build the rule index outside the measurement
+        engine.match(documents[0])
+        engine.candidates_checked = 0
+        _, elapsed = timed(engine.update, documents)
+        results[f"rules{count}.docs_per_sec"] = size / elapsed
+        results[f"rules{count}.candidates_per_doc"] = engine.candidates_checked / size
+    return results
+
+
+def _load_scraper(filename):
+    path = glob.glob(os.path.join(BACKEND_DIR, "scrapers", "*", filename))[0]
+    spec = importlib.util.spec_from_file_location(os.path.splitext(filename)[0].strip().replace(" ", "_"), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _escape(value):
+    return (value or "").replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+
+
+def _dive_page(records, list_tag):
+    """A constructiondive/smartcitiesdive topic listing."""
+    items = "".join(
+        f'<{list_tag} class="row feed__item"><div class="feed__image-container"><img src="{_escape(r.get("image"))}"></div>'
+        f'<h3 class="feed__title"><a href="/news/{i}/">{_escape(r.get("title"))}</a></h3>'
+        f'<p class="feed__description">{_escape(r.get("excerpt"))}</p>'
+        f'<span class="secondary-label">{_escape(r.get("date"))}</span></{list_tag}>'
+        for i, r in enumerate(records)
+    )
+    return f"<html><body><nav>{'<a href=/x>menu</a>' * 40}</nav><ul class=feed>{items}</ul></body></html>"
+
+
+def _gcr_page(records):
+    items = "".join(
+        f'<article class="post type-post"><div class="post-image"><img src="{_escape(r.get("image"))}"></div>'
+        f'<h2 class="entry-title"><a href="{_escape(r.get("url"))}">{_escape(r.get("title"))}</a></h2></article>'
+        for r in records
+    )
+    return f"<html><body><nav>{'<a href=/x>menu</a>' * 40}</nav><main>{items}</main></body></html>"
+
+
+def _aecom_page(records):
+    items = "".join(
+        f'<div class="press-release-item-wrapper"><div class="pr-date"><a href="#">{_escape(r.get("date"))}</a></div>'
+        f'<h3><a href="{_escape(r.get("url"))}">{_escape(r.get("title"))}</a></h3>'
+        f'<div class="pr-excerpt">{_escape(r.get("excerpt"))}</div></div>'
+        for r in records
+    )
+    return f"<html><body><nav>{'<a href=/x>menu</a>' * 40}</nav>{items}</body></html>"
+
+
+# Benchmark of the HTTP scrapers' HTML parsing and record normalization (the browser scrapers need a live site)
+def bench_scrapers(size, options):
+    import corpus
+    from base import normalize_record
+
+    records = list(corpus.raw_records(size))
+    pages = [records[start:start + PAGE_ARTICLES] for start in range(0, size, PAGE_ARTICLES)]
+    construction = _load_scraper("constructiondive_news_scraper.py")
+    smart_cities = _load_scraper("smartcitiesdive_com_news_scrapper.py")
+    global_review = _load_scraper("globalconstructionreview_com_scraper.py")
+    aecom = _load_scraper("AECOM _scrapper.py")
+    parsers = {
+        "constructiondive": (construction, lambda html: construction.parse_topic_page(html, "tech"), lambda p: _dive_page(p, "div")),
+        "smartcitiesdive": (smart_cities, lambda html: smart_cities.parse_topic_page(html, "tech"), lambda p: _dive_page(p, "li")),
+        "globalconstructionreview": (global_review, lambda html: global_review.parse_topic_page(html, "news"), _gcr_page),
+        "aecom": (aecom, aecom.parse_press_releases, _aecom_page),
+    }
+    results = {}
+    for name, (module, parse, render) in parsers.items():
+        html = [render(page) for page in pages]
+        start = time.perf_counter()
+        parsed = 0
+        for page in html:
+            for row in parse(page):
+                normalize_record(row, module.SOURCE)
+                parsed += 1
+        elapsed = time.perf_counter() - start
+        assert parsed == size, (name, parsed)
+        results[f"{name}.records_per_sec"] = parsed / elapsed
+        results[f"{name}.mb_per_sec"] = sum(map(len, html)) / elapsed / 1e6
+    return results
+
+
+BENCHMARKS = {
+    "news": bench_news,
+    "snapshot": bench_snapshot,
+    "backfill": bench_backfill,
+    "upload": bench_upload,
+    "alerts": bench_alerts,
+    "scrapers": bench_scrapers,
+}
+
+
+def lower_is_better(metric):
+    return metric.endswith("_ms") or metric.endswith("_s") or metric.endswith("_per_doc")
+
+
+def run_worker(args):
+    """Run one benchmark in this process and write its metrics to args.output."""
+    sys.path[:0] = [BACKEND_DIR, BENCHMARKS_DIR]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = BENCHMARKS[args.worker](args.size, args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+
+
+def run_benchmark(name, size, args):
+    """Run one benchmark in a child process with an empty cache directory; return its metrics."""
+    with tempfile.TemporaryDirectory(prefix="bench-") as cache_dir:
+        output = os.path.join(cache_dir, "results.json")
+        env = {key: value for key, value in os.environ.items() if key not in CACHE_VARIABLES}
+        env.update({
+            "CACHE_DIR": cache_dir,
+            "CRAWL_STATE_PATH": os.path.join(cache_dir, "crawl_state.sqlite3"),
+            "OPENAI_API_KEY": "fake",
+            "OPENAI_API_VERSION": "2024-02-01",
+            "OPENAI_DEPLOYMENT_NAME": "fake",
+            # The fake server has no quota; keep the client-side limiter out of the measurement
+            "OPENAI_TOKENS_PER_MINUTE": "1000000000",
+        })
+        command = [
+            sys.executable, os.path.abspath(__file__), "--worker", name, "--size", str(size), "--output", output,
+            "--requests", str(args.requests), "--cosmos-latency", str(args.cosmos_latency),
+            "--llm-latency", str(args.llm_latency),
+        ]
+        completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, stdout=None if args.verbose else subprocess.DEVNULL)
+        if completed.returncode != 0:
+            print(f"[ERROR] Benchmark {name} ({size} docs) failed with exit status {completed.returncode}")
+            return None
+        with open(output, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def settings(args):
+    return {"requests": args.requests, "cosmosLatency": args.cosmos_latency, "llmLatency": args.llm_latency}
+
+
+def compare(results, baseline, tolerance):
+    """Return [(key, value, baseline value, relative change, regressed)] for every metric."""
+    rows = []
+    for key, value in results.items():
+        previous = baseline.get(key)
+        if previous is None or previous == 0:
+            rows.append((key, value, None, None, False))
+            continue
+        change = (value - previous) / previous
+        worse = change if lower_is_better(key) else -change
+        rows.append((key, value, previous, change, worse > tolerance))
+    return rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--sizes", default="1000,10000", help="comma-separated corpus sizes (1k to 1M)")
+    arg_parser.add_argument("--only", help=f"comma-separated benchmarks to run ({', '.join(BENCHMARKS)})")
+    arg_parser.add_argument("--requests", type=int, default=20, help="rounds of feed queries per API benchmark")
+    arg_parser.add_argument("--cosmos-latency", type=float, default=0.002, help="seconds added to every Cosmos request")
+    arg_parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds added to every completion")
+    arg_parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results to compare with")
+    arg_parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    arg_parser.add_argument("--tolerance", type=float, default=0.25, help="relative slowdown flagged as a regression")
+    arg_parser.add_argument("--verbose", action="store_true", help="show the benchmarked code's output")
+    arg_parser.add_argument("--worker", choices=BENCHMARKS, help=argparse.SUPPRESS)
+    arg_parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    arg_parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        arg_parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    results = {}
+    failed = False
+    for name in names:
+        for size in sizes:
+            print(f"[INFO] Running {name} with {size} documents...")
+            metrics, elapsed = timed(run_benchmark, name, size, args)
+            if metrics is None:
+                failed = True
+                continue
+            print(f"[INFO] Finished {name} with {size} documents in {elapsed:.1f} seconds")
+            results.update({f"{name}[{size}].{metric}": value for metric, value in metrics.items()})
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            stored = json.load(f)
+        if stored.get("settings") == settings(args):
+            baseline = stored["results"]
+        else:
+            print(f"[WARN] {args.baseline} was recorded with other settings ({stored.get('settings')}); not comparing")
+
+    rows = compare(results, baseline, args.tolerance)
+    width = max((len(row[0]) for row in rows), default=10)
+    print(f"\n{'metric':<{width}}  {'value':>12}  {'baseline':>12}  {'change':>8}")
+    for key, value, previous, change, regressed in rows:
+        previous_text = f"{previous:12.2f}" if previous is not None else f"{'-':>12}"
+        change_text = f"{change:+8.1%}" if change is not None else f"{'-':>8}"
+        print(f"{key:<{width}}  {value:12.2f}  {previous_text}  {change_text}{'  REGRESSION' if regressed else ''}")
+
+    regressions = [row[0] for row in rows if row[4]]
+    if args.save_baseline and failed:
+        print("[WARN] Not saving the baseline: some benchmarks failed")
+    elif args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings(args), "results": results}, f, indent=2, sort_keys=True)
+        print(f"[INFO] Saved {len(results)} metrics to {args.baseline}")
+    if regressions:
+        print(f"[ERROR] {len(regressions)} metrics regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+    if regressions or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
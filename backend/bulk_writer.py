@@ -0,0 +1,214 @@
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from azure.cosmos import exceptions
+
+from logs import get_logger
+from metrics import timed
+from response_cache import mark_stale
+import write_hooks
+
+log = get_logger("bulk_writer")
+
+MAX_WORKERS = int(os.getenv("BULK_WRITE_CONCURRENCY", "16"))
+# Upserts in flight for one partition key value at most
+PER_PARTITION = int(os.getenv("BULK_WRITE_PARTITION_CONCURRENCY", "4"))
+# Documents read ahead of the writes (queued or in flight), and stored documents passed to the write hooks at once
+CHUNK_SIZE = 1000
+MAX_RETRIES = 10
+# Status codes worth retrying: throttled, timeout, write conflict, unavailable
+RETRYABLE_STATUS = {408, 429, 449, 503}
+
+
+def partition_key_path(container):
+    """The container's partition key path, e.g. "/competitor"."""
+    return container.read()["partitionKey"]["paths"][0]
+
+
+def _retry_after_seconds(error, attempt):
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("x-ms-retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    return min(10.0, 0.1 * 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+class BulkWriter:
+    """Upserts many documents in parallel with a bounded worker pool.
+
+    Every worker takes the next document as soon as it is free; there is no
+    barrier between chunks. At most per_partition upserts run at once for
+    one partition key value, so a hot partition is not hammered by every
+    thread while other partitions sit idle, yet a single dominant key still
+    gets several workers. The partition key path is read from the
+    container's properties unless one is given. Throttled requests wait for
+    the server's x-ms-retry-after-ms before retrying. At most chunk_size
+    documents are read ahead of the writes, so any iterable (including a
+    generator) can be written without loading it all into memory.
+    """
+
+    def __init__(self, container, max_workers=MAX_WORKERS, partition_key=None,
+                 chunk_size=CHUNK_SIZE, max_retries=MAX_RETRIES, per_partition=PER_PARTITION):
+        self.container = container
+        self.max_workers = max_workers
+        self.per_partition = max(1, per_partition)
+        # A path such as "/competitor"; read from the container on the first write when None
+        self.partition_key = partition_key
+        self.chunk_size = chunk_size
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.written = 0
+        self.failed = 0
+        self.throttled = 0
+        self.request_charge = 0.0
+        self.stored_ids = []
+
+    def _partition_key_parts(self):
+        if self.partition_key is None:
+            try:
+                self.partition_key = partition_key_path(self.container)
+            except (exceptions.CosmosHttpResponseError, AttributeError, KeyError, IndexError) as e:
+                # Grouping by id gives every document its own group: no worse than not grouping
+                log.warn("partition_key_unknown", fallback="/id", error=e)
+                self.partition_key = "/id"
+        return [part for part in self.partition_key.split("/") if part]
+
+    def _partition_value(self, document, parts):
+        value = document
+        for part in parts:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        # Unhashable values (lists, objects) are not valid keys; group them by their JSON
+        return value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+
+    def _record_charge(self, headers, _result):
+        # Headers come from the shared connection, so the total is approximate
+        # when several workers finish at the same moment
+        try:
+            charge = float(headers.get("x-ms-request-charge", 0))
+        except (TypeError, ValueError):
+            charge = 0.0
+        with self._lock:
+            self.request_charge += charge
+
+    def _upsert(self, document):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with timed("upsert"):
+                    self.container.upsert_item(document, response_hook=self._record_charge)
+                return True
+            except exceptions.CosmosHttpResponseError as e:
+                if e.status_code not in RETRYABLE_STATUS or attempt == self.max_retries:
+                    log.error("upsert_failed", every=True, id=document.get("id"), error=e)
+                    return False
+                if e.status_code == 429:
+                    with self._lock:
+                        self.throttled += 1
+                time.sleep(_retry_after_seconds(e, attempt))
+            except Exception as e:
+                # Connection errors, unserializable documents, ...: fail this document only
+                log.error("upsert_failed", every=True, id=document.get("id"), error=e)
+                return False
+        return False
+
+    def _run(self, pool, key, document):
+        try:
+            stored = self._upsert(document)
+        except Exception as e:
+            # _upsert handles upsert errors; this only guards the bookkeeping below
+            log.error("upsert_failed", every=True, id=document.get("id"), error=e)
+            stored = False
+        with self._cond:
+            if stored:
+                self.written += 1
+                self.stored_ids.append(document.get("id"))
+                self._stored.append(document)
+            else:
+                self.failed += 1
+            waiting = self._waiting.get(key)
+            if waiting:
+                # Hand this key's slot to its next document
+                pool.submit(self._run, pool, key, waiting.popleft())
+                self._queued -= 1
+                if not waiting:
+                    del self._waiting[key]
+            else:
+                self._in_flight -= 1
+                self._active[key] -= 1
+                if not self._active[key]:
+                    del self._active[key]
+            self._cond.notify_all()
+
+    def _schedule(self, pool, key, document):
+        with self._cond:
+            # Backpressure: stop reading the input while chunk_size documents are ahead of the writes
+            self._cond.wait_for(lambda: self._queued + self._in_flight < self.chunk_size)
+            if self._active.get(key, 0) < self.per_partition:
+                self._active[key] = self._active.get(key, 0) + 1
+                self._in_flight += 1
+                pool.submit(self._run, pool, key, document)
+            else:
+                self._waiting[key].append(document)
+                self._queued += 1
+
+    def _take_stored(self, minimum):
+        with self._cond:
+            if len(self._stored) < minimum:
+                return []
+            stored, self._stored = self._stored, []
+        return stored
+
+    def write(self, documents):
+        """Upsert every document; return throughput statistics and the ids stored ("storedIds")."""
+        self._reset_stats()
+        self._cond = threading.Condition(self._lock)
+        # Per key: documents waiting for a slot, and upserts running
+        self._waiting = defaultdict(deque)
+        self._active = {}
+        self._queued = 0
+        self._in_flight = 0
+        self._stored = []
+        start_time = time.time()
+        parts = self._partition_key_parts()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for document in documents:
+                self._schedule(pool, self._partition_value(document, parts), document)
+                # Keep derived views (search index, ...) in step with what was written, from this thread only
+                stored = self._take_stored(self.chunk_size)
+                if stored:
+                    write_hooks.notify(stored)
+            with self._cond:
+                self._cond.wait_for(lambda: not self._queued and not self._in_flight)
+        stored = self._take_stored(1)
+        if stored:
+            write_hooks.notify(stored)
+        elapsed_time = max(time.time() - start_time, 1e-9)
+
+        if self.written:
+            # Tell running API processes to drop their cached responses
+            mark_stale()
+        stats = {
+            "written": self.written,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "seconds": elapsed_time,
+            "docsPerSecond": self.written / elapsed_time,
+            "requestCharge": self.request_charge,
+            "ruPerSecond": self.request_charge / elapsed_time,
+            "storedIds": self.stored_ids,
+        }
+        log.info("bulk_write_done", written=self.written, failed=self.failed, throttled=self.throttled,
+                 seconds=round(elapsed_time, 2), docs_per_sec=round(stats["docsPerSecond"], 1),
+                 ru_per_sec=round(stats["ruPerSecond"], 1))
+        return stats
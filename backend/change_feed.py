@@ -0,0 +1,83 @@
+import json
+import os
+
+from logs import get_logger
+from response_cache import CACHE_DIR
+
+log = get_logger("change_feed")
+
+STATE_PATH = os.path.join(CACHE_DIR, "change_feed_state.json")
+PAGE_SIZE = 500
+
+
+def list_partition_key_ranges(container):
+    """Return the container's partition key range ids.
+
+    The change feed of this SDK version is read one range at a time; if the
+    ranges cannot be listed the whole container is read as a single range.
+    """
+    try:
+        ranges = container.client_connection._ReadPartitionKeyRanges(container.container_link)
+        return [r["id"] for r in ranges] or [None]
+    except Exception as e:
+        log.warn("partition_key_ranges_unknown", error=e)
+        return [None]
+
+
+def load_tokens(consumer, path=STATE_PATH):
+    """Return the persisted {range id: continuation} for a change feed consumer."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get(consumer, {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_tokens(consumer, tokens, path=STATE_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        state = {}
+    state[consumer] = tokens
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_range(container, range_id, continuation, page_size=PAGE_SIZE):
+    """Return (changed items, next continuation) for one partition key range.
+
+    Starts from the beginning of the feed when there is no continuation yet.
+    """
+    feed = container.query_items_change_feed(
+        partition_key_range_id=range_id,
+        is_start_from_beginning=continuation is None,
+        continuation=continuation,
+        max_item_count=page_size,
+    )
+    items = list(feed)
+    # The feed's continuation comes back as the etag of the last response
+    token = container.client_connection.last_response_headers.get("etag") or continuation
+    return items, token
+
+
+def read_changes(container, consumer, path=STATE_PATH):
+    """Yield (range id, changed items, commit) for every partition key range.
+
+    Call commit() once the items have been processed to persist the range's
+    continuation, so a crash reprocesses the range instead of losing it.
+    """
+    tokens = load_tokens(consumer, path)
+    range_ids = list_partition_key_ranges(container)
+    for range_id in range_ids:
+        key = range_id if range_id is not None else "*"
+        items, token = read_range(container, range_id, tokens.get(key))
+
+        def commit(key=key, token=token):
+            tokens[key] = token
+            save_tokens(consumer, tokens, path)
+
+        yield range_id, items, commit
@@ -0,0 +1,148 @@
+"""Shared CosmosDB and Azure OpenAI clients, created on first use.
+
+Importing the API or a batch job connects to nothing: constructing a
+CosmosClient fetches the database account, so each client is built the
+first time it is used, once per process, and then shared by every thread.
+`container` and `openai_client` stand in for the real clients and create
+them on first attribute access, so callers keep using them as before.
+
+Sync Cosmos requests share one requests session whose pool keeps
+COSMOS_POOL_SIZE connections per host, so concurrent handlers and bulk
+writer threads reuse connections instead of reconnecting. The ASGI app
+uses get_async_container(), an azure.cosmos.aio client over an aiohttp
+connection pool of the same size. Both report every response's request
+charge to the metrics.
+"""
+import asyncio
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from logs import get_logger
+from metrics import record_cosmos_response
+
+log = get_logger("clients")
+
+# Load environment variables from .env
+load_dotenv()
+
+# Azure CosmosDB configuration
+COSMOS_URI = os.getenv("COSMOS_URI")
+COSMOS_KEY = os.getenv("COSMOS_KEY")
+DATABASE_NAME = os.getenv("COSMOS_DATABASE")
+CONTAINER_NAME = os.getenv("COSMOS_CONTAINER")
+# Connections kept open to Cosmos per process
+COSMOS_POOL_SIZE = int(os.getenv("COSMOS_POOL_SIZE", "32"))
+
+# Azure OpenAI configuration
+OPENAI_ENDPOINT = os.getenv("OPENAI_ENDPOINT")
+OPENAI_DEPLOYMENT_NAME = os.getenv("OPENAI_DEPLOYMENT_NAME")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_API_VERSION = os.getenv("OPENAI_API_VERSION")
+
+_lock = threading.Lock()
+_clients = {}
+# Created in the event loop on first use
+_async_lock = None
+
+
+def _shared(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def _create_container():
+    import requests
+    from azure.core.pipeline.transport import RequestsTransport
+    from azure.cosmos import CosmosClient
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    # Retries are left to the Cosmos retry policy, as with the SDK's own adapter
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=4, pool_maxsize=COSMOS_POOL_SIZE, max_retries=Retry(total=False, redirect=False)
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    transport = RequestsTransport(session=session, session_owner=False)
+    cosmos_client = CosmosClient(
+        COSMOS_URI, credential=COSMOS_KEY, transport=transport, raw_response_hook=record_cosmos_response
+    )
+    log.info("cosmos_connected")
+    return cosmos_client.get_database_client(DATABASE_NAME).get_container_client(CONTAINER_NAME)
+
+
+def _create_openai_client():
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(api_version=OPENAI_API_VERSION, azure_endpoint=OPENAI_ENDPOINT, api_key=OPENAI_API_KEY)
+
+
+def get_container():
+    """The process's shared ContainerProxy for the news container."""
+    return _shared("container", _create_container)
+
+
+def get_openai_client():
+    return _shared("openai", _create_openai_client)
+
+
+def use_clients(container=None, openai_client=None):
+    """Install clients to use instead of creating them, e.g. local stand-ins for benchmarks."""
+    with _lock:
+        if container is not None:
+            _clients["container"] = container
+        if openai_client is not None:
+            _clients["openai"] = openai_client
+
+
+async def get_async_container():
+    """The shared azure.cosmos.aio ContainerProxy; call from the event loop that will use it."""
+    global _async_lock
+    if _async_lock is None:
+        _async_lock = asyncio.Lock()
+    async with _async_lock:
+        client = _clients.get("async_cosmos")
+        if client is None:
+            import aiohttp
+            from azure.core.pipeline.transport import AioHttpTransport
+            from azure.cosmos.aio import CosmosClient as AsyncCosmosClient
+
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=COSMOS_POOL_SIZE))
+            transport = AioHttpTransport(session=session, session_owner=False)
+            client = AsyncCosmosClient(
+                COSMOS_URI, credential=COSMOS_KEY, transport=transport, raw_response_hook=record_cosmos_response
+            )
+            await client.__aenter__()
+            _clients["async_cosmos"], _clients["async_session"] = client, session
+            log.info("cosmos_connected", mode="async")
+    return client.get_database_client(DATABASE_NAME).get_container_client(CONTAINER_NAME)
+
+
+async def close_async_clients():
+    client = _clients.pop("async_cosmos", None)
+    session = _clients.pop("async_session", None)
+    if client is not None:
+        await client.close()
+    if session is not None:
+        await session.close()
+
+
+class LazyClient:
+    """Forwards attribute access to the client `factory()` returns, created on first use."""
+
+    def __init__(self, factory):
+        self._factory = factory
+
+    def __getattr__(self, name):
+        return getattr(self._factory(), name)
+
+
+container = LazyClient(get_container)
+openai_client = LazyClient(get_openai_client)
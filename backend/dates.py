@@ -0,0 +1,203 @@
+"""Date normalization for the heterogeneous date labels the scrapers collect.
+
+Raw dates arrive as "Jan 21, 2020" (SMEC), "November 20, 2024" (AECOM),
+"09 January 2025" (AtkinsRéalis), "22nd April 2025" (Arup), WSP's
+"May 5, 2025 | Press Releases", "Updated May 5, 2025" labels, ISO
+timestamps and placeholders such as "Unknown" or "By <author> •".
+
+parse_date() tries precompiled patterns first, in the order that suits the
+document's source, and falls back to dateutil only for the rest. Labels
+without a four-digit year are not dates: dateutil would fill the missing
+parts in from today. A label naming only a month or a year ("March 2025",
+"2024") stands for the start of that period, never for today's day of it,
+and a `to` filter given that way ends with the period. Results are memoized per raw string, since the same
+labels recur on every scrape and backfill. Documents store the ISO date
+in `date` and the Unix time in `dateEpoch`, which the feed sorts and
+filters on.
+"""
+import calendar
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from dateutil import parser
+
+# Distinct raw labels remembered by the memo
+CACHE_SIZE = int(os.getenv("DATE_CACHE_SIZE", "65536"))
+MIN_YEAR = 1900
+MAX_YEAR = 2100
+
+MONTHS = {name.lower(): number for number, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): number for number, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+
+ISO_DATE = re.compile(r"\s*(\d{4})-(\d{2})-(\d{2})(?=$|[T ]|\s)")
+# "May 5, 2025", "Jan. 21 2020", "Updated May 5th, 2025"
+MONTH_DAY_YEAR = re.compile(r"\b([A-Za-z]{3,9})\.?\s+(\d{1,2})(?:st|nd|rd|th)?,?\s+(\d{4})\b")
+# "09 January 2025", "22nd April 2025"
+DAY_MONTH_YEAR = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)?\s+([A-Za-z]{3,9})\.?,?\s+(\d{4})\b")
+YEAR = re.compile(r"\b\d{4}\b")
+
+# Patterns tried first for a source (matched as a prefix of the source name)
+SOURCE_FORMATS = {
+    "smec": (MONTH_DAY_YEAR,),
+    "aecom": (MONTH_DAY_YEAR,),
+    "wsp": (MONTH_DAY_YEAR,),
+    "jacobs": (MONTH_DAY_YEAR,),
+    "construction": (MONTH_DAY_YEAR,),
+    "smartcities": (MONTH_DAY_YEAR,),
+    "atkinsrealis": (DAY_MONTH_YEAR,),
+    "arup": (DAY_MONTH_YEAR,),
+    "globalconstructionreview": (DAY_MONTH_YEAR,),
+}
+DEFAULT_FORMATS = (MONTH_DAY_YEAR, DAY_MONTH_YEAR)
+
+_counts = {"fast": 0, "fallback": 0, "unparsed": 0}
+
+
+def _formats_for(source):
+    key = re.sub(r"[^a-z]", "", (source or "").lower())
+    for prefix, formats in SOURCE_FORMATS.items():
+        if key.startswith(prefix):
+            return formats + tuple(f for f in DEFAULT_FORMATS if f not in formats)
+    return DEFAULT_FORMATS
+
+
+def _from_parts(year, month, day):
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        return None
+    try:
+        return datetime(year, month, day, tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def _match(pattern, text):
+    for match in pattern.finditer(text):
+        if pattern is MONTH_DAY_YEAR:
+            month, day, year = match.groups()
+        else:
+            day, month, year = match.groups()
+        number = MONTHS.get(month.lower())
+        if number is not None:
+            return _from_parts(int(year), number, int(day))
+    return None
+
+
+def _as_utc(parsed):
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def _parse(text, source):
+    """Return (UTC datetime, "day", "month" or "year": the period the label names), or (None, None)."""
+    iso = ISO_DATE.match(text)
+    if iso:
+        try:
+            parsed = _as_utc(datetime.fromisoformat(text.strip().replace("Z", "+00:00")))
+        except ValueError:
+            parsed = _from_parts(*map(int, iso.groups()))
+        if parsed is not None:
+            _counts["fast"] += 1
+            return parsed, "day"
+    for pattern in _formats_for(source):
+        parsed = _match(pattern, text)
+        if parsed is not None:
+            _counts["fast"] += 1
+            return parsed, "day"
+    year = YEAR.search(text)
+    if year:
+        try:
+            # Missing parts come from these defaults, never from today; parsing against
+            # two of them shows which parts the label left out
+            first = parser.parse(text, default=datetime(int(year.group()), 1, 1))
+            last = parser.parse(text, default=datetime(int(year.group()), 12, 28))
+            if MIN_YEAR <= first.year <= MAX_YEAR:
+                _counts["fallback"] += 1
+                if first.month != last.month:
+                    return _as_utc(first), "year"
+                return _as_utc(first), "month" if first.day != last.day else "day"
+        except (ValueError, OverflowError):
+            pass
+    _counts["unparsed"] += 1
+    return None, None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _normalized(text, source):
+    """(datetime, ISO date, Unix time, period) of a raw label; memoized, so repeats cost a lookup."""
+    parsed, period = _parse(text, source)
+    if parsed is None:
+        return None, None, None, None
+    return parsed, parsed.strftime("%Y-%m-%d"), int(parsed.timestamp()), period
+
+
+def parse_date(value, source=None):
+    """Return the UTC datetime of a raw date label, or None if it holds no date."""
+    if isinstance(value, datetime):
+        return _as_utc(value)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return _normalized(value, source)[0]
+
+
+def normalize_date(value, source=None):
+    """Return (ISO date "YYYY-MM-DD", Unix time in seconds) of a raw date, or (None, None)."""
+    if not isinstance(value, str) or not value.strip():
+        return None, None
+    return _normalized(value, source)[1:3]
+
+
+def date_epoch(value):
+    """Unix time of a stored date; accepts a dateEpoch number or a raw label."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    return normalize_date(value)[1]
+
+
+def document_epoch(document):
+    """Unix time of a document: its dateEpoch, or its raw date if it was not normalized yet."""
+    epoch = date_epoch(document.get("dateEpoch"))
+    return epoch if epoch is not None else date_epoch(document.get("date"))
+
+
+def bound_epoch(value, end=False):
+    """Unix time bounding a from/to filter: the start of its day, or the last second with end=True.
+
+    A month or a year ("March 2025", "2024") bounds the whole period. Raises
+    ValueError if the value is not a date.
+    """
+    if isinstance(value, str) and value.strip():
+        parsed, _, _, period = _normalized(value, None)
+    else:
+        parsed, period = parse_date(value), "day"
+    if parsed is None:
+        raise ValueError(f"Invalid date: {value!r}")
+    start = parsed.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "year":
+        start = start.replace(month=1, day=1)
+    elif period == "month":
+        start = start.replace(day=1)
+    if not end:
+        return int(start.timestamp())
+    if period == "year":
+        following = start.replace(year=start.year + 1)
+    elif period == "month":
+        following = (start + timedelta(days=32)).replace(day=1)
+    else:
+        following = start + timedelta(days=1)
+    return int(following.timestamp()) - 1
+
+
+def stats():
+    info = _normalized.cache_info()
+    return {
+        "memoHits": info.hits,
+        "memoMisses": info.misses,
+        "memoSize": info.currsize,
+        "fastPath": _counts["fast"],
+        "fallback": _counts["fallback"],
+        "unparsed": _counts["unparsed"],
+    }
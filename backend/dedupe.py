@@ -0,0 +1,177 @@
+"""Deterministic document ids and near-duplicate detection for scraped articles.
+
+document_id() derives a stable Cosmos id from an article's canonical URL
+(or its source and title, or its source and excerpt), so re-ingesting the same article overwrites it
+instead of adding a copy. NearDuplicateIndex clusters syndicated stories:
+every article gets a MinHash signature over the character shingles of its
+title and excerpt, and locality-sensitive hashing on bands of that
+signature finds earlier articles that are probably similar. Candidates
+whose estimated Jaccard similarity reaches SIMILARITY_THRESHOLD join the
+earlier article's cluster. Signatures are persisted, so stories are
+matched against everything ingested before, not just the current run.
+"""
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import struct
+import sys
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrapers"))
+from crawl_state import article_key, record_key
+from llm_cache import normalize_title
+from response_cache import CACHE_DIR
+
+DB_PATH = os.getenv("DEDUPE_INDEX_PATH", os.path.join(CACHE_DIR, "dedupe.sqlite3"))
+# Headlines differing in one word ("first"/"second quarter results") score about 0.75
+SIMILARITY_THRESHOLD = float(os.getenv("DEDUPE_SIMILARITY", "0.85"))
+# Texts shorter than this (after normalizing) are never matched; they say too little
+MIN_TEXT_LENGTH = 20
+NUM_PERM = 64
+# 16 bands of 4 rows make pairs above ~0.5 similarity likely to share a bucket
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20250101)
+# Fixed seed: signatures stored by earlier runs must stay comparable
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+
+def document_id(source, url=None, title=None, text=None):
+    """Stable id for an article: a hash of its canonical URL, or of source and title (else text)."""
+    return hashlib.sha1(article_key(source, url, title, text).encode("utf-8")).hexdigest()
+
+
+def record_id(source, record):
+    """document_id of a raw scraper row or a normalized record."""
+    return hashlib.sha1(record_key(source, record).encode("utf-8")).hexdigest()
+
+
+def normalize_text(text):
+    return re.sub(r"[^\w ]+", "", normalize_title(text)).strip()
+
+
+def shingles(text):
+    """Hashes of the overlapping character n-grams of the normalized text."""
+    text = normalize_text(text).ljust(SHINGLE_SIZE)
+    return {
+        int.from_bytes(hashlib.blake2b(text[i:i + SHINGLE_SIZE].encode("utf-8"), digest_size=8).digest(), "big")
+        for i in range(len(text) - SHINGLE_SIZE + 1)
+    }
+
+
+def minhash(text):
+    hashes = shingles(text)
+    return tuple(min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS)
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of the two texts behind the signatures."""
+    return sum(1 for x, y in zip(signature, other) if x == y) / NUM_PERM
+
+
+def _buckets(signature):
+    for band in range(BANDS):
+        rows = signature[band * ROWS:(band + 1) * ROWS]
+        yield band, hashlib.blake2b(struct.pack(f"{ROWS}Q", *rows), digest_size=8).hexdigest()
+
+
+def article_text(document):
+    return f"{document.get('title') or ''} {document.get('excerpt') or ''}"
+
+
+class NearDuplicateIndex:
+    """Persistent LSH index of article signatures, grouped into clusters.
+
+    The first article of a cluster is its canonical member; later near
+    duplicates point at it through `duplicateOf`. Safe to share between
+    threads.
+    """
+
+    def __init__(self, path=DB_PATH, threshold=SIMILARITY_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures ("
+                " id TEXT PRIMARY KEY, cluster TEXT NOT NULL, title TEXT, url TEXT, signature BLOB NOT NULL)"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS buckets (band INTEGER, bucket TEXT, id TEXT)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (band, bucket)")
+        return self._conn
+
+    def _find(self, conn, signature):
+        candidates = set()
+        for band, bucket in _buckets(signature):
+            rows = conn.execute("SELECT id FROM buckets WHERE band = ? AND bucket = ?", (band, bucket))
+            candidates.update(row[0] for row in rows)
+        best = None
+        for candidate in candidates:
+            cluster, blob = conn.execute(
+                "SELECT cluster, signature FROM signatures WHERE id = ?", (candidate,)
+            ).fetchone()
+            score = similarity(signature, struct.unpack(f"{NUM_PERM}Q", blob))
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (cluster, score)
+        return best
+
+    def assign(self, document):
+        """Set the document's `clusterId` (and `duplicateOf` for near duplicates); return the cluster."""
+        text = article_text(document)
+        if len(normalize_text(text)) < MIN_TEXT_LENGTH:
+            document["clusterId"] = document["id"]
+            return document["id"]
+        signature = minhash(text)
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT cluster FROM signatures WHERE id = ?", (document["id"],)).fetchone()
+            if row:
+                # Seen before (e.g. a re-run); keep its cluster
+                cluster = row[0]
+            else:
+                match = self._find(conn, signature)
+                cluster = match[0] if match else document["id"]
+                conn.execute(
+                    "INSERT INTO signatures (id, cluster, title, url, signature) VALUES (?, ?, ?, ?, ?)",
+                    (document["id"], cluster, document.get("title"), document.get("url"),
+                     struct.pack(f"{NUM_PERM}Q", *signature)),
+                )
+                conn.executemany(
+                    "INSERT INTO buckets (band, bucket, id) VALUES (?, ?, ?)",
+                    [(band, bucket, document["id"]) for band, bucket in _buckets(signature)],
+                )
+                conn.commit()
+        document["clusterId"] = cluster
+        if cluster != document["id"]:
+            document["duplicateOf"] = cluster
+        return cluster
+
+    def canonical(self, cluster):
+        """Return (title, url) of a cluster's canonical article, or None if unknown."""
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT title, url FROM signatures WHERE id = ?", (cluster,)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def stats(self):
+        with self._lock:
+            conn = self._connection()
+            articles = conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+            clusters = conn.execute("SELECT COUNT(DISTINCT cluster) FROM signatures").fetchone()[0]
+        return {"articles": articles, "clusters": clusters, "duplicates": articles - clusters}
+
+
+near_duplicate_index = NearDuplicateIndex()
@@ -0,0 +1,513 @@
+"""Local article embeddings for "more like this" and emerging-trend clustering.
+
+Each document is embedded without any model or network call. Its words
+and word pairs (title weighted, excerpt, description, tags) are weighted
+by TF-IDF over a 2^18-bucket hashed vocabulary and folded into FEATURES
+signed dimensions. That sparse vector is projected onto DIM latent
+dimensions (LSA: a truncated SVD fitted on a sample of the corpus when
+the index is built) and L2-normalized, so cosine similarity is a dot
+product, and articles sharing related words are close even when they
+share few exact ones.
+
+The index is a directory of .npy files opened with mmap, so loading it
+reads no JSON and copies nothing until a query touches the pages:
+vectors (N x DIM float32), ids, publication days, the projection and,
+for approximate nearest-neighbour search, random-hyperplane LSH codes
+per table with each table's rows sorted by code. A query looks up its bucket in every table
+by binary search and ranks only those candidates exactly. Every save
+writes a new version directory and then switches CURRENT to it, so
+readers always see a consistent set of files. Saves hold a lock file, so
+processes saving at once merge instead of dropping each other's writes,
+and a replaced version is deleted only after RETIRED_VERSION_TTL seconds,
+once no reader can still be loading it.
+
+Writers keep the index current through write_hooks, like the search
+index; document frequencies drift as documents are added, and rebuild()
+recomputes them.
+"""
+import atexit
+import math
+import os
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from dates import date_epoch, document_epoch
+from logs import get_logger
+from response_cache import CACHE_DIR, file_lock
+from search_index import tokenize
+import write_hooks
+
+log = get_logger("embeddings")
+
+INDEX_DIR = os.getenv("EMBEDDINGS_PATH", os.path.join(CACHE_DIR, "embeddings"))
+# Seconds between saves of an index changed by writes
+SAVE_INTERVAL = float(os.getenv("EMBEDDINGS_SAVE_INTERVAL", "5"))
+# Seconds a replaced version directory is kept for readers that just read CURRENT
+RETIRED_VERSION_TTL = 60
+DIM = 128
+FEATURES = 4096
+HASH_BUCKETS = 1 << 18
+# Documents the projection is fitted on
+FIT_SAMPLE = 2000
+# LSH: TABLES tables of BITS hyperplanes each; a query probes one bucket per table
+TABLES = 16
+BITS = 8
+# Fewer candidates than this and the whole matrix is scanned instead
+MIN_CANDIDATES = 50
+ID_LENGTH = 64
+TITLE_WEIGHT = 2
+# Filler the scrapers and normalize_item write when a field is empty
+PLACEHOLDER_TEXTS = {"no excerpt available.", "no description available", "read more", "no summary"}
+FALLBACK_DESCRIPTION = " highlights key developments. Visit "
+# Trend clustering
+TRENDS_INTERVAL = float(os.getenv("TRENDS_INTERVAL", "3600"))
+TREND_WEEKS = 12
+TREND_CLUSTERS = 12
+TREND_TERMS = 3
+KMEANS_ITERATIONS = 25
+# Words too generic to name a trend
+LABEL_STOPWORDS = frozenset(
+    "new more first second third year years also said says announces announced report reports project projects "
+    "see provide provides help helps support supports work works how why what could would can may will".split()
+)
+
+_rng = np.random.default_rng(20250101)
+# Fixed seed: codes stored by earlier runs must stay comparable
+_PLANES = _rng.standard_normal((TABLES * BITS, DIM)).astype(np.float32)
+_BIT_WEIGHTS = (1 << np.arange(BITS)).astype(np.uint16)
+
+
+def _bucket(term):
+    return zlib.crc32(term.encode("utf-8")) % HASH_BUCKETS
+
+
+def day_of(value):
+    """Days since 1970-01-01 of a Unix time or date label, or -1 if it cannot be parsed."""
+    epoch = date_epoch(value)
+    return epoch // 86400 if epoch is not None else -1
+
+
+def embedding_terms(document):
+    """Weighted words and word pairs of a document's title, excerpt, description and tags."""
+    terms = Counter()
+    tags = document.get("tags") or []
+    fields = (
+        (document.get("title"), TITLE_WEIGHT),
+        (document.get("excerpt"), 1),
+        (document.get("description"), 1),
+        (" ; ".join(map(str, tags)) if isinstance(tags, list) else str(tags), 1),
+    )
+    for text, weight in fields:
+        if not isinstance(text, str) or text.strip().lower() in PLACEHOLDER_TEXTS or FALLBACK_DESCRIPTION in text:
+            continue
+        words = [word for word in tokenize(text) if len(word) > 1 and not word.isdigit()]
+        for word in words:
+            terms[word] += weight
+        # Pairs keep phrases such as "digital twin" or "net zero" together
+        for first, second in zip(words, words[1:]):
+            terms[f"{first} {second}"] += weight
+    return terms
+
+
+def lsh_codes(vectors):
+    """(N, TABLES) uint16 bucket codes of unit vectors."""
+    bits = (np.asarray(vectors, dtype=np.float32) @ _PLANES.T) > 0
+    return (bits.reshape(len(bits), TABLES, BITS) * _BIT_WEIGHTS).sum(axis=2).astype(np.uint16)
+
+
+class EmbeddingIndex:
+    """Memory-mapped embedding matrix with an LSH index. Safe to share between threads."""
+
+    def __init__(self, path=INDEX_DIR):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        # Documents written by this process since the last save: {id: (vector, day, buckets)}
+        self._pending = {}
+        self._last_save = 0.0
+        # Last trend clustering per (weeks, clusters)
+        self._trends = {}
+        self._reset()
+
+    def _reset(self):
+        self.ids = np.zeros(0, dtype=f"S{ID_LENGTH}")
+        self.vectors = np.zeros((0, DIM), dtype=np.float32)
+        self.days = np.zeros(0, dtype=np.int32)
+        self.codes = np.zeros((0, TABLES), dtype=np.uint16)
+        self.sorted_codes = np.zeros((TABLES, 0), dtype=np.uint16)
+        self.code_rows = np.zeros((TABLES, 0), dtype=np.int32)
+        self.sorted_ids = np.zeros(0, dtype=f"S{ID_LENGTH}")
+        self.id_rows = np.zeros(0, dtype=np.int32)
+        # Document frequency per hashed term, plus the document count in the last slot
+        self.df = np.zeros(HASH_BUCKETS + 1, dtype=np.int32)
+        # FEATURES x DIM; None until fitted on `fitted` documents
+        self.projection = None
+        self.fitted = 0
+
+    def _current(self):
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _load(self, version):
+        self._reset()
+        if version is not None:
+            directory = os.path.join(self.path, version)
+            try:
+                def load(name):
+                    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                self.ids, self.vectors, self.days, self.codes = load("ids"), load("vectors"), load("days"), load("codes")
+                self.sorted_codes, self.code_rows = load("sorted_codes"), load("code_rows")
+                self.sorted_ids, self.id_rows = load("sorted_ids"), load("id_rows")
+                self.df = np.array(load("df"))
+                self.fitted = int(load("fitted"))
+                self.projection = np.array(load("projection")) if self.fitted else None
+            except (OSError, ValueError) as e:
+                log.warn("embeddings_load_failed", path=directory, error=e)
+                self._reset()
+        self._version = version
+        self._loaded = True
+
+    def _refresh(self):
+        """Load on first use, and reload after another process saved the index."""
+        version = self._current()
+        if not self._loaded or version != self._version:
+            self._load(version)
+
+    def _features(self, terms):
+        """Return (hashed TF-IDF vector, hashed terms) of embedding_terms() under the current frequencies."""
+        buckets = {term: _bucket(term) for term in terms}
+        count = self.df[-1] + len(self._pending)
+        features = np.zeros(FEATURES, dtype=np.float32)
+        for term, frequency in terms.items():
+            bucket = buckets[term]
+            idf = math.log((1 + count) / (1 + self.df[bucket])) + 1
+            # The low bits pick the feature and the next bit the sign
+            features[bucket % FEATURES] += (1 + math.log(frequency)) * idf * (1 if bucket & FEATURES else -1)
+        return features, set(buckets.values())
+
+    def _fit(self, features):
+        """Fit the projection to the main directions of a sample of feature vectors."""
+        sample = _normalize(features[np.linspace(0, len(features) - 1, min(len(features), FIT_SAMPLE)).astype(int)])
+        # Randomized SVD: the top DIM directions without decomposing the whole sample
+        rng = np.random.default_rng(0)
+        basis = sample @ rng.standard_normal((FEATURES, DIM + 10), dtype=np.float32)
+        for _ in range(2):
+            basis, _ = np.linalg.qr(sample @ (sample.T @ np.linalg.qr(basis)[0]))
+        basis = np.linalg.qr(basis)[0]
+        _, _, directions = np.linalg.svd(basis.T @ sample, full_matrices=False)
+        projection = np.zeros((FEATURES, DIM), dtype=np.float32)
+        # A sample smaller than DIM leaves the remaining dimensions empty
+        projection[:, :min(DIM, len(directions))] = directions[:DIM].T
+        self.projection = projection
+        self.fitted = len(sample)
+
+    def _project(self, features):
+        return _normalize(np.asarray(features, dtype=np.float32).reshape(-1, FEATURES) @ self.projection)
+
+    def update(self, documents):
+        """Add or replace documents; registered as a write hook. They are embedded when saved."""
+        with self._lock:
+            self._refresh()
+            for document in documents:
+                doc_id = document.get("id")
+                if not doc_id or len(doc_id.encode("utf-8")) > ID_LENGTH:
+                    continue
+                features, buckets = self._features(embedding_terms(document))
+                if doc_id not in self._pending:
+                    self.df[list(buckets)] += 1
+                self._pending[doc_id] = (features, day_of(document_epoch(document)), buckets)
+            if time.time() - self._last_save >= SAVE_INTERVAL:
+                self.save()
+
+    def rebuild(self, documents, chunk_size=1000):
+        """Replace the whole index with `documents`, refit the projection and save it."""
+        # The last copy of a repeated id wins, as it would in the container
+        latest = {
+            document["id"]: document for document in documents
+            if document.get("id") and len(document["id"].encode("utf-8")) <= ID_LENGTH
+        }
+        documents = list(latest.values())
+        with self._lock:
+            self._reset()
+            self._pending = {}
+            terms = [embedding_terms(document) for document in documents]
+            # Frequencies first, so every vector is weighted by the whole corpus
+            for document_terms in terms:
+                self.df[list({_bucket(term) for term in document_terms})] += 1
+            self.df[-1] = len(documents)
+            sample = np.linspace(0, len(documents) - 1, min(len(documents), FIT_SAMPLE)).astype(int)
+            if len(documents):
+                self._fit(np.array([self._features(terms[i])[0] for i in sample]))
+            vectors = np.zeros((len(documents), DIM), dtype=np.float32)
+            # Projected in chunks, so the FEATURES-wide vectors of the whole corpus are never held at once
+            for start in range(0, len(documents), chunk_size):
+                chunk = terms[start:start + chunk_size]
+                vectors[start:start + len(chunk)] = self._project([self._features(t)[0] for t in chunk])
+            days = np.array([day_of(document_epoch(document)) for document in documents], dtype=np.int32)
+            with file_lock(self.lock_path):
+                self._write(np.array(list(latest), dtype=f"S{ID_LENGTH}"), vectors, days)
+            return len(documents)
+
+    def needs_rebuild(self):
+        """True if nothing was built yet, or the projection was fitted on a much smaller corpus."""
+        with self._lock:
+            self._refresh()
+            if self._version is None:
+                return not self._pending
+            # A projection fitted on the first writes of an empty index is refitted as the index grows
+            return self.fitted < min(FIT_SAMPLE, len(self.ids) // 2)
+
+    def ensure_built(self, load_documents):
+        """Build the index from `load_documents()` if needs_rebuild()."""
+        with self._lock:
+            if self.needs_rebuild():
+                count = self.rebuild(load_documents())
+                log.info("embeddings_built", documents=count)
+
+    def save(self):
+        with self._lock:
+            if not self._pending:
+                return
+            with file_lock(self.lock_path):
+                pending = self._pending
+                if self._current() != self._version:
+                    # Another process saved in the meantime; add our writes to its index
+                    self._load(self._current())
+                    for _, _, buckets in pending.values():
+                        self.df[list(buckets)] += 1
+                if self.projection is None:
+                    # Nothing was built yet; fit on what has been written so far
+                    self._fit(np.array([features for features, _, _ in pending.values()]))
+                projected = self._project([features for features, _, _ in pending.values()])
+                vectors = np.array(self.vectors)
+                days = np.array(self.days)
+                added = []
+                for vector, (doc_id, (_, day, _)) in zip(projected, pending.items()):
+                    row = self._row(doc_id)
+                    if row is None:
+                        added.append((doc_id, vector, day))
+                    else:
+                        vectors[row], days[row] = vector, day
+                self.df[-1] += len(added)
+                self._write(
+                    np.concatenate([self.ids, np.array([a[0] for a in added], dtype=f"S{ID_LENGTH}")]),
+                    np.concatenate([vectors, np.array([a[1] for a in added], dtype=np.float32).reshape(len(added), DIM)]),
+                    np.concatenate([days, np.array([a[2] for a in added], dtype=np.int32)]),
+                )
+
+    def _write(self, ids, vectors, days):
+        codes = lsh_codes(vectors)
+        code_rows = np.argsort(codes.T, axis=1, kind="stable").astype(np.int32)
+        arrays = {
+            "ids": ids,
+            "vectors": vectors,
+            "days": days,
+            "codes": codes,
+            "sorted_codes": np.take_along_axis(codes.T, code_rows, axis=1),
+            "code_rows": code_rows,
+            "id_rows": np.argsort(ids, kind="stable").astype(np.int32),
+            "df": self.df,
+            "projection": self.projection if self.projection is not None else np.zeros((FEATURES, DIM), np.float32),
+            "fitted": np.array(self.fitted),
+        }
+        arrays["sorted_ids"] = ids[arrays["id_rows"]]
+        version = f"v{time.time_ns()}-{os.getpid()}"
+        directory = os.path.join(self.path, version)
+        os.makedirs(directory)
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        temporary = os.path.join(self.path, f"CURRENT.{os.getpid()}.tmp")
+        with open(temporary, "w") as f:
+            f.write(version)
+        previous = self._current()
+        os.replace(temporary, os.path.join(self.path, "CURRENT"))
+        if previous and previous != version:
+            # Its mtime now records when it was replaced
+            try:
+                os.utime(os.path.join(self.path, previous))
+            except FileNotFoundError:
+                pass
+        self._remove_retired(version)
+        self._pending = {}
+        self._last_save = time.time()
+        self._load(version)
+
+    def _remove_retired(self, current):
+        """Delete version directories replaced more than RETIRED_VERSION_TTL seconds ago."""
+        now = time.time()
+        for name in os.listdir(self.path):
+            directory = os.path.join(self.path, name)
+            if name == current or not name.startswith("v") or not os.path.isdir(directory):
+                continue
+            try:
+                if now - os.stat(directory).st_mtime > RETIRED_VERSION_TTL:
+                    # Open maps of the old files stay valid after they are removed
+                    shutil.rmtree(directory, ignore_errors=True)
+            except FileNotFoundError:
+                pass
+
+    def _row(self, doc_id):
+        key = doc_id.encode("utf-8")
+        position = int(np.searchsorted(self.sorted_ids, key))
+        if position < len(self.sorted_ids) and self.sorted_ids[position] == key:
+            return int(self.id_rows[position])
+        return None
+
+    def similar(self, doc_id, limit=10):
+        """Return ([(id, score)] of the nearest documents, tookMs), or None if the id is not indexed."""
+        start_time = time.perf_counter()
+        with self._lock:
+            self._refresh()
+            if doc_id in self._pending and self.projection is not None:
+                # Written but not saved yet; other documents are found once saved
+                query = self._project(self._pending[doc_id][0])[0]
+                row = None
+            else:
+                row = self._row(doc_id)
+                if row is None:
+                    return None
+                query = np.asarray(self.vectors[row])
+            code = lsh_codes(query[None, :])[0]
+            candidates = [
+                self.code_rows[table, np.searchsorted(self.sorted_codes[table], code[table], "left"):
+                               np.searchsorted(self.sorted_codes[table], code[table], "right")]
+                for table in range(TABLES)
+            ]
+            candidates = np.unique(np.concatenate(candidates)) if candidates else np.zeros(0, dtype=np.int32)
+            if len(candidates) < MIN_CANDIDATES:
+                candidates = np.arange(len(self.ids))
+            candidates = candidates[candidates != row] if row is not None else candidates
+            scores = self.vectors[candidates] @ query
+            top = np.argpartition(-scores, min(limit, len(scores) - 1))[:limit] if len(scores) else []
+            top = sorted(top, key=lambda index: -scores[index])
+            hits = [(self.ids[candidates[index]].decode("utf-8"), round(float(scores[index]), 4)) for index in top]
+        return hits, round((time.perf_counter() - start_time) * 1000, 3)
+
+    def trends(self, describe, weeks=TREND_WEEKS, clusters=TREND_CLUSTERS, max_age=TRENDS_INTERVAL):
+        """Cluster the last `weeks` of documents into trend groups, at most once every `max_age` seconds.
+
+        `describe(ids)` returns {id: stored fields} (the search index's
+        documents()) and is used to name clusters after their most
+        distinctive title and excerpt words. Trends are ordered by growth:
+        documents in the later half of the window over the earlier half.
+        """
+        with self._lock:
+            self._refresh()
+            cached = self._trends.get((weeks, clusters))
+            if cached is not None and time.time() - cached["computedAt"] < max_age:
+                return cached
+            today = day_of(time.strftime("%Y-%m-%d"))
+            latest = int(self.days.max()) if len(self.days) else today
+            # Scrapes can lag; the window ends at the newest document, not today
+            end = min(today, latest) if latest > 0 else today
+            start = end - weeks * 7
+            rows = np.flatnonzero((self.days > start) & (self.days <= end))
+            vectors = np.asarray(self.vectors[rows])
+            days = np.asarray(self.days[rows])
+            ids = [doc_id.decode("utf-8") for doc_id in self.ids[rows]]
+        groups = []
+        if len(rows):
+            labels, centroids = _kmeans(vectors, min(clusters, max(1, len(rows) // 5)))
+            stored = describe(ids)
+            words = [
+                Counter(set(embedding_terms({
+                    field: stored.get(doc_id, {}).get(field) for field in ("title", "excerpt")
+                })))
+                for doc_id in ids
+            ]
+            corpus = Counter()
+            for counts in words:
+                corpus.update(counts)
+            middle = start + weeks * 7 // 2
+            for cluster in range(len(centroids)):
+                members = np.flatnonzero(labels == cluster)
+                if not len(members):
+                    continue
+                counts = Counter()
+                for member in members:
+                    counts.update(words[member])
+                # Words shared by several members and uncommon elsewhere name the cluster
+                terms = sorted(
+                    (
+                        term for term, count in counts.items()
+                        if count > 1 and corpus[term] < len(rows) / 2 and not LABEL_STOPWORDS.intersection(term.split())
+                    ),
+                    key=lambda term: -counts[term] * math.log(len(rows) / corpus[term]),
+                )[:TREND_TERMS]
+                recent = int((days[members] > middle).sum())
+                closest = members[np.argsort(-(vectors[members] @ centroids[cluster]))[:3]]
+                groups.append({
+                    "label": " / ".join(terms) or "misc",
+                    "terms": terms,
+                    "size": len(members),
+                    "recent": recent,
+                    "growth": round((recent + 1) / (len(members) - recent + 1), 3),
+                    "examples": [{"id": ids[member], **stored.get(ids[member], {})} for member in closest],
+                })
+            groups.sort(key=lambda group: (-group["growth"], -group["size"]))
+        result = {
+            "from": time.strftime("%Y-%m-%d", time.gmtime(start * 86400)),
+            "to": time.strftime("%Y-%m-%d", time.gmtime(end * 86400)),
+            "documents": len(rows),
+            "trends": groups,
+            "computedAt": time.time(),
+        }
+        with self._lock:
+            self._trends[weeks, clusters] = result
+        return result
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {
+                "documents": len(self.ids),
+                "dimensions": DIM,
+                "fittedOn": self.fitted,
+                "pendingWrites": len(self._pending),
+            }
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+
+def _kmeans(vectors, clusters, iterations=KMEANS_ITERATIONS):
+    """Spherical k-means with k-means++ seeding; returns (labels, unit centroids)."""
+    rng = np.random.default_rng(0)
+    centroids = [vectors[rng.integers(len(vectors))]]
+    for _ in range(1, clusters):
+        distance = np.clip(1 - np.max(vectors @ np.array(centroids).T, axis=1), 0, None)
+        total = distance.sum()
+        choice = rng.choice(len(vectors), p=distance / total) if total > 0 else rng.integers(len(vectors))
+        centroids.append(vectors[choice])
+    centroids = np.array(centroids)
+    labels = np.zeros(len(vectors), dtype=np.int64)
+    for iteration in range(iterations):
+        new_labels = np.argmax(vectors @ centroids.T, axis=1)
+        if iteration and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for cluster in range(clusters):
+            members = vectors[labels == cluster]
+            if len(members):
+                centroid = members.sum(axis=0)
+                norm = np.linalg.norm(centroid)
+                centroids[cluster] = centroid / norm if norm else centroid
+    return labels, centroids
+
+
+embedding_index = EmbeddingIndex()
+write_hooks.register(embedding_index.update)
+# Flush writes made since the last periodic save
+atexit.register(embedding_index.save)
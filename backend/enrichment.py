@@ -0,0 +1,344 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import openai
+
+from llm_cache import cache_key, llm_cache
+from logs import get_logger
+from metrics import record_openai_usage, timed
+
+log = get_logger("enrichment")
+
+# Bumped whenever the batch prompt changes so cached answers are not reused
+PROMPT_VERSION = "batch-v1"
+CLASSIFY_PROMPT_VERSION = "classify-v1"
+
+BATCH_SIZE = int(os.getenv("ENRICH_BATCH_SIZE", "8"))
+MAX_WORKERS = int(os.getenv("ENRICH_CONCURRENCY", "8"))
+TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "60000"))
+MAX_RETRIES = 6
+# Completion tokens reserved per article in a batch
+TOKENS_PER_ARTICLE = 80
+TOKENS_PER_CLASSIFICATION = 25
+
+FALLBACK = ("No description available", "low")
+
+SYSTEM_PROMPT = (
+    "You are an analyst for an architecture, engineering and construction (AEC) firm. "
+    "You write short, factual descriptions of industry news and rate its business impact."
+)
+
+
+def normalize_impact(value):
+    """Map free-form impact text to "high", "medium" or "low"; None if unrecognised."""
+    value = (value or "").strip().lower()
+    for level in ("high", "medium", "low"):
+        if level in value:
+            return level
+    return None
+
+
+class TokenBudget:
+    """Sliding one-minute window of OpenAI token spend shared by all workers."""
+
+    def __init__(self, tokens_per_minute=TOKENS_PER_MINUTE, window=60.0):
+        self.tokens_per_minute = tokens_per_minute
+        self.window = window
+        self._spent = deque()
+        self._total = 0
+        self._cond = threading.Condition()
+
+    def _expire(self, now):
+        while self._spent and self._spent[0][0] <= now - self.window:
+            _, tokens = self._spent.popleft()
+            self._total -= tokens
+
+    def acquire(self, tokens):
+        """Block until `tokens` fit in the current window, then reserve them."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                # An oversized request is let through once the window is empty
+                if self._total + tokens <= self.tokens_per_minute or not self._spent:
+                    self._spent.append((now, tokens))
+                    self._total += tokens
+                    return
+                wait = self._spent[0][0] + self.window - now
+                self._cond.wait(timeout=max(wait, 0.05))
+
+    def adjust(self, reserved, actual):
+        """Replace an estimate with the usage OpenAI actually reported."""
+        if actual is None or actual == reserved:
+            return
+        with self._cond:
+            self._spent.append((time.monotonic(), actual - reserved))
+            self._total += actual - reserved
+            self._cond.notify_all()
+
+
+def build_batch_prompt(articles):
+    lines = [
+        "For each numbered article below, write a one-sentence description relevant to "
+        "the AEC industry and an impact level (high, medium or low).",
+        'Respond with only a JSON object of the form {"results": [{"index": 1, '
+        '"description": "...", "impact": "high"}]} containing one entry per article.',
+        "",
+    ]
+    for index, article in enumerate(articles, 1):
+        lines.append(f"{index}. Title: {article.get('title') or 'No Title'}")
+        lines.append(f"   URL: {article.get('url') or 'N/A'}")
+    return "\n".join(lines)
+
+
+def build_classify_prompt(articles, sectors, regions):
+    lines = [
+        "Classify each numbered article below by the market sector it concerns and the "
+        "region where it takes place.",
+        f"Sectors: {', '.join(sectors)}",
+        f"Regions: {', '.join(regions)}",
+        'Respond with only a JSON object of the form {"results": [{"index": 1, '
+        '"sector": "...", "region": "..."}]} containing one entry per article and only the names listed above.',
+        "",
+    ]
+    for index, article in enumerate(articles, 1):
+        lines.append(f"{index}. Title: {article.get('title') or 'No Title'}")
+        if article.get("excerpt"):
+            lines.append(f"   Excerpt: {article['excerpt']}")
+    return "\n".join(lines)
+
+
+def _indexed_results(text, count):
+    """Return {index: result} from the model's JSON answer of numbered results."""
+    text = (text or "").strip()
+    # Models sometimes wrap JSON in a Markdown code fence
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return {}
+    results = data.get("results", []) if isinstance(data, dict) else data
+    indexed = {}
+    for result in results if isinstance(results, list) else []:
+        if not isinstance(result, dict):
+            continue
+        try:
+            index = int(result.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= index <= count:
+            indexed[index] = result
+    return indexed
+
+
+def parse_batch_response(text, count):
+    """Return {index: (description, impact)} from the model's JSON answer."""
+    parsed = {}
+    for index, result in _indexed_results(text, count).items():
+        description = str(result.get("description") or "").strip() or FALLBACK[0]
+        impact = normalize_impact(str(result.get("impact") or "")) or "low"
+        parsed[index] = (description, impact)
+    return parsed
+
+
+def parse_classify_response(text, count, sectors, regions):
+    """Return {index: {"sector", "region"}}; names outside the given lists become None."""
+    sectors = {sector.casefold(): sector for sector in sectors}
+    regions = {region.casefold(): region for region in regions}
+    return {
+        index: {
+            "sector": sectors.get(str(result.get("sector") or "").strip().casefold()),
+            "region": regions.get(str(result.get("region") or "").strip().casefold()),
+        }
+        for index, result in _indexed_results(text, count).items()
+    }
+
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before retrying, honouring Retry-After when present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+    return min(60.0, 2 ** attempt) * (0.5 + random.random() / 2)
+
+
+class BulkEnricher:
+    """Generates descriptions and impact levels for many articles at once.
+
+    Articles already answered are served from the LLM cache. The rest are
+    packed several to a prompt and the prompts are sent from a bounded thread
+    pool. Every call goes through a shared per-minute token budget and is
+    retried with backoff on throttling and transient errors.
+    """
+
+    def __init__(self, client, deployment, batch_size=BATCH_SIZE, max_workers=MAX_WORKERS,
+                 tokens_per_minute=TOKENS_PER_MINUTE, max_retries=MAX_RETRIES, cache=llm_cache):
+        self._base_client = client
+        self._client = None
+        self.deployment = deployment
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.cache = cache
+        self.budget = TokenBudget(tokens_per_minute)
+        self.calls = 0
+        self.throttled = 0
+        self.tokens_used = 0
+        self._stats_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """The OpenAI client with its own retries off, built on first use."""
+        # Retries are handled here so they are paced by the token budget
+        with self._stats_lock:
+            if self._client is None:
+                self._client = self._base_client.with_options(max_retries=0)
+            return self._client
+
+    def _complete(self, prompt, max_tokens):
+        estimate = len(prompt) // 4 + len(SYSTEM_PROMPT) // 4 + max_tokens
+        for attempt in range(self.max_retries + 1):
+            self.budget.acquire(estimate)
+            try:
+                with timed("llm"):
+                    response = self.client.chat.completions.create(
+                        messages=[
+                            {"role": "system", "content": SYSTEM_PROMPT},
+                            {"role": "user", "content": prompt},
+                        ],
+                        max_tokens=max_tokens,
+                        temperature=0.2,
+                        model=self.deployment,
+                    )
+            except (openai.RateLimitError, openai.APITimeoutError,
+                    openai.APIConnectionError, openai.InternalServerError) as e:
+                self.budget.adjust(estimate, 0)
+                with self._stats_lock:
+                    self.throttled += isinstance(e, openai.RateLimitError)
+                if attempt == self.max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                log.warn("openai_retry", every=True, error=type(e).__name__, delay=round(delay, 1), attempt=attempt + 1)
+                time.sleep(delay)
+                continue
+            record_openai_usage(response)
+            usage = getattr(response, "usage", None)
+            used = getattr(usage, "total_tokens", None)
+            self.budget.adjust(estimate, used)
+            with self._stats_lock:
+                self.calls += 1
+                self.tokens_used += used or estimate
+            return response.choices[0].message.content
+
+    def _enrich_batch(self, batch):
+        prompt = build_batch_prompt(batch)
+        text = self._complete(prompt, TOKENS_PER_ARTICLE * len(batch))
+        parsed = parse_batch_response(text, len(batch))
+        if len(parsed) < len(batch):
+            log.warn("batch_incomplete", every=True, answered=len(parsed), articles=len(batch))
+        if self.cache is not None and parsed:
+            # Only real answers are cached; fallbacks are retried next run
+            self.cache.put_many({batch[index - 1]["key"]: answer for index, answer in parsed.items()})
+        return {
+            article["id"]: parsed.get(index, FALLBACK)
+            for index, article in enumerate(batch, 1)
+        }
+
+    def _classify_batch(self, batch, sectors, regions):
+        prompt = build_classify_prompt(batch, sectors, regions)
+        text = self._complete(prompt, TOKENS_PER_CLASSIFICATION * len(batch))
+        parsed = parse_classify_response(text, len(batch), sectors, regions)
+        if self.cache is not None and parsed:
+            # Stored as a (sector, region) pair; "" where the model gave no valid name
+            self.cache.put_many({
+                batch[index - 1]["key"]: (answer["sector"] or "", answer["region"] or "")
+                for index, answer in parsed.items()
+            })
+        return {article["id"]: parsed[index] for index, article in enumerate(batch, 1) if index in parsed}
+
+    def cached(self, title, url):
+        """Return the cached (description, impact) for an article, or None."""
+        if self.cache is None:
+            return None
+        return self.cache.get(cache_key(title, url, PROMPT_VERSION, self.deployment))
+
+    def enrich(self, articles):
+        """Return {id: (description, impact)} for articles with id, title and url."""
+        if not articles:
+            return {}
+        articles = [
+            {**article, "key": cache_key(article.get("title"), article.get("url"), PROMPT_VERSION, self.deployment)}
+            for article in articles
+        ]
+        results = {}
+        if self.cache is not None:
+            cached = self.cache.get_many(article["key"] for article in articles)
+            results.update({article["id"]: cached[article["key"]] for article in articles if article["key"] in cached})
+            articles = [article for article in articles if article["key"] not in cached]
+            log.info("llm_cache_served", articles=len(results))
+        if not articles:
+            return results
+        batches = [articles[i:i + self.batch_size] for i in range(0, len(articles), self.batch_size)]
+        log.info("enrich_started", articles=len(articles), batches=len(batches), workers=self.max_workers)
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._enrich_batch, batch): batch for batch in batches}
+            for future in as_completed(futures):
+                try:
+                    results.update(future.result())
+                except Exception as e:
+                    log.error("enrich_batch_failed", every=True, articles=len(futures[future]), error=e)
+                    results.update({article["id"]: FALLBACK for article in futures[future]})
+        elapsed_time = time.time() - start_time
+        log.info("enrich_done", articles=len(articles), seconds=round(elapsed_time, 2), calls=self.calls,
+                 tokens=self.tokens_used, throttled=self.throttled)
+        return results
+
+    def classify(self, articles, sectors, regions):
+        """Return {id: {"sector", "region"}} for articles with id, title, url and excerpt.
+
+        Answers are restricted to the given names; articles the model could
+        not classify are missing from the result. Answers are cached like
+        generations, keyed by the names offered, so a taxonomy change asks again.
+        """
+        if not articles:
+            return {}
+        labels = hashlib.sha1("\x1f".join([*sectors, "", *regions]).encode("utf-8")).hexdigest()[:12]
+        version = f"{CLASSIFY_PROMPT_VERSION}:{labels}"
+        articles = [
+            {**article, "key": cache_key(article.get("title"), article.get("url"), version, self.deployment)}
+            for article in articles
+        ]
+        results = {}
+        if self.cache is not None:
+            cached = self.cache.get_many(article["key"] for article in articles)
+            for article in articles:
+                if article["key"] in cached:
+                    sector, region = cached[article["key"]]
+                    results[article["id"]] = {"sector": sector or None, "region": region or None}
+            articles = [article for article in articles if article["key"] not in cached]
+        batches = [articles[i:i + self.batch_size] for i in range(0, len(articles), self.batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = [pool.submit(self._classify_batch, batch, sectors, regions) for batch in batches]
+            for future in as_completed(futures):
+                try:
+                    results.update(future.result())
+                except Exception as e:
+                    log.error("classify_batch_failed", every=True, error=e)
+        log.info("classify_done", classified=len(results), articles=len(articles), batches=len(batches))
+        return results
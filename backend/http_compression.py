@@ -0,0 +1,56 @@
+import gzip
+
+from metrics import timed
+
+# Brotli is optional; without it clients that accept br get gzip instead
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _parse_accept_encoding(header):
+    """Return {coding: q} for an Accept-Encoding header value."""
+    codings = {}
+    for part in (header or "").split(","):
+        pieces = part.strip().split(";")
+        coding = pieces[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def choose_encoding(accept_encoding):
+    """Pick the best supported content coding, or None for identity."""
+    codings = _parse_accept_encoding(accept_encoding)
+    wildcard = codings.get("*", 0.0)
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = codings.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body, encoding):
+    with timed("compress"):
+        if encoding == "br":
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        if encoding == "gzip":
+            return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
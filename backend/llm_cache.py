@@ -0,0 +1,151 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from response_cache import CACHE_DIR
+
+DB_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(CACHE_DIR, "llm_cache.sqlite3"))
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+# Entries older than this are regenerated (0 keeps them forever)
+TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_DAYS", "90")) * 86400
+# Eviction runs once every this many writes
+EVICT_EVERY = 500
+
+# URL placeholders the scrapers write when a link is missing
+MISSING_URLS = {"", "no link", "none", "n/a"}
+
+
+def normalize_title(title):
+    """Case-fold a headline and unify quotes and whitespace so reposts share a key."""
+    title = unicodedata.normalize("NFKC", title or "")
+    title = title.replace("’", "'").replace("‘", "'").replace("“", '"').replace("”", '"')
+    return re.sub(r"\s+", " ", title).strip().casefold()
+
+
+def normalize_url(url):
+    url = (url or "").strip()
+    if url.lower() in MISSING_URLS:
+        return ""
+    url = re.sub(r"^https?://(www\.)?", "", url, flags=re.IGNORECASE)
+    return url.split("#")[0].rstrip("/").lower()
+
+
+def cache_key(title, url, prompt_version, deployment):
+    """Content address of one generation: same inputs, same prompt, same model."""
+    material = "\x1f".join([normalize_title(title), normalize_url(url), prompt_version, deployment or ""])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Persistent SQLite cache of generated (description, impact) pairs.
+
+    The bulk enricher also stores its (sector, region) classifications
+    here, under keys of their own prompt version.
+
+    Safe to share between threads. Least recently used entries are evicted
+    once the cache holds more than max_entries, and entries older than
+    ttl seconds are treated as misses.
+    """
+
+    def __init__(self, path=DB_PATH, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn = None
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS generations ("
+                " key TEXT PRIMARY KEY, description TEXT NOT NULL, impact TEXT NOT NULL,"
+                " created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS generations_last_used ON generations (last_used)")
+        return self._conn
+
+    def get_many(self, keys):
+        """Return {key: (description, impact)} for the keys present in the cache."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        min_created = now - self.ttl if self.ttl else 0
+        with self._lock:
+            conn = self._connection()
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, description, impact FROM generations"
+                    f" WHERE key IN ({marks}) AND created_at >= ?",
+                    [*chunk, min_created],
+                )
+                for key, description, impact in rows:
+                    found[key] = (description, impact)
+            if found:
+                conn.executemany(
+                    "UPDATE generations SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def get(self, key):
+        return self.get_many([key]).get(key)
+
+    def put_many(self, entries):
+        """Store {key: (description, impact)} pairs."""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO generations (key, description, impact, created_at, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [(key, description, impact, now, now) for key, (description, impact) in entries.items()],
+            )
+            self._writes += len(entries)
+            if self._writes >= EVICT_EVERY:
+                self._writes = 0
+                self._evict(conn)
+            conn.commit()
+
+    def put(self, key, description, impact):
+        self.put_many({key: (description, impact)})
+
+    def _evict(self, conn):
+        if self.ttl:
+            conn.execute("DELETE FROM generations WHERE created_at < ?", (time.time() - self.ttl,))
+        conn.execute(
+            "DELETE FROM generations WHERE key IN ("
+            " SELECT key FROM generations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def stats(self):
+        with self._lock:
+            size = self._connection().execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "size": size,
+                "maxEntries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by normalize_item and the bulk enricher
+llm_cache = LLMCache()
@@ -0,0 +1,93 @@
+"""Structured, rate-limited logging for the hot paths.
+
+    log = get_logger("normalize")
+    log.info("item_normalized", every=5, id=item_id, upserted=True)
+
+writes "[INFO] item_normalized id=... upserted=True" like the rest of the
+backend's output, or one JSON object per line with LOG_FORMAT=json. An
+event logged with `every` is written at most once per that many seconds;
+the next line written for it carries the number of lines suppressed in
+between, so a backfill of a million items logs a few lines a minute
+instead of one per item. LOG_LEVEL (default INFO) drops lower levels.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARN": 30, "ERROR": 40}
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = LEVELS.get(os.getenv("LOG_LEVEL", "INFO").upper(), 20)
+# Default interval, in seconds, of events logged with every=True
+LOG_INTERVAL = float(os.getenv("LOG_INTERVAL", "5"))
+
+_lock = threading.Lock()
+# (logger, event) -> [time last written, lines suppressed since]
+_limits = {}
+
+
+def _format_value(value):
+    text = str(value)
+    return json.dumps(text, ensure_ascii=False) if not text or any(c in text for c in ' "=\n') else text
+
+
+class StructuredLogger:
+    def __init__(self, name, stream=None):
+        self.name = name
+        self.stream = stream
+
+    def _allowed(self, event, every):
+        """Return the number of suppressed lines to report, or None if this line is suppressed."""
+        if not every:
+            return 0
+        interval = LOG_INTERVAL if every is True else every
+        key = (self.name, event)
+        now = time.monotonic()
+        with _lock:
+            state = _limits.get(key)
+            if state is not None and now - state[0] < interval:
+                state[1] += 1
+                return None
+            suppressed = state[1] if state is not None else 0
+            _limits[key] = [now, 0]
+        return suppressed
+
+    def log(self, level, event, every=None, **fields):
+        if LEVELS[level] < LOG_LEVEL:
+            return
+        suppressed = self._allowed(event, every)
+        if suppressed is None:
+            return
+        if suppressed:
+            fields["suppressed"] = suppressed
+        if LOG_FORMAT == "json":
+            record = {
+                "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                "level": level.lower(),
+                "logger": self.name,
+                "event": event,
+                **fields,
+            }
+            line = json.dumps(record, ensure_ascii=False, default=str)
+        else:
+            line = " ".join([f"[{level}] {event}"] + [f"{name}={_format_value(value)}" for name, value in fields.items()])
+        # One write per line, so lines from concurrent threads do not interleave
+        (self.stream or sys.stdout).write(line + "\n")
+
+    def debug(self, event, every=None, **fields):
+        self.log("DEBUG", event, every, **fields)
+
+    def info(self, event, every=None, **fields):
+        self.log("INFO", event, every, **fields)
+
+    def warn(self, event, every=None, **fields):
+        self.log("WARN", event, every, **fields)
+
+    def error(self, event, every=None, **fields):
+        self.log("ERROR", event, every, **fields)
+
+
+def get_logger(name):
+    return StructuredLogger(name)
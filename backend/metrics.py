@@ -0,0 +1,269 @@
+"""Hot-path metrics in the Prometheus text format, and per-request stage profiles.
+
+stage_seconds is a latency histogram per stage: fetch (CosmosDB reads),
+validate (the feed's ETag aggregates), sort, serialize, compress, llm
+(Azure OpenAI calls) and upsert. Code times a stage with
+
+    with timed("fetch"):
+        ...
+
+Counters record the request units CosmosDB charges (read from every
+response's x-ms-request-charge header by the clients' response hook),
+OpenAI token usage and the records each scraper returned. Cache hit and
+miss counts are read from the caches' own stats when /metrics is scraped,
+through collectors registered with register_collector().
+
+Metrics are per process: with several API workers every worker reports
+its own series. Batch jobs export theirs by writing METRICS_TEXTFILE (for
+the node exporter's textfile collector) when they finish.
+
+While a request is being profiled (start_profile()), timed() also adds each
+stage's time to the request's profile, which the API returns in a
+Server-Timing header.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from logs import get_logger
+
+log = get_logger("metrics")
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+TEXTFILE_PATH = os.getenv("METRICS_TEXTFILE")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, tuple(zip(self.labels, key)), value
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(counts), count, total) for key, (counts, count, total) in self._series.items()}
+        for key, (counts, count, total) in sorted(series.items()):
+            labels = tuple(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + (("le", _format_value(bound)),), cumulative
+            yield f"{self.name}_bucket", labels + (("le", "+Inf"),), count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+_metrics = []
+_collectors = []
+
+
+def counter(name, documentation, labels=()):
+    metric = Counter(name, documentation, labels)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, documentation, labels, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def register_collector(collect):
+    """Register a function returning [(name, kind, documentation, [(labels dict, value)])], called per scrape."""
+    _collectors.append(collect)
+    return collect
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for collect in _collectors:
+        try:
+            families = collect()
+        except Exception as e:
+            log.warn("collector_failed", every=True, collector=getattr(collect, "__name__", collect), error=e)
+            continue
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(sorted(labels.items()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path=TEXTFILE_PATH):
+    """Write the metrics to `path` (default METRICS_TEXTFILE) atomically; does nothing without a path."""
+    if not path:
+        return
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(temporary, path)
+
+
+stage_seconds = histogram("aec_stage_seconds", "Time spent in each hot-path stage", ("stage",))
+request_seconds = histogram("aec_request_seconds", "API request latency by endpoint", ("endpoint", "status"))
+cosmos_request_units = counter(
+    "aec_cosmos_request_units_total", "Request units charged by CosmosDB", ("operation",)
+)
+cosmos_requests = counter("aec_cosmos_requests_total", "Requests sent to CosmosDB", ("operation", "status"))
+openai_tokens = counter("aec_openai_tokens_total", "Tokens used by Azure OpenAI calls", ("kind",))
+scraper_items = counter("aec_scraper_items_total", "Records returned by each scraper", ("source", "status"))
+
+# Request header asking for a stage breakdown of the response
+PROFILE_HEADER = "X-Profile"
+
+
+class Profile:
+    """Time spent in each stage while serving one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self):
+        """The stages and the time since the request started, as a Server-Timing header value."""
+        entries = [f"{stage};dur={seconds * 1000:.2f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.2f}")
+        return ", ".join(entries)
+
+
+_profile = contextvars.ContextVar("profile", default=None)
+
+
+def profile_requested(value):
+    return (value or "").strip().lower() in ("1", "true", "yes")
+
+
+def start_profile():
+    """Profile the current request (context); returns a token for end_profile()."""
+    return _profile.set(Profile())
+
+
+def current_profile():
+    return _profile.get()
+
+
+def end_profile(token):
+    _profile.reset(token)
+
+
+@contextmanager
+def timed(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        stage_seconds.observe(elapsed, stage=stage)
+        profile = _profile.get()
+        if profile is not None:
+            profile.add(stage, elapsed)
+
+
+def _cosmos_operation(request):
+    headers = request.headers
+    if headers.get("x-ms-documentdb-isquery", "").lower() == "true":
+        return "query"
+    if headers.get("x-ms-documentdb-is-upsert", "").lower() == "true":
+        return "upsert"
+    if headers.get("a-im"):
+        return "changefeed"
+    return {"GET": "read", "POST": "create", "PUT": "replace", "DELETE": "delete"}.get(request.method, request.method)
+
+
+def record_cosmos_response(pipeline_response):
+    """azure-core raw_response_hook: count every CosmosDB response and the request units it charged."""
+    try:
+        response = pipeline_response.http_response
+        operation = _cosmos_operation(pipeline_response.http_request)
+        cosmos_requests.inc(operation=operation, status=response.status_code)
+        charge = response.headers.get("x-ms-request-charge")
+        if charge:
+            cosmos_request_units.inc(float(charge), operation=operation)
+    except Exception as e:
+        # Metrics must never fail a request
+        log.warn("cosmos_metrics_failed", every=True, error=e)
+
+
+def record_openai_usage(response):
+    """Count the prompt and completion tokens an OpenAI chat completion reports."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    openai_tokens.inc(getattr(usage, "prompt_tokens", 0) or 0, kind="prompt")
+    openai_tokens.inc(getattr(usage, "completion_tokens", 0) or 0, kind="completion")
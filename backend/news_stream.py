@@ -0,0 +1,272 @@
+"""Push feed of new and updated news items, served as Server-Sent Events.
+
+Every writer appends the documents it stored to an event log (a write
+hook), a SQLite table shared by all processes on the host, so items the
+backfill, the ingestion pipeline or the API write all reach the stream.
+Row ids are the events' ids: they only grow, which lets a client that
+reconnects with Last-Event-ID receive exactly what it missed. The log
+keeps the last STREAM_RETENTION events; a client further behind is sent a
+`reset` event and should reload the feed.
+
+In each API process one reader thread tails the log, projects and encodes
+each new event once and keeps the most recent ones in memory. Every
+subscriber is served from that buffer, so N open dashboards cost one log
+query per poll plus the new items, not N reads of the feed.
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections import deque
+
+from logs import get_logger
+from response_cache import CACHE_DIR
+import write_hooks
+
+log = get_logger("news_stream")
+
+DB_PATH = os.getenv("STREAM_LOG_PATH", os.path.join(CACHE_DIR, "stream_events.sqlite3"))
+# Events kept in the log for clients resuming with Last-Event-ID
+RETENTION = int(os.getenv("STREAM_RETENTION", "10000"))
+# Seconds between reads of the log for writes made by other processes
+POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "1"))
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT = float(os.getenv("STREAM_HEARTBEAT", "15"))
+# Events kept in memory by each API process
+BUFFER_SIZE = 2048
+READ_LIMIT = 500
+# Milliseconds a client waits before reconnecting
+RETRY_MS = 5000
+
+
+class EventLog:
+    """Append-only log of written documents in SQLite. Safe to share between threads and processes."""
+
+    def __init__(self, path=DB_PATH, retention=RETENTION):
+        self.path = path
+        self.retention = retention
+        self._conn = None
+        self._lock = threading.Lock()
+        # Set on every append, so a reader in the same process does not wait for its next poll
+        self.appended = threading.Event()
+
+    def _connection(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # AUTOINCREMENT: ids are never reused, even once old events are pruned
+            self._conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, data TEXT NOT NULL)")
+            self._conn.commit()
+        return self._conn
+
+    def append(self, documents):
+        """Record the stored documents, without Cosmos system properties; registered as a write hook."""
+        rows = [
+            (json.dumps({k: v for k, v in document.items() if not k.startswith("_")}, ensure_ascii=False),)
+            for document in documents
+            if document.get("id")
+        ]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany("INSERT INTO events (data) VALUES (?)", rows)
+                conn.execute("DELETE FROM events WHERE id <= (SELECT seq FROM sqlite_sequence WHERE name = 'events') - ?",
+                             (self.retention,))
+        self.appended.set()
+
+    def last_id(self):
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+        return row[0] if row else 0
+
+    def read_after(self, cursor, limit=READ_LIMIT):
+        """Return [(id, data)] of up to `limit` events after `cursor`.
+
+        None if events after `cursor` were pruned, or `cursor` is ahead of
+        the log (which was deleted since), so the caller cannot catch up.
+        """
+        with self._lock:
+            conn = self._connection()
+            first = conn.execute("SELECT MIN(id) FROM events").fetchone()[0]
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'events'").fetchone()
+            last = row[0] if row else 0
+            if cursor > last or (first is not None and cursor < first - 1):
+                return None
+            return conn.execute("SELECT id, data FROM events WHERE id > ? ORDER BY id LIMIT ?", (cursor, limit)).fetchall()
+
+
+def parse_event_id(value):
+    try:
+        return max(0, int(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _frame(event_id, event=None, data=None):
+    lines = [f"id: {event_id}"]
+    if event:
+        lines.append(f"event: {event}")
+    if data is not None:
+        lines.append(f"data: {data}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class NewsStream:
+    """Fans the event log out to any number of subscribers from one reader thread."""
+
+    def __init__(self, log, fields, buffer_size=BUFFER_SIZE, poll_interval=POLL_INTERVAL):
+        self.log = log
+        self.fields = fields
+        self.poll_interval = poll_interval
+        # (id, projected item, encoded SSE frame), oldest first
+        self._buffer = deque(maxlen=buffer_size)
+        self._cond = threading.Condition()
+        self._listeners = set()
+        self._thread = None
+        self.last_id = 0
+        self.subscribers = 0
+        self.events_read = 0
+        self.resets = 0
+
+    def _event(self, event_id, data):
+        document = json.loads(data)
+        item = {field: document[field] for field in self.fields if field in document}
+        return event_id, item, _frame(event_id, "item", json.dumps(item))
+
+    def subscribe(self, last_event_id=None):
+        """Register a subscriber; returns the cursor to start from (the latest event if none is given)."""
+        with self._cond:
+            self.subscribers += 1
+            if self._thread is None:
+                # Start from the log's end; the buffer of a previous run may have gaps
+                self._buffer.clear()
+                self.last_id = self.log.last_id()
+                self._thread = threading.Thread(target=self._run, name="news-stream", daemon=True)
+                self._thread.start()
+            cursor = parse_event_id(last_event_id)
+            return self.last_id if cursor is None else cursor
+
+    def unsubscribe(self):
+        with self._cond:
+            self.subscribers -= 1
+
+    def add_listener(self, listener):
+        """Call listener() from the reader thread whenever new events arrive."""
+        with self._cond:
+            self._listeners.add(listener)
+
+    def remove_listener(self, listener):
+        with self._cond:
+            self._listeners.discard(listener)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self.subscribers:
+                    self._thread = None
+                    return
+                cursor = self.last_id
+            try:
+                rows = self.log.read_after(cursor)
+            except sqlite3.Error as e:
+                log.warn("event_log_read_failed", every=True, error=e)
+                rows = []
+            if rows is None:
+                # The log was pruned past this process or recreated; subscribers behind get a reset
+                with self._cond:
+                    self._buffer.clear()
+                    self.last_id = self.log.last_id()
+                continue
+            if rows:
+                events = [self._event(event_id, data) for event_id, data in rows]
+                with self._cond:
+                    self._buffer.extend(events)
+                    self.last_id = events[-1][0]
+                    self.events_read += len(events)
+                    self._cond.notify_all()
+                    listeners = list(self._listeners)
+                for listener in listeners:
+                    listener()
+                if len(rows) == READ_LIMIT:
+                    continue
+            self.log.appended.wait(self.poll_interval)
+            self.log.appended.clear()
+
+    def wait(self, cursor, timeout):
+        """Block until there are events after `cursor` or `timeout` seconds have passed."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.last_id != cursor, timeout)
+
+    def buffered(self, cursor):
+        """Events after `cursor` from memory, or None if the buffer no longer holds them all."""
+        with self._cond:
+            if cursor == self.last_id:
+                return []
+            if not self._buffer or cursor < self._buffer[0][0] - 1 or cursor > self.last_id:
+                return None
+            events = []
+            for event in reversed(self._buffer):
+                if event[0] <= cursor:
+                    break
+                events.append(event)
+        events.reverse()
+        return events
+
+    def collect(self, cursor, match=None):
+        """Return (SSE bytes for the events after `cursor` that `match`, new cursor).
+
+        Reads the log when the events are no longer buffered, and sends a
+        reset event when they are no longer in the log either.
+        """
+        events = self.buffered(cursor)
+        if events is None:
+            rows = self.log.read_after(cursor)
+            if rows is None:
+                with self._cond:
+                    self.resets += 1
+                    cursor = self.last_id
+                return _frame(cursor, "reset", json.dumps({"lastEventId": cursor})), cursor
+            events = [self._event(event_id, data) for event_id, data in rows]
+        if not events:
+            return b"", cursor
+        chunk = b"".join(frame for _, item, frame in events if match is None or match(item))
+        return chunk, events[-1][0]
+
+    def opening(self, cursor):
+        """First bytes of a stream: the reconnection delay and the starting id, so a reconnect resumes from here."""
+        return f"retry: {RETRY_MS}\n".encode("utf-8") + _frame(cursor)
+
+    def heartbeat(self, cursor):
+        """Keep-alive comment; also moves the client's Last-Event-ID past events its filters skipped."""
+        return b": keepalive\n" + _frame(cursor)
+
+    def events(self, last_event_id=None, match=None, heartbeat=HEARTBEAT):
+        """Yield the SSE stream for one subscriber until the client disconnects."""
+        cursor = self.subscribe(last_event_id)
+        try:
+            yield self.opening(cursor)
+            while True:
+                self.wait(cursor, heartbeat)
+                chunk, cursor = self.collect(cursor, match)
+                yield chunk or self.heartbeat(cursor)
+        finally:
+            self.unsubscribe()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "subscribers": self.subscribers,
+                "lastEventId": self.last_id,
+                "buffered": len(self._buffer),
+                "eventsRead": self.events_read,
+                "resets": self.resets,
+            }
+
+
+event_log = EventLog()
+write_hooks.register(event_log.append)
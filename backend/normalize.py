@@ -0,0 +1,192 @@
+"""Normalization of news documents: dates, labels, descriptions and impact levels.
+
+Shared by the API, the backfill (normalize_data.py) and the ingestion
+pipeline without importing the Flask app. Clients are created on first use
+(clients.py), so importing this module connects to nothing.
+"""
+import json
+import re
+
+from clients import OPENAI_DEPLOYMENT_NAME, container, openai_client
+from dates import normalize_date
+from enrichment import normalize_impact
+from llm_cache import cache_key, llm_cache
+from logs import get_logger
+from metrics import record_openai_usage, timed
+from response_cache import mark_stale
+from tagger import default_tagger
+import write_hooks
+# Imported for their write hooks, so writes by batch jobs keep the derived views current
+import alerts
+import embeddings
+import news_stream
+import rollups
+import search_index
+
+# Bumped whenever the prompt below changes so cached answers are not reused
+PROMPT_VERSION = "single-v1"
+
+log = get_logger("normalize")
+
+# Function to generate missing data using Azure OpenAI
+def generate_description_and_impact(title, url):
+    key = cache_key(title, url, PROMPT_VERSION, OPENAI_DEPLOYMENT_NAME)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        log.info("llm_cache_hit", every=True, title=title)
+        return cached
+
+    prompt = f"Generate a description highly relevant and impact level (high, medium, low) for the following:\nTitle: {title}\nURL: {url}\n"
+    try:
+        with timed("llm"):
+            response = openai_client.chat.completions.create(
+                messages=[
+                    {"role": "system", "content": "You are a helpful assistant."},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=100,
+                temperature=0.7,
+                top_p=1.0,
+                model=OPENAI_DEPLOYMENT_NAME,
+            )
+        record_openai_usage(response)
+
+        generated_text = response.choices[0].message.content.strip()
+
+        # Split the response into description and impact
+        lines = generated_text.split("\n")
+        if len(lines) >= 2:
+            description = lines[0].strip()
+            impact = lines[1].strip().lower()
+        else:
+            # Handle cases where the response does not have two lines
+            description = generated_text
+            impact = "low"
+
+        log.info("llm_generated", every=True, title=title, impact=impact)
+        llm_cache.put(key, description, impact)
+        return description, impact
+    except Exception as e:
+        log.error("llm_failed", every=True, title=title, error=e)
+        return "No description available", "low"
+
+# Function to extract competitor name from URL
+def extract_competitor_from_url(url):
+    """Extract competitor name from the URL."""
+    if not url:
+        return "Unknown Competitor"
+    # Extract the domain name (e.g., "smec" from "https://www.smec.com")
+    match = re.search(r"https?://(?:www\.)?([a-zA-Z0-9-]+)\.", url)
+    if match:
+        return match.group(1).capitalize()  # Capitalize the competitor name
+    return "Unknown Competitor"
+
+# Properties Cosmos adds to every document; they change on each write
+SYSTEM_PROPERTIES = ("_rid", "_self", "_etag", "_attachments", "_ts", "_lsn")
+
+# Function to serialize the user-visible part of a document for change detection
+def document_fingerprint(item):
+    body = {k: v for k, v in item.items() if k not in SYSTEM_PROPERTIES}
+    return json.dumps(body, sort_keys=True, ensure_ascii=False)
+
+# Function to check whether an item needs an LLM-generated description and impact
+def needs_enrichment(item):
+    return normalize_impact(item.get("impact")) is None
+
+# Function to normalize and fill missing data
+def normalize_item(item, generated=None, target_container=None, upsert=True):
+    """Normalize an item and upsert it if normalization changed it.
+
+    `generated` is an optional (description, impact) pair produced ahead of
+    time by the bulk enricher; without it the LLM is called for this item.
+    `target_container` defaults to the shared container. Bulk callers pass
+    upsert=False and write the normalized items themselves.
+    """
+    original = document_fingerprint(item)
+    # Store the ISO date and its Unix time; unparseable labels ("Unknown") are kept as they are
+    raw_date = item.get("date", "")
+    date, date_epoch = normalize_date(raw_date, item.get("source"))
+    if date is None:
+        date = raw_date
+
+    url = item.get("url") or item.get("link") or None
+    title = item.get("title", "No Title")
+    description = item.get("description", "").strip()
+
+    # Normalize impact to "high," "medium," or "low"
+    impact = normalize_impact(item.get("impact"))
+    if impact is None:
+        if generated is not None:
+            description, impact = generated
+        else:
+            # Generate impact using LLM if not defined
+            description, impact = generate_description_and_impact(title, url)
+
+    # Fill description if it's empty
+    if not description or description == "**Description:**":
+        description = f"The article \"{title}\" highlights key developments. Visit {url} for more details."
+
+    # Fill sector, region, competitor and tags from the taxonomy where they are missing
+    default_tagger.apply(item)
+
+    # Extract competitor name from URL if missing
+    competitor = item.get("competitor", "Unknown Competitor")
+    if competitor == "Unknown Competitor":
+        competitor = extract_competitor_from_url(url)
+
+    # Fill other fields with defaults if missing
+    activity_type = item.get("activityType", "General Activity")
+    region = item.get("region", "N/A")
+    sector = item.get("sector", "N/A")
+    estimated_value = item.get("estimatedValue", "Not Available")
+    excerpt = item.get("excerpt", "No excerpt available.")
+    image = item.get("image", "https://via.placeholder.com/150")
+    tags = item.get("tags", [])
+
+    # Update the item in CosmosDB with the filled data
+    item["date"] = date
+    item["dateEpoch"] = date_epoch
+    item["description"] = description
+    item["impact"] = impact
+    item["activityType"] = activity_type
+    item["competitor"] = competitor
+    item["region"] = region
+    item["sector"] = sector
+    item["estimatedValue"] = estimated_value
+    item["excerpt"] = excerpt
+    item["image"] = image
+    item["tags"] = tags
+
+    # Skip the write when the stored document is already normalized
+    # One line every few seconds per outcome, not one per item
+    if document_fingerprint(item) == original:
+        log.info("item_unchanged", every=True, id=item.get("id"))
+    elif upsert:
+        try:
+            with timed("upsert"):
+                (target_container or container).upsert_item(item)
+            mark_stale()
+            write_hooks.notify([item])
+            log.info("item_backfilled", every=True, id=item.get("id"))
+        except Exception as e:
+            log.error("upsert_failed", every=True, id=item.get("id"), error=e)
+    else:
+        log.debug("item_normalized", every=True, id=item.get("id"))
+
+    return {
+        "id": item.get("id"),
+        "title": title,
+        "date": date,
+        "dateEpoch": date_epoch,
+        "url": url,
+        "excerpt": excerpt,
+        "image": image,
+        "tags": tags,
+        "activityType": activity_type,
+        "competitor": competitor,
+        "description": description,
+        "region": region,
+        "sector": sector,
+        "estimatedValue": estimated_value,
+        "impact": impact,
+    }
@@ -1,34 +1,90 @@
-from azure.cosmos import CosmosClient, exceptions
-from dotenv import load_dotenv
-import os
-from app import normalize_item
-
-# Load environment variables from .env
-load_dotenv()
-
-# Azure CosmosDB configuration
-COSMOS_URI = os.getenv("COSMOS_URI")
-COSMOS_KEY = os.getenv("COSMOS_KEY")
-DATABASE_NAME = os.getenv("COSMOS_DATABASE")
-CONTAINER_NAME = os.getenv("COSMOS_CONTAINER")
-
-# Initialize CosmosDB client
-cosmos_client = CosmosClient(COSMOS_URI, credential=COSMOS_KEY)
-database = cosmos_client.get_database_client(DATABASE_NAME)
-container = database.get_container_client(CONTAINER_NAME)
-
-def backfill_data():
-    print("[INFO] Starting backfill process...")
+from azure.cosmos import exceptions
+import argparse
+import time
+from clients import OPENAI_DEPLOYMENT_NAME, container, openai_client
+from normalize import normalize_item, needs_enrichment, document_fingerprint
+from enrichment import BulkEnricher
+from bulk_writer import BulkWriter
+from llm_cache import llm_cache
+from tagger import tag_documents
+from logs import get_logger
+from metrics import write_textfile
+import change_feed
+
+log = get_logger("backfill")
+
+# Name under which the backfill's change feed position is persisted
+CHANGE_FEED_CONSUMER = "backfill"
+
+def normalize_items(items, target_container):
+    """Enrich the items that need it in bulk, normalize them and bulk-upsert the changed ones."""
+    enricher = BulkEnricher(openai_client, OPENAI_DEPLOYMENT_NAME)
+    # Taken before tagging, so labels the taxonomy or the LLM fill in count as changes
+    originals = [document_fingerprint(item) for item in items]
+    # Label sectors, regions and tags from the taxonomy; only unresolved items go to the LLM
+    tag_documents(items, enricher)
+
+    # Generate missing descriptions and impact levels in concurrent, batched LLM calls
+    pending = [
+        {"id": item.get("id"), "title": item.get("title", "No Title"), "url": item.get("url") or item.get("link")}
+        for item in items
+        if needs_enrichment(item)
+    ]
+    generated = enricher.enrich(pending)
+
+    changed = []
+    for item, original in zip(items, originals):
+        normalize_item(item, generated.get(item.get("id")), upsert=False)  # Normalize each item in place
+        if document_fingerprint(item) != original:
+            changed.append(item)
+
+    log.info("items_normalized", changed=len(changed), items=len(items))
+    if changed:
+        BulkWriter(target_container).write(changed)
+
+def backfill_data(target_container=container):
+    log.info("backfill_started")
     try:
-        items = list(container.read_all_items())
-        print(f"[INFO] Fetched {len(items)} items from CosmosDB for backfilling")
+        items = list(target_container.read_all_items())
+        log.info("items_fetched", items=len(items))
+
+        normalize_items(items, target_container)
 
-        for item in items:
-            normalize_item(item)  # Normalize and backfill each item
+        stats = llm_cache.stats()
+        log.info("llm_cache", hits=stats["hits"], misses=stats["misses"], entries=stats["size"])
+        log.info("backfill_done")
+    except exceptions.CosmosHttpResponseError as e:
+        log.error("backfill_failed", error=e)
 
-        print("[INFO] Backfill process completed successfully")
+def backfill_incremental(target_container=container, state_path=change_feed.STATE_PATH):
+    """Normalize only the documents created or changed since the last run.
+
+    Reads the container's change feed from the persisted continuation tokens.
+    The first run starts from the beginning of the feed. Documents written
+    by the previous run show up again but are skipped as unchanged.
+    """
+    log.info("incremental_backfill_started")
+    try:
+        start_time = time.time()
+        total = 0
+        for range_id, items, commit in change_feed.read_changes(target_container, CHANGE_FEED_CONSUMER, state_path):
+            log.info("changes_read", items=len(items), range=range_id)
+            if items:
+                normalize_items(items, target_container)
+            commit()
+            total += len(items)
+        elapsed_time = time.time() - start_time
+        log.info("incremental_backfill_done", items=total, seconds=round(elapsed_time, 2))
     except exceptions.CosmosHttpResponseError as e:
-        print(f"[ERROR] Error during backfill process: {e}")
+        log.error("incremental_backfill_failed", error=e)
 
 if __name__ == "__main__":
-    backfill_data()
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Normalize and backfill news items in CosmosDB")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="only process items changed since the last run (change feed)")
+    args = arg_parser.parse_args()
+    if args.incremental:
+        backfill_incremental()
+    else:
+        backfill_data()
+    write_textfile()
@@ -0,0 +1,249 @@
+"""Streaming ingestion pipeline: scrape -> normalize -> dedupe -> tag -> enrich -> bulk write.
+
+Every stage is a generator, so records flow through one at a time instead
+of being materialized as CSV, then JSON, then an upload list. A bounded
+queue separates the producing stages (scraping, normalizing, deduplicating)
+from the consuming ones (LLM enrichment, Cosmos writes). When enrichment or
+writing falls behind, the producers block instead of buffering, so memory
+stays bounded by QUEUE_SIZE plus one batch however much is ingested.
+Batches are flushed when full or after MAX_BATCH_WAIT seconds, so articles
+from a fast source reach the dashboard without waiting for slow ones.
+
+    python pipeline.py "Scraped Data/competitor data/aecom_press_releases.csv" ...
+    python pipeline.py --snapshot snapshot.ndjson --no-ingest files...
+"""
+import argparse
+import csv
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrapers"))
+from base import normalize_record, source_for_file
+from dedupe import near_duplicate_index, record_id
+from logs import get_logger
+from metrics import write_textfile
+from tagger import tag_documents
+
+log = get_logger("pipeline")
+
+BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "100"))
+QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "1000"))
+MAX_BATCH_WAIT = float(os.getenv("PIPELINE_MAX_BATCH_WAIT", "5"))
+# Article keys remembered by the in-run duplicate filter
+DEDUPE_WINDOW = 100000
+
+_DONE = object()
+
+
+# Function to read scraped records from CSV, NDJSON or JSON files one row at a time
+def read_files(paths):
+    for path in paths:
+        # The scraper's SOURCE, so ids and seen keys match those of a scraper run
+        source = source_for_file(path)
+        count = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            if path.endswith(".csv"):
+                rows = csv.DictReader(f)
+            elif path.endswith(".ndjson"):
+                rows = (json.loads(line) for line in f if line.strip())
+            else:
+                # A JSON array has to be parsed whole, but only one file is held at a time
+                rows = json.load(f)
+            for row in rows:
+                count += 1
+                yield normalize_record(row, row.get("source") or source)
+        log.info("file_read", records=count, path=path)
+
+
+# Function to turn a normalized record into a Cosmos document
+def to_document(record):
+    document = {key: value for key, value in record.items() if value is not None}
+    # Derived from the article itself, so re-ingesting it overwrites instead of duplicating
+    document["id"] = record_id(document.get("source"), document)
+    return document
+
+
+def dedupe(documents, index=near_duplicate_index, window=DEDUPE_WINDOW):
+    """Drop repeats of the same article and tag near duplicates of earlier ones.
+
+    Near duplicates (syndicated copies of a story) are kept but get
+    `duplicateOf` set, so enrichment can reuse the canonical article's
+    results. Pass index=None to skip near-duplicate detection.
+    """
+    seen = OrderedDict()
+    dropped = 0
+    near = 0
+    for document in documents:
+        if document["id"] in seen:
+            dropped += 1
+            continue
+        seen[document["id"]] = None
+        if len(seen) > window:
+            seen.popitem(last=False)
+        if index is not None:
+            index.assign(document)
+            near += "duplicateOf" in document
+        yield document
+    log.info("deduplicated", dropped=dropped, near_duplicates=near)
+
+
+def snapshot(documents, path):
+    """Append every document passing through to an NDJSON file."""
+    with open(path, "a", encoding="utf-8") as f:
+        for document in documents:
+            f.write(json.dumps(document, ensure_ascii=False) + "\n")
+            yield document
+
+
+def bounded_batches(items, batch_size=BATCH_SIZE, max_wait=MAX_BATCH_WAIT, maxsize=QUEUE_SIZE):
+    """Consume `items` on a producer thread and yield them in lists of up to `batch_size`.
+
+    The producer blocks once `maxsize` items are queued. A partial batch is
+    yielded when no item arrived for `max_wait` seconds or it has waited
+    that long since its first item. Producer exceptions are re-raised here.
+    """
+    buffer = queue.Queue(maxsize=maxsize)
+    failure = []
+
+    def produce():
+        try:
+            for item in items:
+                buffer.put(item)
+        except Exception as e:
+            failure.append(e)
+        finally:
+            buffer.put(_DONE)
+
+    threading.Thread(target=produce, daemon=True).start()
+    batch = []
+    deadline = None
+    while True:
+        timeout = None if deadline is None else max(0.0, deadline - time.time())
+        try:
+            item = buffer.get(timeout=timeout)
+        except queue.Empty:
+            yield batch
+            batch, deadline = [], None
+            continue
+        if item is _DONE:
+            break
+        batch.append(item)
+        if deadline is None:
+            deadline = time.time() + max_wait
+        if len(batch) >= batch_size:
+            yield batch
+            batch, deadline = [], None
+    if batch:
+        yield batch
+    if failure:
+        raise failure[0]
+
+
+def _article(document):
+    return {"id": document["id"], "title": document.get("title", "No Title"), "url": document.get("url")}
+
+
+def enrich(batches, enricher, index=near_duplicate_index):
+    """Tag, generate missing descriptions and impact levels per batch and normalize the documents.
+
+    Near duplicates reuse their canonical article's generation, from the
+    same batch or from the LLM cache, instead of costing another call.
+    """
+    # Imported here so snapshot-only runs do not load the normalizer and the derived views
+    from normalize import needs_enrichment, normalize_item
+    for batch in batches:
+        tag_documents(batch, enricher)
+        by_id = {document["id"]: document for document in batch}
+        pending = {}
+        copies = {}
+        reused = {}
+        for document in batch:
+            if not needs_enrichment(document):
+                continue
+            canonical = document.get("duplicateOf")
+            if canonical in by_id and needs_enrichment(by_id[canonical]):
+                # Enriched together with its canonical article
+                copies[document["id"]] = canonical
+                pending.setdefault(canonical, _article(by_id[canonical]))
+                continue
+            known = index.canonical(canonical) if canonical and index is not None else None
+            cached = enricher.cached(*known) if known else None
+            if cached is not None:
+                reused[document["id"]] = cached
+            else:
+                pending[document["id"]] = _article(document)
+        generated = enricher.enrich(list(pending.values()))
+        generated.update(reused)
+        generated.update({document_id_: generated.get(canonical) for document_id_, canonical in copies.items()})
+        if copies or reused:
+            log.info("generations_reused", every=True, near_duplicates=len(copies) + len(reused))
+        for document in batch:
+            normalize_item(document, generated.get(document["id"]), upsert=False)
+        yield batch
+
+
+def write(batches, writer):
+    """Bulk-upsert each batch; yield it, the documents actually stored and the writer's statistics."""
+    for batch in batches:
+        stats = writer.write(batch)
+        stored = set(stats["storedIds"])
+        yield batch, [document for document in batch if document["id"] in stored], stats
+
+
+def run_pipeline(records, target_container=None, snapshot_path=None, batch_size=BATCH_SIZE,
+                 queue_size=QUEUE_SIZE, max_wait=MAX_BATCH_WAIT, on_written=None):
+    """Stream `records` (normalized scraper records) through the pipeline.
+
+    Without a `target_container` the records are only normalized,
+    deduplicated and snapshotted. `on_written(documents)` is called with
+    the documents of each batch that were stored; those whose upsert
+    failed are left out. Returns totals for the run.
+    """
+    start_time = time.time()
+    documents = dedupe(to_document(record) for record in records)
+    if snapshot_path:
+        documents = snapshot(documents, snapshot_path)
+    batches = bounded_batches(documents, batch_size, max_wait, queue_size)
+
+    totals = {"documents": 0, "written": 0, "failed": 0, "batches": 0}
+    if target_container is None:
+        for batch in batches:
+            totals["documents"] += len(batch)
+            totals["batches"] += 1
+            if on_written:
+                on_written(batch)
+    else:
+        from clients import OPENAI_DEPLOYMENT_NAME, openai_client
+        from bulk_writer import BulkWriter
+        from enrichment import BulkEnricher
+        enricher = BulkEnricher(openai_client, OPENAI_DEPLOYMENT_NAME)
+        for batch, stored, stats in write(enrich(batches, enricher), BulkWriter(target_container)):
+            totals["documents"] += len(batch)
+            totals["written"] += stats["written"]
+            totals["failed"] += stats["failed"]
+            totals["batches"] += 1
+            if on_written and stored:
+                on_written(stored)
+    totals["seconds"] = time.time() - start_time
+    log.info("pipeline_done", documents=totals["documents"], batches=totals["batches"], written=totals["written"],
+             failed=totals["failed"], seconds=round(totals["seconds"], 2))
+    return totals
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Stream scraped files into CosmosDB")
+    arg_parser.add_argument("paths", nargs="+", help="CSV, NDJSON or JSON files of scraped records")
+    arg_parser.add_argument("--snapshot", metavar="PATH", help="also append the documents to this NDJSON file")
+    arg_parser.add_argument("--no-ingest", action="store_true", help="do not write to CosmosDB")
+    arg_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = arg_parser.parse_args()
+    container = None
+    if not args.no_ingest:
+        from clients import container
+    run_pipeline(read_files(args.paths), container, args.snapshot, args.batch_size)
+    write_textfile()
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: no advisory locks; concurrent saves from several processes may lose writes
+    fcntl = None
+
+# Directory for local caches and state shared by the API and the batch jobs
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+# Touched on every write so API processes drop cached responses, even when
+# the write came from another process (backfill, upload utilities)
+STAMP_PATH = os.path.join(CACHE_DIR, "news_cache.stamp")
+# Created by the first write after the news snapshot started its last
+# build and removed by the next build, so its time is the oldest write
+# the snapshot may be missing
+PENDING_PATH = os.path.join(CACHE_DIR, "news_cache.pending")
+
+
+def mark_stale(stamp_path=STAMP_PATH, pending_path=PENDING_PATH):
+    """Signal every ResponseCache watching stamp_path that the data changed."""
+    os.makedirs(os.path.dirname(stamp_path), exist_ok=True)
+    now = str(time.time_ns())
+    with open(stamp_path, "w") as f:
+        f.write(now)
+    try:
+        # Exclusive create: an older pending write keeps its time
+        with open(pending_path, "x") as f:
+            f.write(now)
+    except FileExistsError:
+        pass
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on `path` (created if missing) shared by every process on the host."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_stamp(stamp_path):
+    try:
+        return os.stat(stamp_path).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of serialized responses with a TTL.
+
+    Entries are dropped when they expire, when the cache grows past
+    max_entries (least recently used first) or when invalidate()/mark_stale()
+    is called by a writer.
+    """
+
+    def __init__(self, max_entries=256, ttl=30.0, stamp_path=STAMP_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stamp_path = stamp_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = _read_stamp(stamp_path)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def _check_stamp(self):
+        stamp = _read_stamp(self.stamp_path)
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._entries.clear()
+            self.invalidations += 1
+
+    def get(self, key):
+        with self._lock:
+            self._check_stamp()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drop this process's entries without signalling a write."""
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self):
+        """Drop every entry here and in other processes sharing the stamp file."""
+        with self._lock:
+            self._entries.clear()
+            mark_stale(self.stamp_path)
+            self._stamp = _read_stamp(self.stamp_path)
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,210 @@
+"""Materialized count and value rollups for the dashboard charts.
+
+Each document contributes one count (and its estimated value, if any) to
+its region, sector, competitor, impact level and publication week. The
+contribution of every document is stored next to the totals, so when a
+write hook reports an upsert, the document's old contribution is
+subtracted and the new one added in the same transaction. The totals are
+never recomputed from the container. Near duplicates (`duplicateOf`)
+are not counted, so a story syndicated by several outlets counts once.
+
+The SQLite file is shared by every process, so rollups written by the
+backfill or the ingestion pipeline are immediately visible to the API.
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from dates import date_epoch, document_epoch
+from logs import get_logger
+from response_cache import CACHE_DIR
+import write_hooks
+
+log = get_logger("rollups")
+
+DB_PATH = os.getenv("ROLLUPS_PATH", os.path.join(CACHE_DIR, "rollups.sqlite3"))
+DIMENSIONS = ("region", "sector", "competitor", "impact", "week")
+UNKNOWN = "Unknown"
+
+# "$1.2 billion", "USD 450m", "AUD 45 million"; needs a currency or a unit to count as a value
+VALUE_PATTERN = re.compile(
+    r"(?P<currency>[$€£]|\b(?:usd|aud|sgd|gbp|eur|nzd|cad|hkd)\b)?\s*"
+    r"(?P<amount>\d[\d,]*(?:\.\d+)?)\s*"
+    r"(?P<unit>billion|bn|million|mn|thousand|[bmk])?\b",
+    re.IGNORECASE,
+)
+# Multipliers to millions
+UNITS = {"billion": 1000.0, "bn": 1000.0, "b": 1000.0, "million": 1.0, "mn": 1.0, "m": 1.0,
+         "thousand": 0.001, "k": 0.001}
+
+
+def parse_value(text):
+    """Estimated value in millions (currency ignored), or None if the text has no amount."""
+    if isinstance(text, (int, float)):
+        return float(text)
+    for match in VALUE_PATTERN.finditer(text or ""):
+        unit = (match.group("unit") or "").lower()
+        if not match.group("currency") and not unit:
+            continue
+        amount = float(match.group("amount").replace(",", ""))
+        return amount * UNITS[unit] if unit else amount / 1e6
+    return None
+
+
+def week_of(value):
+    """ISO week ("2025-W18") of a Unix time or date label, or None if it cannot be parsed."""
+    epoch = date_epoch(value)
+    if epoch is None:
+        return None
+    year, week, _ = datetime.fromtimestamp(epoch, timezone.utc).date().isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def contribution(document):
+    """(keys per dimension, value) a document adds to the rollups, or None if it is not counted."""
+    if document.get("duplicateOf"):
+        return None
+    keys = {
+        "region": document.get("region") or UNKNOWN,
+        "sector": document.get("sector") or UNKNOWN,
+        "competitor": document.get("competitor") or UNKNOWN,
+        "impact": document.get("impact") or UNKNOWN,
+        "week": week_of(document_epoch(document)) or UNKNOWN,
+    }
+    return keys, parse_value(document.get("estimatedValue"))
+
+
+class Rollups:
+    """Incrementally maintained rollups in SQLite. Safe to share between threads and processes."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS contributions ("
+                " id TEXT PRIMARY KEY, region TEXT, sector TEXT, competitor TEXT, impact TEXT, week TEXT, value REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollups ("
+                " dimension TEXT, key TEXT, count INTEGER NOT NULL, value REAL NOT NULL, valued INTEGER NOT NULL,"
+                " PRIMARY KEY (dimension, key))"
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+            self._conn.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('version', 0)")
+            self._conn.commit()
+        return self._conn
+
+    def _apply(self, conn, keys, value, sign):
+        rows = [
+            (dimension, keys[dimension], sign, sign * (value or 0.0), sign if value is not None else 0)
+            for dimension in DIMENSIONS
+        ]
+        conn.executemany(
+            "INSERT INTO rollups (dimension, key, count, value, valued) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (dimension, key) DO UPDATE SET"
+            " count = count + excluded.count, value = value + excluded.value, valued = valued + excluded.valued",
+            rows,
+        )
+
+    def update(self, documents):
+        """Replace the contributions of the given documents; registered as a write hook."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                for document in documents:
+                    doc_id = document.get("id")
+                    if not doc_id:
+                        continue
+                    old = conn.execute(
+                        "SELECT region, sector, competitor, impact, week, value FROM contributions WHERE id = ?",
+                        (doc_id,),
+                    ).fetchone()
+                    new = contribution(document)
+                    if old is not None:
+                        if new is not None and tuple(new[0][d] for d in DIMENSIONS) + (new[1],) == tuple(old):
+                            continue
+                        self._apply(conn, dict(zip(DIMENSIONS, old[:5])), old[5], -1)
+                        conn.execute("DELETE FROM contributions WHERE id = ?", (doc_id,))
+                    if new is not None:
+                        keys, value = new
+                        self._apply(conn, keys, value, 1)
+                        conn.execute(
+                            "INSERT INTO contributions (id, region, sector, competitor, impact, week, value)"
+                            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (doc_id, *(keys[d] for d in DIMENSIONS), value),
+                        )
+                conn.execute("DELETE FROM rollups WHERE count <= 0")
+                conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'version'")
+
+    def rebuild(self, documents):
+        """Recompute the rollups from scratch, e.g. after writes that bypassed the hooks."""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM contributions")
+                conn.execute("DELETE FROM rollups")
+        count = 0
+        batch = []
+        for document in documents:
+            batch.append(document)
+            count += 1
+            if len(batch) >= 500:
+                self.update(batch)
+                batch = []
+        self.update(batch)
+        return count
+
+    def version(self):
+        with self._lock:
+            return self._connection().execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+
+    def ensure_built(self, load_documents):
+        """Build the rollups from `load_documents()` if nothing was ever recorded."""
+        if self.version() == 0:
+            count = self.rebuild(load_documents())
+            log.info("rollups_built", documents=count)
+
+    def query(self, dimensions=DIMENSIONS, weeks=26):
+        """Return {"version", "total", "dimensions": {dimension: [{key, count, value, valued}]}}.
+
+        Rows are ordered by count, except weeks, which are the most recent
+        `weeks` in chronological order.
+        """
+        with self._lock:
+            conn = self._connection()
+            version = conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()[0]
+            # Every counted document has exactly one impact row, so its sums are the totals
+            total_count, total_value = conn.execute(
+                "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(value), 0) FROM rollups WHERE dimension = 'impact'"
+            ).fetchone()
+            result = {}
+            for dimension in dimensions:
+                if dimension == "week":
+                    rows = conn.execute(
+                        "SELECT key, count, value, valued FROM rollups WHERE dimension = 'week' AND key != ?"
+                        " ORDER BY key DESC LIMIT ?", (UNKNOWN, weeks),
+                    ).fetchall()[::-1]
+                else:
+                    rows = conn.execute(
+                        "SELECT key, count, value, valued FROM rollups WHERE dimension = ? ORDER BY count DESC, key",
+                        (dimension,),
+                    ).fetchall()
+                result[dimension] = [
+                    {"key": key, "count": count, "value": round(value, 3), "valued": valued}
+                    for key, count, value, valued in rows
+                ]
+        return {"version": version, "total": {"count": total_count, "value": round(total_value, 3)}, "dimensions": result}
+
+
+rollups = Rollups()
+write_hooks.register(rollups.update)
@@ -0,0 +1,183 @@
+"""Run every scraper plugin concurrently and ingest what they find.
+
+Plugins are the Scraper subclasses defined in the scripts under scrapers/.
+HTTP scrapers run on their own threads; browser scrapers share a pool of
+headless browsers. Each source's new articles are normalized to one record
+schema and streamed into the ingestion pipeline (pipeline.py) as soon as
+that source is done:
+
+    python run_scrapers.py                       # scrape everything and ingest
+    python run_scrapers.py --only aecom wsp      # selected sources
+    python run_scrapers.py --no-ingest --snapshot records.ndjson
+"""
+import argparse
+import importlib.util
+import inspect
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+SCRAPERS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scrapers")
+sys.path.append(SCRAPERS_DIR)
+from base import Scraper
+from browser_pool import BrowserPool, POOL_SIZE
+from crawl_state import CrawlState
+from logs import get_logger
+from metrics import scraper_items, write_textfile
+from pipeline import run_pipeline
+
+log = get_logger("scrapers")
+
+# Shared modules in scrapers/ that are not plugins
+LIBRARY_MODULES = {"base.py", "browser_pool.py", "crawl_state.py", "fetch_engine.py"}
+# Seconds between checks for finished or timed-out sources
+POLL_INTERVAL = 0.5
+
+
+def load_module(path):
+    # Script names contain spaces, so load them by path
+    name = "scraper_" + os.path.splitext(os.path.basename(path).strip())[0].replace(" ", "_")
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def discover_scrapers(directory=SCRAPERS_DIR):
+    """Return an instance of every Scraper subclass defined under `directory`, by name."""
+    scrapers = {}
+    for root, _, files in os.walk(directory):
+        for filename in sorted(files):
+            if not filename.endswith(".py") or filename in LIBRARY_MODULES:
+                continue
+            try:
+                module = load_module(os.path.join(root, filename))
+            except Exception as e:
+                log.error("scraper_load_failed", file=filename, error=e)
+                continue
+            for _, cls in inspect.getmembers(module, inspect.isclass):
+                if issubclass(cls, Scraper) and cls is not Scraper and cls.__module__ == module.__name__:
+                    scrapers[cls.name] = cls()
+    return dict(sorted(scrapers.items()))
+
+
+def run_scrapers(scrapers, state, pool_size=POOL_SIZE):
+    """Run the scrapers concurrently, yielding (scraper, records, report) as each one finishes.
+
+    A source that is still running after its `timeout` seconds is reported
+    as timed out and its results are discarded. Its thread cannot be
+    interrupted, so it is left to finish in the background.
+    """
+    pool = BrowserPool(pool_size)
+    started = {}
+
+    def run(scraper):
+        if scraper.uses_browser:
+            with pool.driver() as driver:
+                # The timeout starts once the source has a browser, not while it queues for one
+                started[scraper.name] = time.time()
+                return scraper.scrape(state, driver)
+        started[scraper.name] = time.time()
+        return scraper.scrape(state)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, len(scrapers)))
+    pending = {executor.submit(run, scraper): scraper for scraper in scrapers}
+    try:
+        while pending:
+            done, _ = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            for future in done:
+                scraper = pending.pop(future)
+                seconds = time.time() - started.get(scraper.name, time.time())
+                try:
+                    records = [scraper.normalize(record) for record in future.result() or []]
+                    report = {"source": scraper.name, "status": "ok", "items": len(records), "seconds": seconds}
+                except Exception as e:
+                    log.error("scraper_failed", source=scraper.name, error=e)
+                    records = []
+                    report = {"source": scraper.name, "status": "failed", "items": 0, "seconds": seconds}
+                yield scraper, records, report
+            now = time.time()
+            for future, scraper in list(pending.items()):
+                if scraper.name in started and now - started[scraper.name] > scraper.timeout:
+                    log.warn("scraper_timeout", source=scraper.name, timeout=scraper.timeout)
+                    del pending[future]
+                    report = {"source": scraper.name, "status": "timeout", "items": 0, "seconds": now - started[scraper.name]}
+                    yield scraper, [], report
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        pool.close()
+
+
+def scraped_records(scrapers, state, pool_size, reports):
+    """Yield the normalized records of every source as it finishes, collecting the reports."""
+    for scraper, records, report in run_scrapers(scrapers, state, pool_size):
+        reports.append(report)
+        scraper_items.inc(report["items"], source=scraper.name, status=report["status"])
+        log.info("scraper_done", source=scraper.name, items=report["items"], status=report["status"], seconds=round(report["seconds"], 1))
+        if report["status"] == "ok" and not records:
+            # Nothing to write, so the source's listing validators can be saved now
+            state.mark_seen([], scraper.name)
+        yield from records
+
+
+def mark_seen(state, batch):
+    # Only records stored by the pipeline are skipped on the next crawl; failed upserts are retried,
+    # and a source's listing validators are saved once all its new records are stored
+    by_source = {}
+    for document in batch:
+        by_source.setdefault(document["source"], []).append(document)
+    for source, documents in by_source.items():
+        state.mark_seen(documents, source)
+
+
+def print_report(reports, elapsed_time):
+    print(f"\n{'source':<26}{'status':<10}{'items':>7}{'seconds':>10}")
+    for report in reports:
+        print(f"{report['source']:<26}{report['status']:<10}{report['items']:>7}{report['seconds']:>10.1f}")
+    total = sum(report["items"] for report in reports)
+    log.info("scrape_done", items=total, sources=len(reports), seconds=round(elapsed_time, 1))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Run the scraper plugins and ingest new articles")
+    arg_parser.add_argument("--only", nargs="+", metavar="SOURCE", help="run only these sources")
+    arg_parser.add_argument("--kind", choices=["news", "competitor"], help="run only news or competitor sources")
+    arg_parser.add_argument("--browsers", type=int, default=POOL_SIZE, help="headless browsers shared by the browser scrapers")
+    arg_parser.add_argument("--snapshot", metavar="PATH", help="also append the documents to this NDJSON file")
+    arg_parser.add_argument("--no-ingest", action="store_true", help="do not write the records to CosmosDB")
+    arg_parser.add_argument("--list", action="store_true", help="list the discovered sources and exit")
+    args = arg_parser.parse_args()
+
+    scrapers = discover_scrapers()
+    if args.list:
+        for scraper in scrapers.values():
+            print(f"{scraper.name:<26}{scraper.kind:<12}{'browser' if scraper.uses_browser else 'http'}")
+        return
+    selected = [
+        scraper for scraper in scrapers.values()
+        if (not args.only or scraper.name in args.only) and (not args.kind or scraper.kind == args.kind)
+    ]
+    unknown = set(args.only or ()) - set(scrapers)
+    if unknown:
+        log.warn("unknown_sources", sources=", ".join(sorted(unknown)))
+
+    container = None
+    if not args.no_ingest:
+        # Imported here so --no-ingest runs need no Cosmos or OpenAI configuration
+        from clients import container
+    elif not args.snapshot:
+        log.warn("nothing_kept", reason="neither ingesting nor snapshotting; new articles will be scraped again next time")
+
+    state = CrawlState()
+    start_time = time.time()
+    reports = []
+    records = scraped_records(selected, state, args.browsers, reports)
+    on_written = (lambda batch: mark_seen(state, batch)) if container is not None or args.snapshot else None
+    run_pipeline(records, container, args.snapshot, on_written=on_written)
+    print_report(reports, time.time() - start_time)
+    write_textfile()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,47 +1,81 @@
-import requests
+import os
+import sys
 from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
-import pandas as pd
 
-def get_smart_cities_news():
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fetch_engine import fetch_all
+from crawl_state import CrawlState, append_to_csv
+from base import Scraper
+
+SOURCE = 'smartcitiesdive'
+
+TOPICS = ['transportation', 'buildings-design', 'climate-resilience', 'energy-utilities', 'housing', 'tech-data', 'governance', 'equity']
+
+def parse_topic_page(html, topic, site_url='https://www.smartcitiesdive.com'):
+    soup = BeautifulSoup(html, 'html.parser')
+    articles = soup.find_all('li', class_='row feed__item')
+
+    news_data = []
+    for article in articles[:10]:  # Limit to top 10 articles
+        title_tag = article.select_one('.feed__title a')
+        title = title_tag.get_text(strip=True) if title_tag else 'No title'
+        link = site_url + title_tag['href'] if title_tag else 'No link'
+        image_tag = article.select_one('.feed__image-container img')
+        image_url = image_tag['src'] if image_tag else 'No image'
+        summary_tag = article.select_one('.feed__description')
+        summary = summary_tag.get_text(strip=True) if summary_tag else 'No summary'
+        date_tag = article.select_one('.secondary-label')
+        pub_date = date_tag.get_text(strip=True) if date_tag else 'Unknown'
+
+        news_data.append({
+            'topic': topic,
+            'title': title,
+            'summary': summary,
+            'url': link,
+            'image_url': image_url,
+            'date': pub_date,
+        })
+    return news_data
+
+def crawl_smart_cities_news(state, site_url='https://www.smartcitiesdive.com'):
+    """Return the articles on every topic page that were not ingested before."""
     ua = UserAgent()
     headers = {'User-Agent': ua.random}
-    base_url = 'https://www.smartcitiesdive.com/topic/'
-    topics = ['transportation', 'buildings-design', 'climate-resilience', 'energy-utilities', 'housing', 'tech-data', 'governance', 'equity']
+    base_url = site_url + '/topic/'
+
+    # Fetch every topic page concurrently, skipping pages unchanged since the last crawl
+    topic_urls = [base_url + topic for topic in TOPICS]
+    print(f"Scraping {len(topic_urls)} topic pages from {base_url}...")
+    responses = fetch_all(topic_urls, headers=headers, state=state)
 
     news_data = []
+    for topic, response in zip(TOPICS, responses):
+        if response.not_modified:
+            print(f"{response.url} not modified since the last crawl")
+            continue
+        if not response.ok:
+            print(f"Failed to retrieve {response.url}: {response.error or response.status}")
+            continue
+        # Saved by mark_seen once the page's new articles are stored
+        state.defer_validators(response.url, response.validators, SOURCE)
+        # Keep only articles not ingested before; listings are newest first
+        news_data.extend(state.take_new(parse_topic_page(response.text, topic, site_url), SOURCE))
+    return news_data
+
+def get_smart_cities_news(site_url='https://www.smartcitiesdive.com'):
+    state = CrawlState()
+    news_data = crawl_smart_cities_news(state, site_url)
+    append_to_csv(news_data, 'smart_cities_news.csv')
+    state.mark_seen(news_data, SOURCE)
+
+class SmartCitiesDiveScraper(Scraper):
+    name = SOURCE
+    kind = 'news'
+    timeout = 60
+
+    def scrape(self, state=None, driver=None):
+        return crawl_smart_cities_news(state or CrawlState())
 
-    for topic in topics:
-        topic_url = base_url + topic
-        print(f"Scraping {topic_url}...")
-
-        response = requests.get(topic_url, headers=headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        articles = soup.find_all('li', class_='row feed__item')
-
-        for article in articles[:10]:  # Limit to top 10 articles
-            title_tag = article.select_one('.feed__title a')
-            title = title_tag.get_text(strip=True) if title_tag else 'No title'
-            link = 'https://www.smartcitiesdive.com' + title_tag['href'] if title_tag else 'No link'
-            image_tag = article.select_one('.feed__image-container img')
-            image_url = image_tag['src'] if image_tag else 'No image'
-            summary_tag = article.select_one('.feed__description')
-            summary = summary_tag.get_text(strip=True) if summary_tag else 'No summary'
-            date_tag = article.select_one('.secondary-label')
-            pub_date = date_tag.get_text(strip=True) if date_tag else 'Unknown'
-
-            news_data.append({
-                'topic': topic,
-                'title': title,
-                'summary': summary,
-                'url': link,
-                'image_url': image_url,
-                'date': pub_date,
-            })
-
-    df = pd.DataFrame(news_data)
-    df.to_csv('smart_cities_news.csv', index=False)
-    print("Scraped and saved news articles to smart_cities_news.csv")
-
-get_smart_cities_news()
+if __name__ == "__main__":
+    get_smart_cities_news()
@@ -0,0 +1,101 @@
+import os
+import re
+from datetime import datetime, timezone
+
+# Placeholders the scrapers write for missing values
+MISSING_VALUES = {"", "no title", "no link", "no summary", "no excerpt", "no image", "no date", "unknown"}
+
+# Fields of the normalized record every scraper emits
+RECORD_FIELDS = ["source", "kind", "competitor", "topic", "title", "url", "date", "excerpt", "image", "tags", "scrapedAt"]
+
+# Scraper SOURCE of each file the standalone scripts write, by file name without extension
+FILE_SOURCES = {
+    "construction_news": "constructiondive",
+    "global_construction_news": "globalconstructionreview",
+    "smart_cities_news": "smartcitiesdive",
+    "aecom_press_releases": "aecom",
+    "arup_news": "arup",
+    "atkinsrealis_press_releases": "atkinsrealis",
+    "jacobs_news_selenium": "jacobs",
+    "smec_projects": "smec",
+}
+
+
+def _clean(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    return None if value.lower() in MISSING_VALUES else value
+
+
+def _split_tags(value):
+    if isinstance(value, (list, tuple)):
+        return [str(tag).strip() for tag in value if str(tag).strip()]
+    return [tag.strip() for tag in (value or "").split(",") if tag.strip()]
+
+
+# Scraper-specific names for fields of the shared record schema
+LEGACY_FIELDS = {"summary": "excerpt", "image_url": "image", "link": "url"}
+
+
+def source_for_file(path):
+    """The scraper SOURCE a scraped file came from; the file name for unknown files."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    return FILE_SOURCES.get(name, name)
+
+
+def normalize_record(record, source, kind="news", competitor=None):
+    """Map a raw scraper row onto the shared record schema.
+
+    Fields outside the schema (e.g. an existing id or description) are kept.
+    """
+    date = _clean(record.get("date"))
+    tags = _split_tags(record.get("tags"))
+    # WSP combines date and category in one label, e.g. "May 5, 2025 | Press Releases"
+    if record.get("date_category"):
+        parts = [part.strip() for part in re.split(r"[|•]", record["date_category"]) if part.strip()]
+        date = parts[0] if parts else None
+        tags += parts[1:]
+    normalized = {
+        key: value for key, value in record.items()
+        if key not in RECORD_FIELDS and key not in LEGACY_FIELDS and key != "date_category"
+    }
+    normalized.update({
+        "source": record.get("source") or source,
+        "kind": record.get("kind") or kind,
+        "competitor": record.get("competitor") or competitor,
+        "topic": _clean(record.get("topic")),
+        "title": _clean(record.get("title")),
+        "url": _clean(record.get("url") or record.get("link")),
+        "date": date,
+        "excerpt": _clean(record.get("excerpt") or record.get("summary")),
+        "image": _clean(record.get("image") or record.get("image_url")),
+        "tags": tags,
+        "scrapedAt": record.get("scrapedAt") or datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    return normalized
+
+
+class Scraper:
+    """Base class for scraper plugins discovered by run_scrapers.py.
+
+    Subclasses set `name` (the source key, also used by the crawl state),
+    `kind` ("news" or "competitor") and implement scrape(), which returns
+    the source's raw records. normalize() maps a raw record onto the shared
+    record schema; override it when a source needs special handling.
+    """
+
+    name = ""
+    kind = "news"
+    # Competitor name as stored on documents, in the form app.extract_competitor_from_url derives
+    competitor = None
+    # Seconds the runner waits for this source before giving up on it
+    timeout = 120
+    # Browser-based scrapers get a pooled Selenium driver passed to scrape()
+    uses_browser = False
+
+    def scrape(self, state=None, driver=None):
+        raise NotImplementedError
+
+    def normalize(self, record):
+        return normalize_record(record, self.name, self.kind, self.competitor)
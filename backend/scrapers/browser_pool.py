@@ -0,0 +1,183 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36"
+
+# Resources the scrapers never look at; blocking them cuts bandwidth and render time
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.css",
+]
+
+# Records the time of the last DOM mutation so waits can detect when a page settles
+MUTATION_OBSERVER_JS = """
+if (!window.__scraperObserver) {
+    window.__lastMutation = performance.now();
+    window.__scraperObserver = new MutationObserver(() => { window.__lastMutation = performance.now(); });
+    window.__scraperObserver.observe(document, {childList: true, subtree: true});
+}
+return performance.now() - window.__lastMutation;
+"""
+
+
+def make_driver():
+    """Start a headless Chrome that skips images, fonts and stylesheets."""
+    options = Options()
+    options.add_argument("--headless=new")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--window-size=1920,1080")
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_argument(f"user-agent={USER_AGENT}")
+    options.add_experimental_option("prefs", {
+        "profile.managed_default_content_settings.images": 2,
+        "profile.managed_default_content_settings.fonts": 2,
+    })
+    # Return from get() once the DOM is ready; the scrapers wait for their own elements
+    options.page_load_strategy = "eager"
+    driver = webdriver.Chrome(options=options)
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URL_PATTERNS})
+    return driver
+
+
+def wait_for_dom_quiet(driver, quiet=0.5, timeout=10):
+    """Wait until the DOM has not changed for `quiet` seconds."""
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+            lambda d: d.execute_script(MUTATION_OBSERVER_JS) >= quiet * 1000
+        )
+    except TimeoutException:
+        pass
+
+
+def scroll_until_stable(driver, css_selector, max_scrolls=20, timeout=10, stop_when=None):
+    """Scroll to the bottom until no more `css_selector` elements get lazy-loaded.
+
+    Instead of sleeping a fixed time after each scroll, waits until the item
+    count grows or the DOM goes quiet, whichever comes first. Scrolling also
+    stops as soon as `stop_when(driver)` is true (e.g. known articles loaded).
+    """
+    count = len(driver.find_elements(By.CSS_SELECTOR, css_selector))
+    for _ in range(max_scrolls):
+        if stop_when is not None and stop_when(driver):
+            break
+        driver.execute_script(MUTATION_OBSERVER_JS)
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=0.1).until(
+                lambda d: len(d.find_elements(By.CSS_SELECTOR, css_selector)) > count
+                or d.execute_script(MUTATION_OBSERVER_JS) >= 750
+            )
+        except TimeoutException:
+            pass
+        new_count = len(driver.find_elements(By.CSS_SELECTOR, css_selector))
+        if new_count == count:
+            break
+        count = new_count
+    return count
+
+
+class BrowserPool:
+    """A small pool of reusable headless Chrome sessions.
+
+    Browsers are started lazily, at most `size` of them, and handed out one
+    scraper at a time; a returned browser is reset to a blank page rather
+    than quit, so later scrapers skip the browser start-up cost.
+    """
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._idle = queue.Queue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._drivers = []
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._started < self.size:
+                self._started += 1
+                try:
+                    driver = make_driver()
+                except Exception:
+                    self._started -= 1
+                    raise
+                self._drivers.append(driver)
+                return driver
+        return self._idle.get()
+
+    def _release(self, driver):
+        try:
+            # Close any extra windows and reset the page for the next scraper
+            for handle in driver.window_handles[1:]:
+                driver.switch_to.window(handle)
+                driver.close()
+            driver.switch_to.window(driver.window_handles[0])
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+        except WebDriverException:
+            # The browser crashed; replace it on the next acquire
+            with self._lock:
+                self._started -= 1
+                self._drivers.remove(driver)
+            return
+        self._idle.put(driver)
+
+    @contextmanager
+    def driver(self):
+        driver = self._acquire()
+        try:
+            yield driver
+        finally:
+            self._release(driver)
+
+    def run(self, jobs):
+        """Run {name: fn(driver)} concurrently on pooled browsers; return {name: result}."""
+        def run_job(name, fn):
+            start_time = time.time()
+            with self.driver() as driver:
+                result = fn(driver)
+            print(f"{name} finished in {time.time() - start_time:.1f}s")
+            return result
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.size) as pool:
+            futures = {name: pool.submit(run_job, name, fn) for name, fn in jobs.items()}
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    print(f"{name} failed: {e}")
+                    results[name] = None
+        return results
+
+    def close(self):
+        with self._lock:
+            for driver in self._drivers:
+                try:
+                    driver.quit()
+                except WebDriverException:
+                    pass
+            self._drivers = []
+            self._started = 0
+            self._idle = queue.Queue()
+
+
+# Shared by the competitor scrapers when they are not given a driver
+default_pool = BrowserPool()
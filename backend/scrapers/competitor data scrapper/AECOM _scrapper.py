@@ -1,54 +1,84 @@
-import requests
+import os
+import sys
 from bs4 import BeautifulSoup
 from fake_useragent import UserAgent
-import pandas as pd
 
-def scrape_aecom_press_releases():
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from fetch_engine import fetch_all
+from crawl_state import CrawlState, append_to_csv
+from base import Scraper
+
+SOURCE = 'aecom'
+
+def parse_press_releases(html):
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Find all press release items on the page
+    press_releases = soup.find_all('div', class_='press-release-item-wrapper')
+
+    # Create a list to store the scraped data
+    news_data = []
+
+    for pr in press_releases:
+        # Extract the date of the press release (it is within the <a> tag in the <p> tag under 'pr-date' class)
+        date_tag = pr.find('div', class_='pr-date').find('a') if pr.find('div', class_='pr-date') else None
+        date = date_tag.get_text(strip=True) if date_tag else 'Unknown'
+
+        # Extract the title and URL of the press release
+        title_tag = pr.find('h3').find('a') if pr.find('h3') else None
+        title = title_tag.get_text(strip=True) if title_tag else 'No title'
+        link = title_tag['href'] if title_tag else 'No link'
+
+        # Extract the excerpt or summary
+        excerpt_tag = pr.find('div', class_='pr-excerpt')
+        excerpt = excerpt_tag.get_text(strip=True) if excerpt_tag else 'No excerpt'
+
+        # Append the data to the news_data list
+        news_data.append({
+            'date': date,
+            'title': title,
+            'url': link,
+            'excerpt': excerpt,
+        })
+    return news_data
+
+def crawl_aecom_press_releases(state, url='https://aecom.com/press-releases/'):
+    """Return the press releases that were not ingested before."""
     ua = UserAgent()
     headers = {'User-Agent': ua.random}
-    url = 'https://aecom.com/press-releases/'
 
-    # Send a GET request to the website
-    response = requests.get(url, headers=headers)
+    # Send a conditional GET request to the website through the shared fetch engine
+    response = fetch_all([url], headers=headers, state=state)[0]
 
     # Check if the request was successful
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Find all press release items on the page
-        press_releases = soup.find_all('div', class_='press-release-item-wrapper')
-
-        # Create a list to store the scraped data
-        news_data = []
-
-        for pr in press_releases:
-            # Extract the date of the press release (it is within the <a> tag in the <p> tag under 'pr-date' class)
-            date_tag = pr.find('div', class_='pr-date').find('a') if pr.find('div', class_='pr-date') else None
-            date = date_tag.get_text(strip=True) if date_tag else 'Unknown'
-
-            # Extract the title and URL of the press release
-            title_tag = pr.find('h3').find('a') if pr.find('h3') else None
-            title = title_tag.get_text(strip=True) if title_tag else 'No title'
-            link = title_tag['href'] if title_tag else 'No link'
-
-            # Extract the excerpt or summary
-            excerpt_tag = pr.find('div', class_='pr-excerpt')
-            excerpt = excerpt_tag.get_text(strip=True) if excerpt_tag else 'No excerpt'
-
-            # Append the data to the news_data list
-            news_data.append({
-                'date': date,
-                'title': title,
-                'url': link,
-                'excerpt': excerpt,
-            })
-
-        # Create a DataFrame and save it to a CSV file
-        df = pd.DataFrame(news_data)
-        df.to_csv('aecom_press_releases.csv', index=False)
-        print("Scraped and saved AECOM press releases to aecom_press_releases.csv")
-    else:
-        print(f"Failed to retrieve the page. Status code: {response.status_code}")
+    if response.not_modified:
+        print("AECOM press releases not modified since the last crawl")
+        return []
+    if response.status != 200:
+        print(f"Failed to retrieve the page. Status code: {response.status} {response.error}")
+        return []
+    # Saved by mark_seen once the page's new press releases are stored
+    state.defer_validators(response.url, response.validators, SOURCE)
+    # Keep only press releases not ingested before; the listing is newest first
+    return state.take_new(parse_press_releases(response.text), SOURCE)
+
+def scrape_aecom_press_releases(url='https://aecom.com/press-releases/'):
+    state = CrawlState()
+    news_data = crawl_aecom_press_releases(state, url)
+
+    # Append the new press releases to the CSV file
+    append_to_csv(news_data, 'aecom_press_releases.csv')
+    state.mark_seen(news_data, SOURCE)
+
+class AecomScraper(Scraper):
+    name = SOURCE
+    kind = 'competitor'
+    competitor = 'Aecom'
+    timeout = 60
+
+    def scrape(self, state=None, driver=None):
+        return crawl_aecom_press_releases(state or CrawlState())
 
 # Run the scraping function
-scrape_aecom_press_releases()
+if __name__ == "__main__":
+    scrape_aecom_press_releases()
@@ -1,19 +1,23 @@
-from selenium import webdriver
+import os
+import sys
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import csv
-import time
 
-def scrape_atkinsrealis_press_releases():
-    options = Options()
-    options.add_argument("--headless")  # comment this out if you want to see the browser
-    options.add_argument("--disable-gpu")
-    options.add_argument("start-maximized")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36")
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawl_state import CrawlState
+from base import Scraper
+from browser_pool import default_pool, scroll_until_stable
+
+SOURCE = 'atkinsrealis'
+
+def scrape_atkinsrealis_press_releases(driver=None, state=None):
+    # Borrow a browser from the shared pool unless the caller provides one
+    if driver is None:
+        with default_pool.driver() as driver:
+            return scrape_atkinsrealis_press_releases(driver, state)
 
-    driver = webdriver.Chrome(options=options)
     wait = WebDriverWait(driver, 15)
 
     url = "https://www.atkinsrealis.com/en/media/press-releases#all/all/all/all/2025"
@@ -23,14 +27,11 @@ def scrape_atkinsrealis_press_releases():
     wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.news-item.js-filter-item")))
 
     # Optionally, scroll down if there is lazy loading or pagination
-    last_height = driver.execute_script("return document.body.scrollHeight")
-    while True:
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)
-        new_height = driver.execute_script("return document.body.scrollHeight")
-        if new_height == last_height:
-            break
-        last_height = new_height
+    # Stop scrolling once the listing reaches articles ingested on a previous crawl
+    stop_when = None
+    if state is not None:
+        stop_when = lambda d: state.reached_known(SOURCE, urls=[e.get_attribute("href") for e in d.find_elements(By.CSS_SELECTOR, "a.local-link")])
+    scroll_until_stable(driver, "div.news-item.js-filter-item", stop_when=stop_when)
 
     news_items = driver.find_elements(By.CSS_SELECTOR, "div.news-item.js-filter-item")
 
@@ -59,17 +60,34 @@ def scrape_atkinsrealis_press_releases():
             print(f"Error processing an item: {e}")
             continue
 
-    driver.quit()
+    if state is not None:
+        # Keep only articles not ingested before; the listing is newest first
+        results = state.take_new(results, SOURCE)
     return results
 
 def save_to_csv(data, filename="atkinsrealis_press_releases.csv"):
     keys = ["title", "link", "date", "tags"]
-    with open(filename, mode='w', newline='', encoding='utf-8') as f:
+    # Append to the CSV, writing the header only for a new file
+    is_new_file = not os.path.exists(filename) or os.path.getsize(filename) == 0
+    with open(filename, mode='a', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=keys)
-        writer.writeheader()
+        if is_new_file:
+            writer.writeheader()
         writer.writerows(data)
     print(f"Saved {len(data)} press releases to {filename}")
 
+class AtkinsRealisScraper(Scraper):
+    name = SOURCE
+    kind = 'competitor'
+    competitor = 'Atkinsrealis'
+    uses_browser = True
+
+    def scrape(self, state=None, driver=None):
+        return scrape_atkinsrealis_press_releases(driver, state)
+
 if __name__ == "__main__":
-    data = scrape_atkinsrealis_press_releases()
+    state = CrawlState()
+    data = scrape_atkinsrealis_press_releases(state=state)
     save_to_csv(data)
+    state.mark_seen(data, SOURCE)
+    default_pool.close()
@@ -1,38 +1,39 @@
-from selenium import webdriver
+import os
+import sys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.chrome.options import Options
-import time
 import csv
 
-def scrape_smec_projects():
-    options = Options()
-    options.add_argument("--headless")  # Run browser in headless mode
-    options.add_argument("--disable-gpu")
-    options.add_argument("start-maximized")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36")
-    
-    driver = webdriver.Chrome(options=options)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawl_state import CrawlState
+from base import Scraper
+from browser_pool import default_pool, scroll_until_stable
+
+SOURCE = 'smec'
+
+def scrape_smec_projects(driver=None, state=None):
+    # Borrow a browser from the shared pool unless the caller provides one
+    if driver is None:
+        with default_pool.driver() as driver:
+            return scrape_smec_projects(driver, state)
+
     wait = WebDriverWait(driver, 15)
-    
+
     url = "https://www.smec.com/news/"
     driver.get(url)
-    
-    # Scroll down gradually to load all projects (if lazy loading)
-    last_height = driver.execute_script("return document.body.scrollHeight")
-    while True:
-        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)  # Wait for loading
-        new_height = driver.execute_script("return document.body.scrollHeight")
-        if new_height == last_height:
-            break
-        last_height = new_height
-    
+
     # Wait until project posts appear
     wait.until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, "div.project-post")))
+
+    # Scroll down gradually to load all projects (if lazy loading)
+    # Stop scrolling once the listing reaches articles ingested on a previous crawl
+    stop_when = None
+    if state is not None:
+        stop_when = lambda d: state.reached_known(SOURCE, urls=[e.get_attribute("href") for e in d.find_elements(By.CSS_SELECTOR, "div.project-post a")])
+    scroll_until_stable(driver, "div.project-post", stop_when=stop_when)
     projects = driver.find_elements(By.CSS_SELECTOR, "div.project-post")
-    
+
     data = []
     for project in projects:
         try:
@@ -50,17 +51,34 @@ def scrape_smec_projects():
             print(f"Error extracting one project: {e}")
             continue
 
-    driver.quit()
+    if state is not None:
+        # Keep only articles not ingested before; the listing is newest first
+        data = state.take_new(data, SOURCE)
     return data
 
 def save_to_csv(data, filename="smec_projects.csv"):
     keys = ["title", "link", "image", "date"]
-    with open(filename, mode='w', newline='', encoding='utf-8') as file:
+    # Append to the CSV, writing the header only for a new file
+    is_new_file = not os.path.exists(filename) or os.path.getsize(filename) == 0
+    with open(filename, mode='a', newline='', encoding='utf-8') as file:
         writer = csv.DictWriter(file, fieldnames=keys)
-        writer.writeheader()
+        if is_new_file:
+            writer.writeheader()
         writer.writerows(data)
     print(f"Data saved to {filename}")
 
+class SmecScraper(Scraper):
+    name = SOURCE
+    kind = 'competitor'
+    competitor = 'Smec'
+    uses_browser = True
+
+    def scrape(self, state=None, driver=None):
+        return scrape_smec_projects(driver, state)
+
 if __name__ == "__main__":
-    projects = scrape_smec_projects()
+    state = CrawlState()
+    projects = scrape_smec_projects(state=state)
     save_to_csv(projects)
+    state.mark_seen(projects, SOURCE)
+    default_pool.close()
@@ -1,91 +1,105 @@
-from selenium import webdriver
+import os
+import sys
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-import time
 
-def scrape_wsp_press_releases():
-    url = "https://www.wsp.com/en-gl/news#f:Categories=[Press%20Releases]"
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from crawl_state import CrawlState
+from base import Scraper
+from browser_pool import default_pool, scroll_until_stable, wait_for_dom_quiet
+
+SOURCE = 'wsp'
 
-    options = webdriver.ChromeOptions()
-    options.add_argument("--start-maximized")
-    options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36")
+def scrape_wsp_press_releases(driver=None, state=None):
+    # Borrow a browser from the shared pool unless the caller provides one
+    if driver is None:
+        with default_pool.driver() as driver:
+            return scrape_wsp_press_releases(driver, state)
+
+    url = "https://www.wsp.com/en-gl/news#f:Categories=[Press%20Releases]"
 
-    driver = webdriver.Chrome(options=options)
     wait = WebDriverWait(driver, 15)
 
+    driver.get(url)
+
+    # Accept cookies popup if it appears
     try:
-        driver.get(url)
+        accept_btn = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button#onetrust-accept-btn-handler")))
+        accept_btn.click()
+        print("Accepted cookies popup.")
+    except Exception:
+        print("No cookies popup.")
+
+    # Wait for the search results to render after the popup closes
+    wait_for_dom_quiet(driver)
+
+    # Wait for results container to load
+    wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.coveo-result-row")))
+
+    # Scroll down stepwise to load more press releases
+    # Stop scrolling once the listing reaches articles ingested on a previous crawl
+    stop_when = None
+    if state is not None:
+        stop_when = lambda d: state.reached_known(SOURCE, urls=[e.get_attribute("href") for e in d.find_elements(By.CSS_SELECTOR, "a.CoveoResultLink")])
+    scroll_until_stable(driver, "div.coveo-result-row", max_scrolls=10, stop_when=stop_when)
+
+    # Find all press release rows
+    rows = driver.find_elements(By.CSS_SELECTOR, "div.coveo-result-row")
+    print(f"Found {len(rows)} articles.")
 
-        # Accept cookies popup if it appears
+    data = []
+
+    for row in rows:
         try:
-            accept_btn = wait.until(EC.element_to_be_clickable((By.CSS_SELECTOR, "button#onetrust-accept-btn-handler")))
-            accept_btn.click()
-            print("Accepted cookies popup.")
-        except Exception:
-            print("No cookies popup.")
-
-        time.sleep(2)
-
-        # Scroll down stepwise to load more press releases (simulate human scrolling)
-        scroll_pause_time = 2
-        last_height = driver.execute_script("return document.body.scrollHeight")
-
-        for _ in range(10):  # Adjust the number of scrolls as needed
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(scroll_pause_time)
-
-            new_height = driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
-                print("Reached bottom of page.")
-                break
-            last_height = new_height
-
-        # Wait for results container to load
-        wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "div.coveo-result-row")))
-
-        # Find all press release rows
-        rows = driver.find_elements(By.CSS_SELECTOR, "div.coveo-result-row")
-        print(f"Found {len(rows)} articles.")
-
-        data = []
-
-        for row in rows:
-            try:
-                link_element = row.find_element(By.CSS_SELECTOR, "a.CoveoResultLink")
-                url = link_element.get_attribute("href")
-
-                right_div = row.find_element(By.CSS_SELECTOR, "div.ml__right")
-
-                # Date and category
-                date_cat = right_div.find_element(By.CSS_SELECTOR, "div.coveo-suptitle").text.strip()
-
-                # Title
-                title = right_div.find_element(By.CSS_SELECTOR, "h2.typo__07").text.strip()
-
-                # Summary
-                summary = right_div.find_element(By.CSS_SELECTOR, "div.typo__09").text.strip()
-
-                data.append({
-                    "title": title,
-                    "date_category": date_cat,
-                    "summary": summary,
-                    "url": url
-                })
-            except Exception as e:
-                print(f"Error parsing row: {e}")
-                continue
-
-        # Print all extracted press releases
-        for i, item in enumerate(data, 1):
-            print(f"\nArticle {i}:")
-            print(f"Title: {item['title']}")
-            print(f"Date & Category: {item['date_category']}")
-            print(f"Summary: {item['summary']}")
-            print(f"URL: {item['url']}")
-
-    finally:
-        driver.quit()
+            link_element = row.find_element(By.CSS_SELECTOR, "a.CoveoResultLink")
+            url = link_element.get_attribute("href")
+
+            right_div = row.find_element(By.CSS_SELECTOR, "div.ml__right")
+
+            # Date and category
+            date_cat = right_div.find_element(By.CSS_SELECTOR, "div.coveo-suptitle").text.strip()
+
+            # Title
+            title = right_div.find_element(By.CSS_SELECTOR, "h2.typo__07").text.strip()
+
+            # Summary
+            summary = right_div.find_element(By.CSS_SELECTOR, "div.typo__09").text.strip()
+
+            data.append({
+                "title": title,
+                "date_category": date_cat,
+                "summary": summary,
+                "url": url
+            })
+        except Exception as e:
+            print(f"Error parsing row: {e}")
+            continue
+
+    if state is not None:
+        # Keep only articles not ingested before; the listing is newest first
+        data = state.take_new(data, SOURCE)
+    return data
+
+class WspScraper(Scraper):
+    name = SOURCE
+    kind = 'competitor'
+    competitor = 'Wsp'
+    uses_browser = True
+
+    def scrape(self, state=None, driver=None):
+        return scrape_wsp_press_releases(driver, state)
 
 if __name__ == "__main__":
-    scrape_wsp_press_releases()
+    state = CrawlState()
+    data = scrape_wsp_press_releases(state=state)
+    state.mark_seen(data, SOURCE)
+    default_pool.close()
+
+    # Print all extracted press releases
+    for i, item in enumerate(data, 1):
+        print(f"\nArticle {i}:")
+        print(f"Title: {item['title']}")
+        print(f"Date & Category: {item['date_category']}")
+        print(f"Summary: {item['summary']}")
+        print(f"URL: {item['url']}")
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import pandas as pd
+
+STATE_PATH = os.getenv(
+    "CRAWL_STATE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".cache", "crawl_state.sqlite3"),
+)
+# Consecutive known articles after which a newest-first listing is assumed fully known;
+# a few are tolerated so pinned or featured posts at the top don't end the crawl early
+STOP_AFTER_KNOWN = 3
+
+TRACKING_PARAMS = re.compile(r"^(utm_.*|fbclid|gclid|mc_cid|mc_eid|ref|source)$", re.IGNORECASE)
+MISSING_URLS = {"", "no link", "none", "n/a"}
+# Placeholders the scrapers write for a missing title or excerpt
+MISSING_TEXT = {"", "no title", "no summary", "no excerpt", "none", "n/a"}
+
+
+def canonical_url(url):
+    """Normalize a URL so the same article always maps to the same key; None if missing."""
+    url = (url or "").strip()
+    if url.lower() in MISSING_URLS:
+        return None
+    # Some scrapers prefix an already absolute link with the site URL
+    nested = re.search(r"(?<=.)https?://", url)
+    if nested:
+        url = url[nested.start():]
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)))
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(("https", host, path, query, ""))
+
+
+def _normalize_text(text):
+    text = re.sub(r"\s+", " ", (text or "").strip().casefold())
+    return "" if text in MISSING_TEXT else text
+
+
+def article_key(source, url=None, title=None, text=None):
+    """Seen-index key: the canonical URL, or source plus normalized title when there is no URL.
+
+    Without either, source plus a hash of the article's text (its excerpt),
+    so untitled, unlinked articles do not all share one key.
+    """
+    key = canonical_url(url)
+    if key:
+        return key
+    title = _normalize_text(title)
+    if title or not text:
+        return f"{source}:{title}"
+    return f"{source}:#" + hashlib.sha1(_normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def record_key(source, record):
+    """article_key of a raw scraper row or a normalized record."""
+    return article_key(source, record.get("url") or record.get("link"), record.get("title"),
+                       record.get("excerpt") or record.get("summary") or record.get("description"))
+
+
+class CrawlState:
+    """Persistent crawl state shared by the scrapers.
+
+    Stores HTTP validators (ETag / Last-Modified) per listing URL for
+    conditional GETs, and an index of every article already ingested.
+    A listing's new validators are held until every article taken from
+    its source has been marked seen: saving them earlier would turn the
+    next crawl into a 304 and lose articles whose write failed.
+    """
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        # Keys returned by take_new during this run, so an article listed
+        # under several topics is only taken once
+        self._taken = set()
+        # Per source: keys taken but not yet marked seen, and validators waiting for them
+        self._unseen = {}
+        self._deferred = {}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS http_validators ("
+            " url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, fetched_at REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_articles ("
+            " key TEXT PRIMARY KEY, source TEXT, first_seen REAL)"
+        )
+        self._conn.commit()
+
+    def conditional_headers(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT etag, last_modified FROM http_validators WHERE url = ?", (url,)
+            ).fetchone()
+        headers = {}
+        if row and row[0]:
+            headers["If-None-Match"] = row[0]
+        if row and row[1]:
+            headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def save_validators(self, url, etag, last_modified):
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO http_validators (url, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?)",
+                (url, etag, last_modified, time.time()),
+            )
+            self._conn.commit()
+
+    def defer_validators(self, url, validators, source):
+        """Hold a listing's (etag, last_modified) until mark_seen has stored all of `source`'s new articles."""
+        with self._lock:
+            self._deferred.setdefault(source, {})[url] = validators
+
+    def seen_keys(self, keys):
+        keys = list(keys)
+        found = set()
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key FROM seen_articles WHERE key IN ({marks})", chunk)
+                found.update(row[0] for row in rows)
+        return found
+
+    def count_seen(self, source, urls=(), titles=()):
+        """Count how many of the given article URLs or titles were ingested before."""
+        keys = [article_key(source, url=url) for url in urls if canonical_url(url)]
+        keys += [article_key(source, title=title) for title in titles]
+        return len(self.seen_keys(set(keys)))
+
+    def reached_known(self, source, urls=(), titles=()):
+        """True once a loaded listing contains enough known articles to stop paging."""
+        return self.count_seen(source, urls, titles) >= STOP_AFTER_KNOWN
+
+    def take_new(self, records, source, stop_after=STOP_AFTER_KNOWN):
+        """Return the records not ingested before, from a newest-first listing.
+
+        Stops once `stop_after` known articles appear in a row, since
+        everything older than that has been ingested already. Articles
+        already taken earlier in this run are skipped without counting.
+        """
+        keys = [record_key(source, record) for record in records]
+        seen = self.seen_keys(keys)
+        new_records = []
+        known_in_a_row = 0
+        for key, record in zip(keys, records):
+            if key in self._taken:
+                continue
+            if key in seen:
+                known_in_a_row += 1
+                if known_in_a_row >= stop_after:
+                    break
+                continue
+            known_in_a_row = 0
+            self._taken.add(key)
+            new_records.append(record)
+        with self._lock:
+            self._unseen.setdefault(source, set()).update(record_key(source, record) for record in new_records)
+        return new_records
+
+    def mark_seen(self, records, source):
+        """Index the stored records; once none of `source`'s new articles is pending, save its validators."""
+        now = time.time()
+        rows = [(record_key(source, record), source, now) for record in records]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen_articles (key, source, first_seen) VALUES (?, ?, ?)", rows
+            )
+            unseen = self._unseen.get(source, set())
+            unseen.difference_update(row[0] for row in rows)
+            deferred = {} if unseen else self._deferred.pop(source, {})
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO http_validators (url, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?)",
+                [(url, etag, last_modified, now) for url, (etag, last_modified) in deferred.items()
+                 if etag or last_modified],
+            )
+            self._conn.commit()
+
+
+def append_to_csv(records, path):
+    """Append records to a CSV, writing the header only when the file is new."""
+    if not records:
+        print(f"No new articles for {path}")
+        return
+    write_header = not os.path.exists(path) or os.path.getsize(path) == 0
+    pd.DataFrame(records).to_csv(path, mode="a", header=write_header, index=False)
+    print(f"Appended {len(records)} new articles to {path}")
@@ -0,0 +1,148 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import aiohttp
+from multidict import CIMultiDict
+
+PER_HOST_CONCURRENCY = 4
+# Minimum seconds between two requests to the same host
+POLITENESS_DELAY = 0.5
+TIMEOUT = 20
+MAX_RETRIES = 3
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Longest Retry-After honoured; a server asking for more gets the normal retries instead
+MAX_RETRY_AFTER = 120
+
+
+def retry_after_seconds(headers):
+    """Seconds a Retry-After header (delay-seconds or HTTP-date, any casing) asks to wait, or None."""
+    value = (headers.get("Retry-After") or "").strip()
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER)
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    text: str = ""
+    # Case-insensitive, as aiohttp returns them: servers and proxies vary the casing
+    headers: CIMultiDict = field(default_factory=CIMultiDict)
+    error: str = ""
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+    @property
+    def validators(self):
+        """(ETag, Last-Modified) of the response, for CrawlState.defer_validators."""
+        return self.headers.get("ETag"), self.headers.get("Last-Modified")
+
+
+class AsyncFetcher:
+    """Shared HTTP fetch layer for the requests-based scrapers.
+
+    One keep-alive connection pool serves every host. Each host gets its own
+    concurrency limit and a minimum delay between request starts, so many
+    hosts are crawled in parallel without hammering any single one. Timeouts,
+    connection errors and 429/5xx responses are retried with backoff.
+    With a CrawlState, requests are conditional (If-None-Match /
+    If-Modified-Since) and unchanged pages come back as 304 with no body.
+    New validators are only kept on the result: the scraper hands them to
+    the state, which saves them once the page's articles are stored.
+    Use as an async context manager.
+    """
+
+    def __init__(self, headers=None, per_host=PER_HOST_CONCURRENCY, delay=POLITENESS_DELAY,
+                 timeout=TIMEOUT, retries=MAX_RETRIES, state=None):
+        self.headers = headers or {}
+        self.state = state
+        self.per_host = per_host
+        self.delay = delay
+        self.timeout = timeout
+        self.retries = retries
+        self._session = None
+        self._semaphores = {}
+        self._next_slot = {}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit_per_host=self.per_host, keepalive_timeout=30, ttl_dns_cache=300)
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+
+    async def _wait_for_turn(self, host):
+        # Reserve the host's next start slot before sleeping so concurrent
+        # requests to the same host are spaced out rather than bunched up
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, now))
+        self._next_slot[host] = slot + self.delay
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def fetch(self, url, headers=None):
+        host = urlsplit(url).netloc
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.per_host))
+        start_time = time.monotonic()
+        result = FetchResult(url)
+        if self.state is not None:
+            headers = {**self.state.conditional_headers(url), **(headers or {})}
+        for attempt in range(self.retries + 1):
+            async with semaphore:
+                await self._wait_for_turn(host)
+                try:
+                    async with self._session.get(url, headers=headers) as response:
+                        result.status = response.status
+                        result.headers = CIMultiDict(response.headers)
+                        result.text = await response.text(errors="replace")
+                        result.error = ""
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    result.status = 0
+                    # Drop the previous attempt's headers, so its Retry-After is not applied again
+                    result.headers = CIMultiDict()
+                    result.error = f"{type(e).__name__}: {e}"
+            if result.status not in RETRYABLE_STATUS and not result.error:
+                break
+            if attempt < self.retries:
+                delay = retry_after_seconds(result.headers)
+                if delay is None:
+                    delay = 2 ** attempt * (0.5 + random.random())
+                print(f"Retrying {url} in {delay:.1f}s ({result.error or result.status})")
+                await asyncio.sleep(delay)
+        result.elapsed = time.monotonic() - start_time
+        return result
+
+    async def fetch_all(self, urls):
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
+
+
+def fetch_all(urls, headers=None, **options):
+    """Fetch every URL concurrently and return FetchResults in the same order."""
+    async def run():
+        async with AsyncFetcher(headers=headers, **options) as fetcher:
+            return await fetcher.fetch_all(urls)
+    return asyncio.run(run())
@@ -0,0 +1,364 @@
+"""In-process full-text search over the news container.
+
+An inverted index over title, excerpt, description and tags, ranked with
+BM25. Queries are ANDed terms; a trailing `*` makes a term a prefix query
+(`infra*`). Results can be filtered on, and come with counts for, the
+competitor, sector and region facets.
+
+Writers keep the index current through write_hooks: each process applies
+the documents it wrote and saves the index to disk at most every
+SAVE_INTERVAL seconds (and at exit), merging with what other processes
+saved under a lock file. Readers reload it when the file changes, so the API sees documents written by the backfill or the ingestion
+pipeline, and restarts load the index instead of rescanning Cosmos.
+"""
+import atexit
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from operator import itemgetter
+
+from dates import document_epoch
+from logs import get_logger
+from metrics import timed
+from response_cache import CACHE_DIR, file_lock
+import write_hooks
+
+log = get_logger("search_index")
+
+INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(CACHE_DIR, "search_index.pickle"))
+# Seconds between saves of an index changed by writes
+SAVE_INTERVAL = float(os.getenv("SEARCH_INDEX_SAVE_INTERVAL", "5"))
+FORMAT_VERSION = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+# Title terms are counted this many times, so title matches outrank body matches
+TITLE_WEIGHT = 3
+FACETS = ("competitor", "sector", "region")
+# Fields returned with each hit
+STORED_FIELDS = ("title", "url", "date", "dateEpoch", "competitor", "sector", "region", "impact", "excerpt")
+# Most index terms a single prefix query expands to
+MAX_PREFIX_TERMS = 50
+FACET_SIZE = 20
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were will with".split()
+)
+
+
+def tokenize(text):
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return [token for token in re.findall(r"\w+", text) if token not in STOPWORDS]
+
+
+def document_terms(document):
+    terms = Counter()
+    for _ in range(TITLE_WEIGHT):
+        terms.update(tokenize(document.get("title")))
+    terms.update(tokenize(document.get("excerpt")))
+    terms.update(tokenize(document.get("description")))
+    tags = document.get("tags") or []
+    terms.update(tokenize(" ".join(tags) if isinstance(tags, list) else str(tags)))
+    return terms
+
+
+def parse_query(query):
+    """Split a query into (term, is_prefix) pairs."""
+    parsed = []
+    for word in (query or "").split():
+        tokens = tokenize(word.rstrip("*"))
+        if not tokens:
+            continue
+        parsed.extend((token, False) for token in tokens[:-1])
+        parsed.append((tokens[-1], word.endswith("*")))
+    return parsed
+
+
+class SearchIndex:
+    """BM25 inverted index of the news documents. Safe to share between threads."""
+
+    def __init__(self, path=INDEX_PATH):
+        self.path = path
+        # Held across processes from reading the saved index to replacing it, so saves don't drop each other's writes
+        self.lock_path = f"{path}.lock"
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._mtime = None
+        # Documents written by this process since the last save
+        self._pending = {}
+        self._last_save = 0.0
+        self._reset()
+
+    def _reset(self):
+        self.docs = {}
+        self.doc_terms = {}
+        self.lengths = {}
+        self.total_length = 0
+        self.postings = defaultdict(dict)
+        # Sorted vocabulary for prefix lookups, rebuilt when terms are added or removed
+        self._vocabulary = None
+        # BM25 length normalization per document, rebuilt after any change
+        self._norms = None
+        # {field: {value: ids}} for facet counts and filters; derived from docs, so not saved
+        self.facet_ids = {field: defaultdict(set) for field in FACETS}
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self):
+        mtime = self._file_mtime()
+        self._reset()
+        if mtime is not None:
+            try:
+                with open(self.path, "rb") as f:
+                    state = pickle.load(f)
+                if state.get("version") == FORMAT_VERSION:
+                    self.docs = state["docs"]
+                    self.doc_terms = state["doc_terms"]
+                    self.lengths = state["lengths"]
+                    self.total_length = state["total_length"]
+                    self.postings = state["postings"]
+            except (OSError, EOFError, KeyError, pickle.UnpicklingError) as e:
+                log.warn("search_index_load_failed", path=self.path, error=e)
+                self._reset()
+        for doc_id, stored in self.docs.items():
+            for field in FACETS:
+                if stored.get(field):
+                    self.facet_ids[field][stored[field]].add(doc_id)
+        self._mtime = mtime
+        self._loaded = True
+        # Writes not saved yet are applied on top of what another process saved
+        for document in self._pending.values():
+            self._add(document)
+
+    def _refresh(self):
+        """Load on first use, and reload after another process saved the index."""
+        if not self._loaded or self._file_mtime() != self._mtime:
+            self._load()
+
+    def _remove(self, doc_id):
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+                    self._vocabulary = None
+        self.total_length -= self.lengths.pop(doc_id, 0)
+        stored = self.docs.pop(doc_id, {})
+        for field in FACETS:
+            ids = self.facet_ids[field].get(stored.get(field))
+            if ids is not None:
+                ids.discard(doc_id)
+                if not ids:
+                    del self.facet_ids[field][stored[field]]
+        self._norms = None
+
+    def _add(self, document):
+        doc_id = document["id"]
+        self._remove(doc_id)
+        terms = document_terms(document)
+        self.docs[doc_id] = {field: document.get(field) for field in STORED_FIELDS}
+        self.doc_terms[doc_id] = terms
+        self.lengths[doc_id] = sum(terms.values())
+        self.total_length += self.lengths[doc_id]
+        for term, frequency in terms.items():
+            if term not in self.postings:
+                self._vocabulary = None
+            self.postings[term][doc_id] = frequency
+        for field in FACETS:
+            if document.get(field):
+                self.facet_ids[field][document[field]].add(doc_id)
+        self._norms = None
+
+    def update(self, documents):
+        """Add or replace documents; registered as a write hook."""
+        with self._lock:
+            self._refresh()
+            for document in documents:
+                if not document.get("id"):
+                    continue
+                kept = {field: document.get(field) for field in ("id", "description", "tags", *STORED_FIELDS)}
+                self._add(kept)
+                self._pending[kept["id"]] = kept
+            if time.time() - self._last_save >= SAVE_INTERVAL:
+                self.save()
+
+    def rebuild(self, documents):
+        """Replace the whole index with `documents` and save it."""
+        with self._lock:
+            self._reset()
+            self._pending = {}
+            for document in documents:
+                if document.get("id"):
+                    self._add(document)
+            self._loaded = True
+            with file_lock(self.lock_path):
+                self._write()
+            return len(self.docs)
+
+    def ensure_built(self, load_documents):
+        """Build the index from `load_documents()` if none was ever saved."""
+        with self._lock:
+            self._refresh()
+            if self._mtime is None and not self.docs:
+                count = self.rebuild(load_documents())
+                log.info("search_index_built", documents=count)
+
+    def save(self):
+        with self._lock:
+            if not self._pending:
+                return
+            with file_lock(self.lock_path):
+                if self._file_mtime() != self._mtime:
+                    # Another process saved in the meantime; merge our writes into its index
+                    self._load()
+                self._write()
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        state = {
+            "version": FORMAT_VERSION,
+            "docs": self.docs,
+            "doc_terms": self.doc_terms,
+            "lengths": self.lengths,
+            "total_length": self.total_length,
+            "postings": self.postings,
+        }
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, self.path)
+        self._mtime = self._file_mtime()
+        self._pending = {}
+        self._last_save = time.time()
+
+    def _expand(self, term, is_prefix):
+        if not is_prefix:
+            return [term] if term in self.postings else []
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        matches = []
+        for candidate in self._vocabulary[bisect_left(self._vocabulary, term):]:
+            if not candidate.startswith(term) or len(matches) >= MAX_PREFIX_TERMS:
+                break
+            matches.append(candidate)
+        return matches
+
+    def _length_norms(self):
+        if self._norms is None:
+            average_length = self.total_length / len(self.docs) if self.docs else 1.0
+            self._norms = {
+                doc_id: K1 * (1 - B + B * length / average_length) for doc_id, length in self.lengths.items()
+            }
+        return self._norms
+
+    def _score(self, terms, candidates=None):
+        """BM25 scores of the documents containing any of `terms` (best term per document).
+
+        With `candidates`, only those documents are scored, which keeps
+        common terms cheap once a rarer term has narrowed the results.
+        """
+        count = len(self.docs)
+        norms = self._length_norms()
+        boost = K1 + 1
+        scores = {}
+        for term in terms:
+            posting = self.postings.get(term, {})
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            if candidates is not None and len(candidates) < len(posting):
+                matches = {doc_id: posting[doc_id] for doc_id in candidates if doc_id in posting}
+            else:
+                matches = posting
+            term_scores = {
+                doc_id: idf * frequency * boost / (frequency + norms[doc_id])
+                for doc_id, frequency in matches.items()
+            }
+            if not scores:
+                scores = term_scores
+                continue
+            for doc_id, score in term_scores.items():
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+        return scores
+
+    def search(self, query="", filters=None, limit=20, offset=0):
+        start_time = time.perf_counter()
+        filters = {field: value.casefold() for field, value in (filters or {}).items() if value}
+        with self._lock:
+            self._refresh()
+            parsed = parse_query(query)
+            if parsed:
+                # Every query term must match: score the rarest term, then only its matches
+                groups = [self._expand(term, is_prefix) for term, is_prefix in parsed]
+                groups.sort(key=lambda terms: sum(len(self.postings[term]) for term in terms))
+                scores = self._score(groups[0])
+                for terms in groups[1:]:
+                    if not scores:
+                        break
+                    group = self._score(terms, scores)
+                    scores = {doc_id: score + group[doc_id] for doc_id, score in scores.items() if doc_id in group}
+            else:
+                scores = dict.fromkeys(self.docs, 0.0)
+            for field, value in filters.items():
+                allowed = set().union(*(
+                    ids for facet_value, ids in self.facet_ids[field].items() if facet_value.casefold() == value
+                ))
+                scores = {doc_id: scores[doc_id] for doc_id in allowed if doc_id in scores}
+
+            # Counted with set intersections, which stay fast for large result sets
+            matched = set(scores)
+            facets = {
+                field: Counter({value: len(ids & matched) for value, ids in self.facet_ids[field].items()})
+                for field in FACETS
+            }
+
+            with timed("sort"):
+                if parsed:
+                    top = heapq.nlargest(offset + limit, scores.items(), key=itemgetter(1))
+                else:
+                    # Without a query everything matches equally; show the newest first
+                    top = heapq.nlargest(
+                        offset + limit, scores.items(), key=lambda hit: document_epoch(self.docs[hit[0]]) or 0
+                    )
+            items = [{"id": doc_id, "score": round(score, 4), **self.docs[doc_id]} for doc_id, score in top[offset:]]
+        return {
+            "query": query,
+            "total": len(scores),
+            "items": items,
+            "facets": {
+                field: {value: count for value, count in counts.most_common(FACET_SIZE) if count}
+                for field, counts in facets.items()
+            },
+            "tookMs": round((time.perf_counter() - start_time) * 1000, 3),
+        }
+
+    def documents(self, ids):
+        """Return {id: stored fields} for the given ids that are in the index."""
+        with self._lock:
+            self._refresh()
+            return {doc_id: dict(self.docs[doc_id]) for doc_id in ids if doc_id in self.docs}
+
+    def stats(self):
+        with self._lock:
+            self._refresh()
+            return {"documents": len(self.docs), "terms": len(self.postings), "pendingWrites": len(self._pending)}
+
+
+search_index = SearchIndex()
+write_hooks.register(search_index.update)
+# Flush writes made since the last periodic save
+atexit.register(search_index.save)
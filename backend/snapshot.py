@@ -0,0 +1,340 @@
+"""Local columnar snapshot of the news feed, served instead of querying Cosmos.
+
+The snapshot is a directory of .npy files opened with mmap, so a cold
+start maps the files instead of downloading the container, and every API
+worker process on the host shares the same pages through the page cache.
+Rows are stored newest first (the feed's order), which makes an unfiltered
+page a contiguous slice:
+
+- heap: every row's JSON, each followed by ", ", concatenated, with
+  offsets (N + 1) into it. A page's JSON array is one slice of the heap.
+- epochs: the dateEpoch of every row, so a from/to range is a binary
+  search and again a contiguous run of rows.
+- per filter field (competitor, region, sector, impact): the field's
+  distinct values, a code per row and the rows of each value in row order.
+  Filters intersect those sorted row lists.
+
+Writers record the time of the first write since the last build began
+(response_cache.PENDING_PATH). The snapshot is stale once that write is
+older than MAX_LAG seconds and not in it, even while newer writes keep
+arriving, or when it is older than MAX_AGE (catching writes that bypass
+the writers); stale
+snapshots are not served and refresh() builds a new one from the
+container. Every refresh writes a new version directory and then switches
+CURRENT to it, so readers always see a consistent set of files.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+
+import numpy as np
+
+from logs import get_logger
+from metrics import timed
+from response_cache import CACHE_DIR, PENDING_PATH
+
+log = get_logger("snapshot")
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_PATH", os.path.join(CACHE_DIR, "snapshot"))
+# Seconds a write may be missing from the snapshot before it is considered stale
+MAX_LAG = float(os.getenv("SNAPSHOT_MAX_LAG", "30"))
+# Seconds after which the snapshot is rebuilt even without a recorded write
+MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "3600"))
+# A refresh lock older than this is assumed to belong to a crashed process
+REFRESH_TIMEOUT = 600
+FILTER_FIELDS = ("competitor", "region", "sector", "impact")
+SEPARATOR = b", "
+CONTINUATION_PREFIX = "snapshot:"
+
+
+def _epoch(row):
+    value = row.get("dateEpoch")
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def is_snapshot_continuation(token):
+    return bool(token) and token.startswith(CONTINUATION_PREFIX)
+
+
+def continuation_offset(token):
+    """Row offset encoded in a snapshot continuation ("snapshot:<version>:<offset>")."""
+    if not is_snapshot_continuation(token):
+        return 0
+    try:
+        return max(0, int(token.rsplit(":", 1)[1]))
+    except ValueError:
+        return 0
+
+
+def _join_rows(heap, offsets, rows, separator):
+    """The JSON of the given rows joined with `separator`, sliced straight from the heap."""
+    if isinstance(rows, range) and separator == SEPARATOR:
+        # Consecutive rows are already joined in the heap
+        return heap[offsets[rows.start]:offsets[rows.stop] - len(SEPARATOR)].tobytes() if len(rows) else b""
+    return separator.join(heap[offsets[row]:offsets[row + 1] - len(SEPARATOR)].tobytes() for row in rows)
+
+
+class NewsSnapshot:
+    """Memory-mapped, date-ordered copy of the news feed. Safe to share between threads."""
+
+    def __init__(self, path=SNAPSHOT_DIR, pending_path=PENDING_PATH):
+        self.path = path
+        self.pending_path = pending_path
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._refreshing = False
+        self.served = 0
+        self.fallbacks = 0
+        self.refreshes = 0
+        self._reset()
+
+    def _reset(self):
+        self.heap = np.zeros(0, dtype=np.uint8)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.epochs = np.zeros(0, dtype=np.int64)
+        # Rows with a date come first; the remaining rows never match a from/to filter
+        self.dated = 0
+        self.built_at = 0
+        self.values = {field: {} for field in FILTER_FIELDS}
+        self.value_rows = {}
+        self.value_starts = {}
+
+    def _current(self):
+        try:
+            with open(os.path.join(self.path, "CURRENT")) as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def _load(self, version):
+        self._reset()
+        if version is not None:
+            directory = os.path.join(self.path, version)
+            try:
+                def load(name):
+                    return np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+                    meta = json.load(f)
+                self.heap, self.offsets, self.epochs = load("heap"), load("offsets"), load("epochs")
+                for field in FILTER_FIELDS:
+                    self.values[field] = {value: code for code, value in enumerate(meta["values"][field])}
+                    self.value_rows[field] = load(f"{field}_rows")
+                    self.value_starts[field] = load(f"{field}_starts")
+                self.dated = meta["dated"]
+                self.built_at = meta["builtAt"]
+            except (OSError, ValueError, KeyError) as e:
+                log.warn("snapshot_load_failed", path=directory, error=e)
+                self._reset()
+                version = None
+        self._version = version
+        self._loaded = True
+
+    def _refresh_view(self):
+        """Map on first use, and remap after another process built a new snapshot."""
+        version = self._current()
+        if not self._loaded or version != self._version:
+            self._load(version)
+
+    def _oldest_pending_write(self):
+        """Time of the oldest write since the last build began, or None if there was none."""
+        try:
+            return os.stat(self.pending_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def is_fresh(self):
+        """True if the snapshot exists and is not missing writes older than MAX_LAG."""
+        with self._lock:
+            self._refresh_view()
+            if self._version is None:
+                return False
+            now = time.time_ns()
+            if now - self.built_at > MAX_AGE * 1e9:
+                return False
+            pending = self._oldest_pending_write()
+            return pending is None or pending <= self.built_at or now - pending <= MAX_LAG * 1e9
+
+    def refresh(self, documents, fields):
+        """Build a new snapshot from `documents`, keeping only `fields`; return the row count.
+
+        `documents` must be read after this call starts: writes recorded
+        before it are taken as included.
+        """
+        try:
+            # A write from here on records itself again and is checked against built_at
+            os.remove(self.pending_path)
+        except FileNotFoundError:
+            pass
+        built_at = time.time_ns()
+        rows = {}
+        for document in documents:
+            # The last copy of a repeated id wins, as it would in the container
+            rows[document.get("id")] = {field: document[field] for field in fields if field in document}
+        # Newest first, as ORDER BY c.dateEpoch DESC; undated rows last
+        ordered = sorted(rows.values(), key=lambda row: (_epoch(row) is not None, _epoch(row) or 0), reverse=True)
+        encoded = [json.dumps(row).encode("utf-8") + SEPARATOR for row in ordered]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(row) for row in encoded], out=offsets[1:])
+        arrays = {
+            "heap": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            "offsets": offsets,
+            "epochs": np.array([_epoch(row) or 0 for row in ordered], dtype=np.int64),
+        }
+        meta = {
+            "builtAt": built_at,
+            "dated": sum(_epoch(row) is not None for row in ordered),
+            "values": {},
+        }
+        for field in FILTER_FIELDS:
+            distinct = sorted({row[field] for row in ordered if isinstance(row.get(field), str)})
+            codes = {value: code for code, value in enumerate(distinct)}
+            row_codes = np.array(
+                [codes.get(row.get(field), -1) if isinstance(row.get(field), str) else -1 for row in ordered],
+                dtype=np.int32,
+            )
+            # Rows grouped by value, each group in row (date) order
+            value_rows = np.argsort(row_codes, kind="stable").astype(np.int32)
+            arrays[f"{field}_rows"] = value_rows
+            arrays[f"{field}_starts"] = np.searchsorted(row_codes[value_rows], np.arange(len(distinct) + 1))
+            meta["values"][field] = distinct
+        with self._lock:
+            self._write(arrays, meta)
+            self.refreshes += 1
+        return len(ordered)
+
+    def _write(self, arrays, meta):
+        version = f"v{time.time_ns()}-{os.getpid()}"
+        directory = os.path.join(self.path, version)
+        os.makedirs(directory)
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, f"{name}.npy"), array)
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        temporary = os.path.join(self.path, f"CURRENT.{os.getpid()}.tmp")
+        with open(temporary, "w") as f:
+            f.write(version)
+        previous = self._current()
+        os.replace(temporary, os.path.join(self.path, "CURRENT"))
+        if previous and previous != version:
+            # Open maps of the old files stay valid after they are removed
+            shutil.rmtree(os.path.join(self.path, previous), ignore_errors=True)
+        self._load(version)
+
+    def stale_read(self, load_documents, fields):
+        """Record a read that went to Cosmos and start a refresh, unless one is already running."""
+        with self._lock:
+            self.fallbacks += 1
+            if self._refreshing:
+                return False
+            os.makedirs(self.path, exist_ok=True)
+            lock_path = os.path.join(self.path, "REFRESH.lock")
+            try:
+                if time.time() - os.stat(lock_path).st_mtime > REFRESH_TIMEOUT:
+                    os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                return False
+            self._refreshing = True
+
+        def run():
+            try:
+                count = self.refresh(load_documents(), fields)
+                log.info("snapshot_refreshed", documents=count)
+            except Exception as e:
+                log.error("snapshot_refresh_failed", error=e)
+            finally:
+                with self._lock:
+                    self._refreshing = False
+                try:
+                    os.remove(lock_path)
+                except FileNotFoundError:
+                    pass
+
+        threading.Thread(target=run, name="snapshot-refresh", daemon=True).start()
+        return True
+
+    def _matching_rows(self, filters):
+        """Return the matching rows in feed order: a range when unfiltered, else an array."""
+        first, last = 0, len(self.offsets) - 1
+        date_from, date_to = filters.get("from"), filters.get("to")
+        if date_from is not None or date_to is not None:
+            # epochs are descending; search the ascending reversed view
+            ascending = self.epochs[:self.dated][::-1]
+            if date_to is not None:
+                first = self.dated - int(np.searchsorted(ascending, date_to, side="right"))
+            last = self.dated
+            if date_from is not None:
+                last -= int(np.searchsorted(ascending, date_from, side="left"))
+        rows = None
+        for field in FILTER_FIELDS:
+            value = filters.get(field)
+            if not value:
+                continue
+            code = self.values[field].get(value)
+            if code is None:
+                return np.zeros(0, dtype=np.int32)
+            starts = self.value_starts[field]
+            matches = self.value_rows[field][starts[code]:starts[code + 1]]
+            rows = matches if rows is None else np.intersect1d(rows, matches, assume_unique=True)
+        if rows is None:
+            return range(first, max(first, last))
+        # Value rows are in feed order, so the date range is a slice of them too
+        return rows[np.searchsorted(rows, first):np.searchsorted(rows, last)]
+
+    def page(self, filters, limit, continuation=None):
+        """Return (snapshot version, JSON array bytes, next continuation) for one page of the feed.
+
+        Continuations are row offsets, so paging across a refresh may skip
+        or repeat the rows written in between, as paging by offset does.
+        """
+        with self._lock:
+            self._refresh_view()
+            with timed("sort"):
+                rows = self._matching_rows(filters)
+            offset = continuation_offset(continuation)
+            selected = rows[offset:offset + limit]
+            following = offset + limit
+            token = f"{CONTINUATION_PREFIX}{self._version}:{following}" if following < len(rows) else None
+            self.served += 1
+            with timed("serialize"):
+                body = b"[" + _join_rows(self.heap, self.offsets, selected, SEPARATOR) + b"]"
+            return self._version, body, token
+
+    def stream(self, filters, separator, page_size, continuation=None):
+        """Yield the matching rows as JSON joined with `separator`, page_size rows per chunk."""
+        with self._lock:
+            self._refresh_view()
+            rows = self._matching_rows(filters)
+            heap, offsets = self.heap, self.offsets
+            self.served += 1
+        offset = continuation_offset(continuation)
+        for start in range(offset, len(rows), page_size):
+            yield _join_rows(heap, offsets, rows[start:start + page_size], separator)
+
+    def version(self):
+        with self._lock:
+            self._refresh_view()
+            return self._version
+
+    def stats(self):
+        with self._lock:
+            self._refresh_view()
+            return {
+                "version": self._version,
+                "documents": len(self.offsets) - 1,
+                "bytes": int(self.heap.nbytes),
+                "ageSeconds": round((time.time_ns() - self.built_at) / 1e9, 1) if self._version else None,
+                "fresh": self.is_fresh(),
+                "served": self.served,
+                "fallbacks": self.fallbacks,
+                "refreshes": self.refreshes,
+            }
+
+
+news_snapshot = NewsSnapshot()
@@ -0,0 +1,268 @@
+"""Keyword tagging and sector/region classification against the AEC taxonomy.
+
+taxonomy.json maps labels to phrases: sectors, themes (written to `tags`),
+a region gazetteer and competitor aliases. All phrases are compiled into
+one Aho-Corasick automaton over words, so a document's title, excerpt,
+summary and tags are labelled in a single pass, whatever the size of the
+taxonomy. The most frequently matched label wins; title matches count
+double, and a phrase inside a longer phrase of the same kind ("wales" in
+"new south wales") is ignored. The C implementation from the optional pyahocorasick
+package is used when it is installed; the pure-Python automaton finds the
+same matches.
+
+Only fields still holding a placeholder are filled, so labels set by a
+scraper, an editor or an earlier run are never overwritten. tag_documents()
+asks the LLM about the documents the taxonomy leaves unresolved, and only
+about those.
+"""
+import json
+import os
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import deque, namedtuple
+from itertools import accumulate
+
+# pyahocorasick is optional; without it the pure-Python automaton is used
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+from logs import get_logger
+
+log = get_logger("tagger")
+
+TAXONOMY_PATH = os.getenv(
+    "TAXONOMY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "taxonomy.json")
+)
+# Fields matched against the taxonomy; the title counts TITLE_WEIGHT times
+TEXT_FIELDS = ("excerpt", "summary")
+TITLE_WEIGHT = 2
+# Put between fields so no phrase matches across them; \w+ never produces it
+SEPARATOR = "|"
+# Values normalize_item and the scrapers use for "not known"
+PLACEHOLDERS = {"", "n/a", "na", "none", "unknown", "unknown competitor"}
+# Labels the LLM may answer with when nothing more specific applies
+FALLBACK_SECTOR = "Multiple"
+FALLBACK_REGION = "Global"
+
+Labels = namedtuple("Labels", "sector region competitor tags")
+
+
+def tokenize(text):
+    """Lower-case words with accents removed ("AtkinsRéalis" -> ["atkinsrealis"])."""
+    text = (text or "").casefold()
+    if not text.isascii():
+        text = re.sub(r"[\u0300-\u036f]", "", unicodedata.normalize("NFKD", text))
+    return re.findall(r"\w+", text)
+
+
+def is_placeholder(value):
+    return value is None or (isinstance(value, str) and value.strip().lower() in PLACEHOLDERS)
+
+
+class _TokenAutomaton:
+    """Aho-Corasick automaton whose alphabet is words rather than characters."""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        for pattern_id, tokens in enumerate(patterns):
+            state = 0
+            for token in tokens:
+                following = self.goto[state].get(token)
+                if following is None:
+                    following = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][token] = following
+                state = following
+            self.out[state].append((pattern_id, len(tokens)))
+        # Breadth-first, so every state's failure link is final before its children need it
+        pending = deque(self.goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for token, following in self.goto[state].items():
+                pending.append(following)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[following] = self.goto[fallback].get(token, 0)
+                self.out[following] = self.out[following] + self.out[self.fail[following]]
+
+    def find(self, tokens):
+        """Return (start, end, pattern id) for every occurrence of every pattern."""
+        goto, fail, out = self.goto, self.fail, self.out
+        matches = []
+        state = 0
+        for position, token in enumerate(tokens):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            for pattern_id, length in out[state]:
+                matches.append((position + 1 - length, position + 1, pattern_id))
+        return matches
+
+
+class _CAutomaton:
+    """The same automaton built with pyahocorasick over space-separated words."""
+
+    def __init__(self, patterns):
+        self.automaton = ahocorasick.Automaton()
+        for pattern_id, tokens in enumerate(patterns):
+            self.automaton.add_word(f" {' '.join(tokens)} ", (pattern_id, len(tokens)))
+        self.automaton.make_automaton()
+
+    def find(self, tokens):
+        # offsets[i] is the position of the space before word i, and after word i - 1
+        offsets = list(accumulate((len(token) + 1 for token in tokens), initial=0))
+        matches = []
+        for position, (pattern_id, length) in self.automaton.iter(f" {' '.join(tokens)} "):
+            end = bisect_left(offsets, position)
+            matches.append((end - length, end, pattern_id))
+        return matches
+
+
+class Tagger:
+    """Labels documents with the sectors, themes, regions and competitors of a taxonomy."""
+
+    def __init__(self, taxonomy):
+        self.version = taxonomy.get("version", 1)
+        self.sectors = list(taxonomy.get("sectors", {}))
+        self.themes = list(taxonomy.get("themes", {}))
+        self.regions = list(taxonomy.get("regions", {}))
+        self.competitors = list(taxonomy.get("competitors", {}))
+        self._own_tags = {label.casefold() for label in self.themes + self.competitors}
+        self._order = {}
+        phrases = {}
+        for category in ("sectors", "themes", "regions", "competitors"):
+            for rank, (label, aliases) in enumerate(taxonomy.get(category, {}).items()):
+                self._order[category, label] = rank
+                for alias in [label, *aliases]:
+                    tokens = tuple(tokenize(alias))
+                    if tokens:
+                        phrases.setdefault(tokens, set()).add((category, label))
+        patterns = list(phrases)
+        self._labels = [sorted(phrases[tokens]) for tokens in patterns]
+        self._categories = [{category for category, _ in labels} for labels in self._labels]
+        self._matcher = (_CAutomaton if ahocorasick is not None else _TokenAutomaton)(patterns)
+        self.tagged = 0
+        self.unresolved = 0
+
+    @classmethod
+    def from_file(cls, path=TAXONOMY_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _tokens(self, document):
+        """Words of the title, then of the other fields and source tags; return (words, title length)."""
+        tokens = tokenize(document.get("title"))
+        title_length = len(tokens)
+        for field in TEXT_FIELDS:
+            if isinstance(document.get(field), str):
+                tokens.append(SEPARATOR)
+                tokens.extend(tokenize(document[field]))
+        tags = document.get("tags") or []
+        for tag in tags if isinstance(tags, list) else [tags]:
+            # Tags this tagger added are not evidence; re-tagging must not change the labels
+            if str(tag).casefold() not in self._own_tags:
+                tokens.append(SEPARATOR)
+                tokens.extend(tokenize(str(tag)))
+        return tokens, title_length
+
+    def _best(self, category, scores):
+        candidates = [(score, -self._order[key], key[1]) for key, score in scores.items() if key[0] == category]
+        return max(candidates)[2] if candidates else None
+
+    def labels(self, document):
+        """Return the Labels the taxonomy assigns to a document, without changing it."""
+        tokens, title_length = self._tokens(document)
+        matches = self._matcher.find(tokens) if tokens else []
+        scores = {}
+        for start, end, pattern_id in matches:
+            weight = TITLE_WEIGHT if start < title_length else 1
+            for key in self._labels[pattern_id]:
+                if len(matches) > 1 and any(
+                    other_start <= start and end <= other_end and other_end - other_start > end - start
+                    and key[0] in self._categories[other_id]
+                    for other_start, other_end, other_id in matches
+                ):
+                    continue
+                scores[key] = scores.get(key, 0) + weight
+        return Labels(
+            sector=self._best("sectors", scores),
+            region=self._best("regions", scores),
+            competitor=self._best("competitors", scores),
+            tags=[
+                label for category in ("themes", "competitors")
+                for label in getattr(self, category) if (category, label) in scores
+            ],
+        )
+
+    def apply(self, document):
+        """Fill the document's placeholder labels in place; return True if sector and region are known."""
+        labels = self.labels(document)
+        if labels.sector and is_placeholder(document.get("sector")):
+            document["sector"] = labels.sector
+        if labels.region and is_placeholder(document.get("region")):
+            document["region"] = labels.region
+        if labels.competitor and is_placeholder(document.get("competitor")):
+            document["competitor"] = labels.competitor
+        tags = document.get("tags") or []
+        if not isinstance(tags, list):
+            tags = [tags]
+        known = {str(tag).casefold() for tag in tags}
+        document["tags"] = tags + [tag for tag in labels.tags if tag.casefold() not in known]
+        self.tagged += 1
+        resolved = not is_placeholder(document.get("sector")) and not is_placeholder(document.get("region"))
+        self.unresolved += not resolved
+        return resolved
+
+    def tag_batch(self, documents):
+        """Apply the taxonomy to every document; return the ones it could not resolve."""
+        return [document for document in documents if not self.apply(document)]
+
+    def stats(self):
+        return {
+            "version": self.version,
+            "engine": "pyahocorasick" if ahocorasick is not None else "python",
+            "tagged": self.tagged,
+            "unresolved": self.unresolved,
+        }
+
+
+def tag_documents(documents, enricher=None, tagger=None):
+    """Tag documents in place and ask the LLM about those the taxonomy leaves unresolved.
+
+    `enricher` is a BulkEnricher; without one, unresolved labels keep
+    their placeholders. Returns the number of documents sent to the LLM.
+    """
+    tagger = tagger or default_tagger
+    unresolved = tagger.tag_batch(documents)
+    if not unresolved or enricher is None:
+        return 0
+    sectors = tagger.sectors + [FALLBACK_SECTOR]
+    regions = tagger.regions + [FALLBACK_REGION]
+    articles = [
+        {
+            "id": document["id"],
+            "title": document.get("title", "No Title"),
+            "url": document.get("url") or document.get("link"),
+            "excerpt": document.get("excerpt"),
+        }
+        for document in unresolved
+    ]
+    answers = enricher.classify(articles, sectors, regions)
+    for document in unresolved:
+        answer = answers.get(document["id"]) or {}
+        for field in ("sector", "region"):
+            if answer.get(field) and is_placeholder(document.get(field)):
+                document[field] = answer[field]
+    log.info("documents_tagged", documents=len(documents), classified_by_llm=len(unresolved))
+    return len(unresolved)
+
+
+default_tagger = Tagger.from_file()
@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Read when the backend modules are imported, so set before any test imports them
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="news-tests-"))
+os.environ.setdefault("NEWS_SNAPSHOT", "0")
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+os.environ.setdefault("OPENAI_API_VERSION", "2024-02-01")
+os.environ.setdefault("OPENAI_DEPLOYMENT_NAME", "fake")
+
+from utils.fake_openai_server import start_fake_openai_server  # noqa: E402
+
+
+@pytest.fixture
+def fake_openai():
+    server = start_fake_openai_server()
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def openai_client(fake_openai):
+    from openai import AzureOpenAI
+
+    return AzureOpenAI(api_key="fake", api_version="2024-02-01", azure_endpoint=fake_openai.endpoint)
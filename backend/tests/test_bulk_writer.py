@@ -0,0 +1,120 @@
+import threading
+import time
+from collections import Counter
+
+from azure.cosmos import exceptions
+
+from bulk_writer import BulkWriter
+from utils.local_container import LocalContainer
+
+
+class TrackingContainer(LocalContainer):
+    """Records the most upserts seen running at once, per partition key value and in total."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._running = Counter()
+        self._tracking_lock = threading.Lock()
+        self.peak = Counter()
+        self.peak_total = 0
+
+    def upsert_item(self, body, **kwargs):
+        key = body["competitor"]
+        with self._tracking_lock:
+            self._running[key] += 1
+            self.peak[key] = max(self.peak[key], self._running[key])
+            self.peak_total = max(self.peak_total, sum(self._running.values()))
+        try:
+            return super().upsert_item(body, **kwargs)
+        finally:
+            with self._tracking_lock:
+                self._running[key] -= 1
+
+
+class ThrottlingContainer(LocalContainer):
+    """Answers the first upsert of every document with a 429."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._seen = set()
+
+    def upsert_item(self, body, **kwargs):
+        if body["id"] not in self._seen:
+            self._seen.add(body["id"])
+            error = exceptions.CosmosHttpResponseError(status_code=429, message="Request rate is large")
+            error.headers = {"x-ms-retry-after-ms": "5"}
+            raise error
+        return super().upsert_item(body, **kwargs)
+
+
+class RejectingContainer(LocalContainer):
+    """Rejects doc-2 as a bad request."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.rejected = 0
+
+    def upsert_item(self, body, **kwargs):
+        if body["id"] == "doc-2":
+            self.rejected += 1
+            raise exceptions.CosmosHttpResponseError(status_code=400, message="Bad request")
+        return super().upsert_item(body, **kwargs)
+
+
+def make_documents(count, competitors=("aecom", "jacobs")):
+    return ({"id": f"doc-{i}", "competitor": competitors[i % len(competitors)]} for i in range(count))
+
+
+def test_writes_every_document():
+    container = LocalContainer(partition_key="/competitor")
+    stats = BulkWriter(container, chunk_size=7).write(make_documents(50))
+
+    assert stats["written"] == 50
+    assert stats["failed"] == 0
+    assert sorted(stats["storedIds"]) == sorted(f"doc-{i}" for i in range(50))
+    assert container.upserts == 50
+
+
+def test_bounds_concurrency_per_partition_key():
+    container = TrackingContainer(latency=0.02, partition_key="/competitor")
+    stats = BulkWriter(container, max_workers=16, per_partition=3).write(make_documents(60))
+
+    assert stats["written"] == 60
+    assert max(container.peak.values()) <= 3
+    # Several upserts per key run at once, and both keys at the same time
+    assert min(container.peak.values()) > 1
+    assert container.peak_total > 3
+
+
+def test_retries_throttled_upserts():
+    container = ThrottlingContainer(partition_key="/competitor")
+    stats = BulkWriter(container).write(make_documents(10))
+
+    assert stats["written"] == 10
+    assert stats["throttled"] == 10
+
+
+def test_counts_failed_documents():
+    container = RejectingContainer(partition_key="/competitor")
+    stats = BulkWriter(container).write(make_documents(5))
+
+    assert stats["written"] == 4
+    assert stats["failed"] == 1
+    assert "doc-2" not in stats["storedIds"]
+    # A rejected document is not retried
+    assert container.rejected == 1
+
+
+def test_does_not_read_further_ahead_than_a_chunk():
+    container = LocalContainer(latency=0.01, partition_key="/competitor")
+    read = []
+
+    def documents():
+        for document in make_documents(40):
+            read.append(time.monotonic())
+            yield document
+
+    start = time.monotonic()
+    BulkWriter(container, max_workers=2, chunk_size=4).write(documents())
+    # With two workers and four documents ahead, the last ones cannot be read right away
+    assert read[-1] - start > 0.05
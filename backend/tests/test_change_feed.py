@@ -0,0 +1,53 @@
+import change_feed
+from clients import use_clients
+from normalize_data import backfill_incremental
+from utils.local_container import LocalContainer
+
+
+def make_document(number):
+    return {
+        "id": f"doc-{number}",
+        "source": "aecom",
+        "title": f"AECOM selected for transit program {number}",
+        "url": f"https://example.com/news/{number}",
+        "date": "March 3, 2025",
+    }
+
+
+def test_read_changes_resumes_after_commit(tmp_path):
+    state_path = str(tmp_path / "state.json")
+    container = LocalContainer([make_document(i) for i in range(3)])
+
+    (_, items, commit), = change_feed.read_changes(container, "test", state_path)
+    assert len(items) == 3
+    # Without a commit the same changes are read again
+    (_, items, commit), = change_feed.read_changes(container, "test", state_path)
+    assert len(items) == 3
+    commit()
+
+    container.upsert_item(make_document(3))
+    (_, items, _), = change_feed.read_changes(container, "test", state_path)
+    assert [item["id"] for item in items] == ["doc-3"]
+
+
+def test_incremental_backfill_only_processes_changes(tmp_path, fake_openai, openai_client):
+    use_clients(openai_client=openai_client)
+    state_path = str(tmp_path / "state.json")
+    container = LocalContainer([make_document(i) for i in range(5)])
+
+    backfill_incremental(container, state_path)
+    assert container.upserts == 5
+    assert all(item["impact"] in ("high", "medium", "low") for item in container.read_all_items())
+
+    container.upsert_item(make_document(5))
+    upserts = container.upserts
+    requests = fake_openai.requests
+    backfill_incremental(container, state_path)
+
+    # The documents the first run wrote come back from the feed but are unchanged
+    assert container.upserts == upserts + 1
+    assert fake_openai.requests > requests
+    assert container.read_item("doc-5")["description"].startswith("Summary of")
+
+    backfill_incremental(container, state_path)
+    assert container.upserts == upserts + 1
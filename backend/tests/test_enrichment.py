@@ -0,0 +1,80 @@
+import time
+
+from enrichment import FALLBACK, BulkEnricher, TokenBudget
+from llm_cache import LLMCache
+
+
+def make_articles(count):
+    return [{"id": f"a{i}", "title": f"Firm wins contract {i}", "url": f"https://example.com/{i}"} for i in range(count)]
+
+
+def test_packs_several_articles_per_prompt(fake_openai, openai_client):
+    enricher = BulkEnricher(openai_client, "fake", batch_size=8, cache=None)
+    results = enricher.enrich(make_articles(20))
+
+    assert fake_openai.requests == 3
+    assert enricher.calls == 3
+    assert results["a0"][0] == "Summary of Firm wins contract 0"
+    assert all(results[f"a{i}"] != FALLBACK for i in range(20))
+
+
+def test_retries_throttled_calls(fake_openai, openai_client):
+    fake_openai.throttle_every = 2
+    fake_openai.retry_after = 0.01
+    enricher = BulkEnricher(openai_client, "fake", batch_size=1, max_workers=2, cache=None)
+    results = enricher.enrich(make_articles(4))
+
+    assert fake_openai.throttled >= 1
+    assert enricher.throttled == fake_openai.throttled
+    assert enricher.calls == 4
+    assert all(answer != FALLBACK for answer in results.values())
+
+
+def test_gives_up_after_max_retries(fake_openai, openai_client):
+    fake_openai.throttle_every = 1
+    fake_openai.retry_after = 0.01
+    enricher = BulkEnricher(openai_client, "fake", max_retries=2, cache=None)
+    results = enricher.enrich(make_articles(2))
+
+    assert fake_openai.requests == 3
+    assert results == {"a0": FALLBACK, "a1": FALLBACK}
+
+
+def test_cached_answers_make_no_calls(tmp_path, fake_openai, openai_client):
+    cache = LLMCache(str(tmp_path / "llm.sqlite3"))
+    first = BulkEnricher(openai_client, "fake", cache=cache).enrich(make_articles(5))
+    requests = fake_openai.requests
+
+    built = []
+    openai_client.with_options = lambda **kwargs: built.append(kwargs)
+    second = BulkEnricher(openai_client, "fake", cache=cache).enrich(make_articles(5))
+
+    assert second == first
+    assert fake_openai.requests == requests
+    # The no-retry client is only created when a call has to be made
+    assert built == []
+
+
+def test_token_budget_waits_for_the_window():
+    budget = TokenBudget(tokens_per_minute=100, window=0.3)
+    budget.acquire(80)
+    start = time.monotonic()
+    budget.acquire(80)
+    assert time.monotonic() - start >= 0.25
+
+
+def test_token_budget_counts_reported_usage():
+    budget = TokenBudget(tokens_per_minute=100, window=5)
+    budget.acquire(80)
+    # The call used fewer tokens than estimated, which frees the rest of the window
+    budget.adjust(80, 10)
+    start = time.monotonic()
+    budget.acquire(80)
+    assert time.monotonic() - start < 0.2
+
+
+def test_token_budget_lets_an_oversized_request_through_alone():
+    budget = TokenBudget(tokens_per_minute=100, window=5)
+    start = time.monotonic()
+    budget.acquire(500)
+    assert time.monotonic() - start < 0.2
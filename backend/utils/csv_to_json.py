@@ -1,20 +1,27 @@
 import csv
 import json
-import uuid
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scrapers"))
+from base import source_for_file
+from dedupe import record_id
 
 input_csv = 'backend/Scraped Data/ News and Trends/smart_cities_news.csv'
 output_json = 'backend/Scraped Data/ News and Trends/smart_cities_news.json'
+source = source_for_file(input_csv)
 
 data = []
 with open(input_csv, newline='', encoding='utf-8') as csvfile:
     reader = csv.DictReader(csvfile)
     for row in reader:
-        # Add a unique id to each row
-        row['id'] = str(uuid.uuid4())
+        # Derive the id from the article, so converting and uploading again overwrites instead of duplicating
+        row['id'] = record_id(row.get('source') or source, row)
         data.append(row)
 
 # Write to JSON file
 with open(output_json, 'w', encoding='utf-8') as jsonfile:
     json.dump(data, jsonfile, indent=4)
 
-print(f"Converted {len(data)} rows with UUIDs to {output_json}")
+print(f"Converted {len(data)} rows with deterministic ids to {output_json}")
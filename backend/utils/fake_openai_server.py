@@ -0,0 +1,140 @@
+"""Local stand-in for the Azure OpenAI chat-completions API.
+
+Answers the single-article prompt used by normalize_item and the batched
+JSON prompts the bulk enricher uses to describe and classify articles, so
+the backfill can run offline. Run it and point the backend at it:
+
+    python backend/utils/fake_openai_server.py --port 8089 --latency 0.5 --throttle-every 10
+    OPENAI_ENDPOINT=http://127.0.0.1:8089 OPENAI_API_KEY=fake OPENAI_API_VERSION=2024-02-01 \
+        OPENAI_DEPLOYMENT_NAME=fake python backend/normalize_data.py
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+IMPACTS = ("high", "medium", "low")
+ARTICLE_PATTERN = re.compile(r"^(\d+)\. Title: (.*)$", re.MULTILINE)
+LABELS_PATTERN = re.compile(r"^(Sectors|Regions): (.*)$", re.MULTILINE)
+
+
+def _answer(prompt):
+    """Build a deterministic completion for a batch, classification or single-article prompt."""
+    articles = ARTICLE_PATTERN.findall(prompt)
+    labels = dict(LABELS_PATTERN.findall(prompt))
+    if articles and labels:
+        sectors = labels["Sectors"].split(", ")
+        regions = labels["Regions"].split(", ")
+        results = [
+            {"index": int(index), "sector": sectors[len(title) % len(sectors)],
+             "region": regions[len(title) % len(regions)]}
+            for index, title in articles
+        ]
+        return json.dumps({"results": results})
+    if articles:
+        results = [
+            {
+                "index": int(index),
+                "description": f"Summary of {title.strip()}",
+                "impact": IMPACTS[len(title) % len(IMPACTS)],
+            }
+            for index, title in articles
+        ]
+        return json.dumps({"results": results})
+    title = re.search(r"Title: (.*)", prompt)
+    title = title.group(1).strip() if title else "the article"
+    return f"Summary of {title}\n{IMPACTS[len(title) % len(IMPACTS)]}"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.split("?")[0].endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        with server.lock:
+            server.requests += 1
+            count = server.requests
+        if server.throttle_every and count % server.throttle_every == 0:
+            with server.lock:
+                server.throttled += 1
+            self._send_json(
+                429,
+                {"error": {"code": "429", "message": "Rate limit exceeded"}},
+                {"retry-after-ms": str(int(server.retry_after * 1000))},
+            )
+            return
+
+        if server.latency:
+            time.sleep(server.latency)
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        content = _answer(prompt)
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        self._send_json(200, {
+            "id": f"chatcmpl-fake-{count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": content},
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+
+
+def start_fake_openai_server(host="127.0.0.1", port=0, latency=0.0, throttle_every=0, retry_after=0.1):
+    """Start the server on a background thread and return it; call shutdown() to stop."""
+    server = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.throttle_every = throttle_every
+    server.retry_after = retry_after
+    server.requests = 0
+    server.throttled = 0
+    server.lock = threading.Lock()
+    server.endpoint = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8089)
+    arg_parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every completion")
+    arg_parser.add_argument("--throttle-every", type=int, default=0, help="answer every Nth request with a 429")
+    arg_parser.add_argument("--retry-after", type=float, default=0.1, help="retry-after sent with 429s, in seconds")
+    args = arg_parser.parse_args()
+
+    fake = start_fake_openai_server(args.host, args.port, args.latency, args.throttle_every, args.retry_after)
+    print(f"Fake OpenAI server listening on {fake.endpoint}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.shutdown()
@@ -0,0 +1,283 @@
+"""In-memory stand-in for an azure.cosmos ContainerProxy.
+
+Implements the subset of the container API used by the API and the batch
+jobs (query_items, read_all_items, upsert_item, read_item and the
+per-range change feed), so both can be exercised without a Cosmos account:
+
+    from utils.local_container import LocalContainer
+    container = LocalContainer.from_json_files(["Scraped Data/competitor data/aecom_press_releases.json"])
+
+query_items understands the SQL the backend issues: SELECT [TOP n] with *,
+a field projection or VALUE MAX/MIN(c.field)/COUNT(1), WHERE conditions on
+top-level fields joined by AND/OR, and ORDER BY one field. `latency`
+seconds are added to every request, standing in for the network round trip.
+"""
+import copy
+import json
+import re
+import threading
+import time
+
+QUERY_PATTERN = re.compile(
+    r"^\s*SELECT\s+(?:TOP\s+(?P<top>\d+)\s+)?(?P<select>.+?)\s+FROM\s+c"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+c\.(?P<order>\w+)(?:\s+(?P<direction>ASC|DESC))?)?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+AGGREGATE_PATTERN = re.compile(r"^VALUE\s+(MAX|MIN|COUNT)\((?:c\.(\w+)|1)\)$", re.IGNORECASE)
+CONDITION_PATTERN = re.compile(
+    r"^(?:c\.(?P<field>\w+)\s*(?P<op>=|!=|<>|<=|>=|<|>)\s*(?P<value>@\w+|'[^']*'|-?\d+(?:\.\d+)?|true|false|null)"
+    r"|IS_DEFINED\(c\.(?P<defined>\w+)\)\s*=\s*(?P<expected>true|false))$",
+    re.IGNORECASE,
+)
+COMPARISONS = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<>": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+# Items without the field are left out of ORDER BY results; other types sort in this order
+TYPE_ORDER = {type(None): 0, bool: 1, int: 2, float: 2, str: 3}
+DEFAULT_PAGE_SIZE = 100
+
+
+def _comparable(a, b):
+    """Cosmos compares values of the same type only; anything else matches nothing."""
+    numbers = (int, float)
+    if isinstance(a, numbers) and isinstance(b, numbers):
+        return not isinstance(a, bool) and not isinstance(b, bool)
+    return type(a) is type(b)
+
+
+def _literal(text, parameters):
+    if text.startswith("@"):
+        if text not in parameters:
+            raise ValueError(f"Query parameter {text} was not given")
+        return parameters[text]
+    if text.startswith("'"):
+        return text[1:-1]
+    return json.loads(text.lower())
+
+
+def _condition(text, parameters):
+    match = CONDITION_PATTERN.match(text.strip())
+    if not match:
+        raise ValueError(f"Unsupported condition in local query: {text!r}")
+    if match.group("defined"):
+        field, expected = match.group("defined"), match.group("expected").lower() == "true"
+        return lambda item: (field in item) == expected
+    field, compare = match.group("field"), COMPARISONS[match.group("op")]
+    value = _literal(match.group("value"), parameters)
+    return lambda item: field in item and _comparable(item[field], value) and compare(item[field], value)
+
+
+def _predicate(where, parameters):
+    """Compile a WHERE clause of AND/OR-joined conditions (AND binds tighter) into a function."""
+    if not where:
+        return lambda item: True
+    groups = [
+        [_condition(part, parameters) for part in re.split(r"\s+AND\s+", group, flags=re.IGNORECASE)]
+        for group in re.split(r"\s+OR\s+", where, flags=re.IGNORECASE)
+    ]
+    return lambda item: any(all(condition(item) for condition in group) for group in groups)
+
+
+def _projection(select):
+    """Return a function shaping a matching item for the SELECT list."""
+    if select.strip() == "*":
+        return copy.deepcopy
+    fields = [field.strip() for field in select.split(",")]
+    if not all(re.fullmatch(r"c\.\w+", field) for field in fields):
+        raise ValueError(f"Unsupported SELECT list in local query: {select!r}")
+    fields = [field[2:] for field in fields]
+    return lambda item: {field: copy.deepcopy(item[field]) for field in fields if field in item}
+
+
+class _Pages:
+    """Iterator over pages of a query result, like the pager of ItemPaged.by_page()."""
+
+    def __init__(self, results, page_size, continuation, latency):
+        self._results = results
+        self._page_size = page_size
+        self._offset = int(continuation) if continuation else 0
+        self._latency = latency
+        self._done = False
+        self.continuation_token = continuation
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        if self._latency:
+            time.sleep(self._latency)
+        page = self._results(self._offset, self._page_size + 1)
+        self._done = len(page) <= self._page_size
+        page = page[:self._page_size]
+        self._offset += len(page)
+        self.continuation_token = None if self._done else str(self._offset)
+        return iter(page)
+
+
+class _QueryResult:
+    """Iterable query result with by_page(), like the ItemPaged query_items returns."""
+
+    def __init__(self, results, page_size, latency):
+        self._results = results
+        self._page_size = page_size or DEFAULT_PAGE_SIZE
+        self._latency = latency
+
+    def by_page(self, continuation_token=None):
+        return _Pages(self._results, self._page_size, continuation_token, self._latency)
+
+    def __iter__(self):
+        for page in self.by_page():
+            yield from page
+
+
+class _ClientConnection:
+    def __init__(self, container):
+        self._container = container
+        self.last_response_headers = {}
+
+    def _ReadPartitionKeyRanges(self, container_link):
+        return [{"id": "0"}]
+
+
+class LocalContainer:
+    def __init__(self, items=(), latency=0.0, partition_key="/id"):
+        self.container_link = "dbs/local/colls/local"
+        self.partition_key = partition_key
+        self.client_connection = _ClientConnection(self)
+        self._items = {}
+        self._lsn = 0
+        self._lock = threading.Lock()
+        self.upserts = 0
+        self.latency = latency
+        # Items ordered by a field, kept until the next write
+        self._ordered = {}
+        for item in items:
+            self.upsert_item(item)
+        self.upserts = 0
+
+    @classmethod
+    def from_json_files(cls, paths):
+        items = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                items.extend(json.load(f))
+        return cls(items)
+
+    def _respond(self, charge=1.0, **headers):
+        self.client_connection.last_response_headers = {"x-ms-request-charge": str(charge), **headers}
+
+    def upsert_item(self, body, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._lsn += 1
+            stored = copy.deepcopy(body)
+            stored.update({"_ts": int(time.time()), "_lsn": self._lsn, "_etag": f'"{self._lsn}"'})
+            self._items[stored["id"]] = stored
+            self._ordered.clear()
+            self.upserts += 1
+            self._respond(charge=10.0)
+            result = copy.deepcopy(stored)
+        response_hook = kwargs.get("response_hook")
+        if response_hook:
+            response_hook(self.client_connection.last_response_headers, result)
+        return result
+
+    def read(self, **kwargs):
+        self._respond()
+        return {"id": "local", "partitionKey": {"paths": [self.partition_key], "kind": "Hash"}}
+
+    def read_item(self, item, partition_key=None, **kwargs):
+        with self._lock:
+            self._respond()
+            return copy.deepcopy(self._items[item])
+
+    def read_all_items(self, max_item_count=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            items = [copy.deepcopy(item) for item in self._items.values()]
+            self._respond(charge=len(items))
+        return iter(items)
+
+    def _ordered_by(self, field, descending):
+        """Items that have `field`, sorted by it; the caller holds the lock."""
+        key = (field, descending)
+        if key not in self._ordered:
+            items = [item for item in self._items.values() if field in item]
+            items.sort(key=lambda item: (TYPE_ORDER.get(type(item[field]), 4), item[field]), reverse=descending)
+            self._ordered[key] = items
+        return self._ordered[key]
+
+    def query_items(self, query, parameters=None, max_item_count=None, **kwargs):
+        match = QUERY_PATTERN.match(query)
+        if not match:
+            raise ValueError(f"Unsupported local query: {query!r}")
+        parameters = {parameter["name"]: parameter["value"] for parameter in parameters or ()}
+        matches = _predicate(match.group("where"), parameters)
+        top = int(match.group("top")) if match.group("top") else None
+        select = match.group("select").strip()
+        aggregate = AGGREGATE_PATTERN.match(select)
+        order = match.group("order")
+        descending = (match.group("direction") or "ASC").upper() == "DESC"
+
+        if aggregate:
+            function, field = aggregate.group(1).upper(), aggregate.group(2)
+            with self._lock:
+                selected = [item for item in self._items.values() if matches(item)]
+                self._respond(charge=max(1, len(self._items) / 100))
+            if function == "COUNT":
+                values = [len(selected)]
+            else:
+                found = [item[field] for item in selected if field in item and item[field] is not None]
+                values = [(max if function == "MAX" else min)(found)] if found else []
+            return _QueryResult(lambda offset, count: values[offset:offset + count], max_item_count, self.latency)
+
+        shape = _projection(select)
+
+        def results(offset, count):
+            # Scan only as far as the requested page, as a query with ORDER BY on an index would
+            if top is not None:
+                count = max(0, min(count, top - offset))
+            page = []
+            skipped = 0
+            with self._lock:
+                items = self._ordered_by(order, descending) if order else self._items.values()
+                for item in items:
+                    if len(page) >= count:
+                        break
+                    if matches(item):
+                        if skipped < offset:
+                            skipped += 1
+                        else:
+                            page.append(shape(item))
+                self._respond(charge=max(1, len(page)))
+            return page
+
+        return _QueryResult(results, max_item_count, self.latency)
+
+    def query_items_change_feed(self, partition_key_range_id=None, is_start_from_beginning=False,
+                                continuation=None, max_item_count=None, **kwargs):
+        # Like Cosmos, only the latest version of each document is returned, in modification order
+        with self._lock:
+            if continuation is not None:
+                since = int(continuation.strip('"'))
+            elif is_start_from_beginning:
+                since = 0
+            else:
+                since = self._lsn
+            changed = sorted(
+                (item for item in self._items.values() if item["_lsn"] > since),
+                key=lambda item: item["_lsn"],
+            )
+            self._respond(charge=max(1, len(changed)), etag=f'"{self._lsn}"')
+            return iter([copy.deepcopy(item) for item in changed])
@@ -1,5 +1,11 @@
 from azure.cosmos import CosmosClient
+import glob
 import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from bulk_writer import BulkWriter
 
 # Initialize Cosmos client
 endpoint = "https://lata.documents.azure.com:443/"
@@ -12,9 +18,17 @@ container_name = "AECNews"
 database = client.get_database_client(database_name)
 container = database.get_container_client(container_name)
 
-# Load your JSON file
-with open('backend/Scraped Data/ News and Trends/smart_cities_news.json', 'r') as f:
-    items = json.load(f)
+# Upload the JSON files given on the command line, or every scraped dataset
+paths = sys.argv[1:] or sorted(glob.glob('backend/Scraped Data/*/*.json'))
+
+def iter_items(paths):
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        print(f"Uploading {len(items)} items from {path}")
+        yield from items
 
-for item in items:
-    container.upsert_item(item)
+# Upsert in parallel; the writer also invalidates the API's news cache
+stats = BulkWriter(container).write(iter_items(paths))
+print(f"Uploaded {stats['written']} items ({stats['failed']} failed) at "
+      f"{stats['docsPerSecond']:.1f} docs/sec, {stats['ruPerSecond']:.1f} RU/sec")
@@ -0,0 +1,37 @@
+"""Callbacks run after documents are written to Cosmos.
+
+Views derived from the container (such as the search index) register a
+function here. Every writer calls notify() with the documents it stored:
+normalize_item for single upserts and BulkWriter for bulk writes. That
+keeps the views current without rescanning the container.
+"""
+import threading
+
+from logs import get_logger
+
+log = get_logger("write_hooks")
+
+_hooks = []
+_lock = threading.Lock()
+
+
+def register(hook):
+    """Call hook(documents) after every write; usable as a decorator."""
+    with _lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+    return hook
+
+
+def notify(documents):
+    documents = list(documents)
+    if not documents:
+        return
+    with _lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(documents)
+        except Exception as e:
+            # A broken view must never fail the write itself
+            log.error("write_hook_failed", hook=hook.__name__, error=e)
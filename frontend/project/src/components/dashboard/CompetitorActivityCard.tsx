@@ -7,6 +7,7 @@ interface Activity {
   id: string;
   title: string;
   date: string;
+  dateEpoch?: number | null;
   url?: string;
   excerpt?: string;
   image?: string;
@@ -40,17 +41,34 @@ const CompetitorActivityCard: React.FC = () => {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    fetch('http://localhost:5000/api/news') 
-      .then((res) => res.json())
-      .then((data) => {
-        console.log('Fetched data:', data); // Log fetched data for debugging
-        setActivities(data); // Use fetched data
-        setLoading(false);
-      })
-      .catch((err) => {
-        console.error('Failed to fetch competitor activities:', err);
-        setLoading(false);
-      });
+    const loadActivities = () =>
+      fetch('http://localhost:5000/api/news?limit=3')
+        .then((res) => res.json())
+        .then((data) => {
+          console.log('Fetched data:', data); // Log fetched data for debugging
+          setActivities(data.items ?? []); // Use fetched page of items
+          setLoading(false);
+        })
+        .catch((err) => {
+          console.error('Failed to fetch competitor activities:', err);
+          setLoading(false);
+        });
+
+    loadActivities();
+
+    // New and updated items are pushed by the server instead of refetching the feed
+    const events = new EventSource('http://localhost:5000/api/stream');
+    events.addEventListener('item', (event) => {
+      const item: Activity = JSON.parse((event as MessageEvent).data);
+      setActivities((current) =>
+        [item, ...current.filter((activity) => activity.id !== item.id)]
+          .sort((a, b) => (b.dateEpoch ?? 0) - (a.dateEpoch ?? 0))
+          .slice(0, 3)
+      );
+    });
+    // Sent when the stream cannot replay everything missed since the last event
+    events.addEventListener('reset', () => loadActivities());
+    return () => events.close();
   }, []);
 
   if (loading) {
@@ -75,8 +93,8 @@ const CompetitorActivityCard: React.FC = () => {
     );
   }
 
-  // Show top 3 recent activities (assuming data is already sorted by date desc)
-  const recentActivities = activities.slice(0, 3);
+  // The API returns the 3 most recent activities, sorted by date desc
+  const recentActivities = activities;
 
   return (
     <Card>